@@ -29,10 +29,10 @@ const SyncActions = () => {
     setRetraining(true);
     try {
       const response = await clientAPI.reindexData();
-      const count = response.data?.documents_count || 0;
+      const count = response.data?.documents_total || 0;
       alert(
         t("syncActions.retrainSuccess") || 
-        `Reindexing started for ${count} document(s)!`
+        `Reindexing started: ${count} document(s) will be checked!`
       );
     } catch (error) {
       console.error("Failed to retrain:", error);
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+def create_vector_indexes(apps, schema_editor):
+    from MASTER.processing.vectors import ensure_vector_indexes
+
+    EmbeddingModel = apps.get_model('EmbeddingModel', 'EmbeddingModel')
+    for embedding_model in EmbeddingModel.objects.all():
+        ensure_vector_indexes(embedding_model, concurrently=True, apps=apps, connection=schema_editor.connection)
+
+
+def drop_vector_indexes(apps, schema_editor):
+    from MASTER.processing.vectors import EMBEDDING_TABLES, vector_index_name
+
+    EmbeddingModel = apps.get_model('EmbeddingModel', 'EmbeddingModel')
+    for embedding_model in EmbeddingModel.objects.all():
+        for _app_label, _model_name, prefix in EMBEDDING_TABLES:
+            schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {vector_index_name(prefix, embedding_model.pk)}")
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не працює в транзакції
+    atomic = False
+
+    dependencies = [
+        ('EmbeddingModel', '0002_vector_dimensions_fixed'),
+        ('clients', '0023_clientembedding_native_dimensions'),
+        ('branches', '0007_branchembedding_native_dimensions'),
+        ('specializations', '0007_specializationembedding_native_dimensions'),
+        ('restaurant', '0006_menuitemembedding_native_dimensions'),
+    ]
+
+    operations = [
+        # Частковий HNSW-індекс на (table, embedding model) — див. MASTER.processing.vectors
+        migrations.RunPython(create_vector_indexes, drop_vector_indexes),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def create_binary_indexes(apps, schema_editor):
+    from MASTER.processing.vectors import ensure_binary_indexes
+
+    EmbeddingModel = apps.get_model('EmbeddingModel', 'EmbeddingModel')
+    for embedding_model in EmbeddingModel.objects.all():
+        ensure_binary_indexes(embedding_model, concurrently=True, apps=apps, connection=schema_editor.connection)
+
+
+def drop_binary_indexes(apps, schema_editor):
+    from MASTER.processing.vectors import BINARY_INDEX_PREFIXES, binary_index_name
+
+    EmbeddingModel = apps.get_model('EmbeddingModel', 'EmbeddingModel')
+    for embedding_model in EmbeddingModel.objects.all():
+        for prefix in BINARY_INDEX_PREFIXES:
+            schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {binary_index_name(prefix, embedding_model.pk)}")
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не працює в транзакції
+    atomic = False
+
+    dependencies = [
+        ('EmbeddingModel', '0003_vector_indexes_per_model'),
+    ]
+
+    operations = [
+        # HNSW по binary_quantize(vector) для двоетапного пошуку (branch/specialization)
+        migrations.RunPython(create_binary_indexes, drop_binary_indexes),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.utils.text import slugify
 
 
@@ -30,7 +33,36 @@ class EmbeddingModel(models.Model):
     def __str__(self):
         return f"{self.provider} - {self.name} ({self.dimensions}d)"
     
+    def clean(self):
+        super().clean()
+        self.check_dimensions_change()
+
+    def check_dimensions_change(self):
+        """Забороняє змінювати dimensions моделі, для якої вже збережені вектори.
+
+        ANN-індекс моделі — на виразі vector::vector(N); після зміни N він перебудовується,
+        і приведення рядків старої розмірності падає. Потрібна нова модель і переіндексація.
+        """
+        if self.pk is None:
+            return
+        stored = EmbeddingModel.objects.filter(pk=self.pk).values_list('dimensions', flat=True).first()
+        if stored is None or stored == self.dimensions:
+            return
+        from MASTER.processing.vectors import model_has_vectors
+
+        if model_has_vectors(self.pk):
+            raise ValidationError({
+                'dimensions': (
+                    f"Model already has stored {stored}-dimensional vectors; "
+                    "create a new embedding model and reindex instead of changing dimensions."
+                )
+            })
+
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'dimensions' in update_fields:
+            self.check_dimensions_change()
+
         # Генеруємо slug з name, якщо він не встановлений
         if not self.slug:
             self.slug = slugify(self.name)
@@ -45,4 +77,16 @@ class EmbeddingModel(models.Model):
         if self.is_default:
             # Використовуємо pk замість id для підтримки типізації
             EmbeddingModel.objects.filter(is_default=True).exclude(pk=self.pk).update(is_default=False)
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+@receiver(post_save, sender=EmbeddingModel)
+def ensure_embedding_model_vector_indexes(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Будує часткові ANN-індекси нової моделі (або моделі зі зміненою розмірністю) у фоні."""
+    if raw or (update_fields is not None and 'dimensions' not in update_fields):
+        return
+    from MASTER.EmbeddingModel.tasks import ensure_vector_indexes_task
+
+    model_pk = int(instance.pk)
+    # CREATE INDEX CONCURRENTLY — поза транзакцією, після коміту моделі
+    transaction.on_commit(lambda: ensure_vector_indexes_task.delay(model_pk))
@@ -1,18 +1,86 @@
-from celery import shared_task
+import logging
+from datetime import timedelta
+
+from celery import group, shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
 from MASTER.EmbeddingModel.models import EmbeddingModel
 from MASTER.clients.models import Client, ClientDocument, ClientEmbedding
+from MASTER.processing.hashing import file_hash
+from MASTER.processing.pipeline import IngestionPipeline, is_document_current
+from MASTER.processing.vectors import ensure_binary_indexes, ensure_vector_indexes
 from MASTER.processing.tasks import process_client_document
 
+logger = logging.getLogger(__name__)
+
+# Як часто (у документах) оновлювати прогрес таска під час порівняння
+PROGRESS_EVERY_DOCUMENTS = 20
+
+
+def _report_progress(task, progress: dict) -> None:
+    # update_state потребує id таска (немає при синхронному виклику без Celery)
+    if getattr(task.request, 'id', None):
+        task.update_state(state='PROGRESS', meta=dict(progress))
+
+
+def _queue_client_reindex(task, client, embedding_model, incremental: bool, progress: dict) -> None:
+    """Queue processing for the client's documents that are stale for `embedding_model`.
+
+    Incremental mode skips documents whose rows for the model were built from a file
+    with the same SHA-256; queued documents still reuse vectors of unchanged chunks
+    (content_hash), so only changed text reaches the embedding provider.
+    """
+    documents = (
+        ClientDocument.objects
+        .filter(client=client, is_processed=True)
+        .only('id', 'file', 'metadata', 'is_processed')
+    )
+    indexed_document_ids = set(
+        ClientEmbedding.objects
+        .filter(client=client, embedding_model=embedding_model)
+        .values_list('document_id', flat=True)
+        .distinct()
+    )
+
+    changed_ids = []
+    for doc in documents.iterator():
+        progress['documents_scanned'] += 1
+        if incremental and doc.id in indexed_document_ids:
+            try:
+                current = is_document_current(doc, embedding_model, file_hash(doc.file.path))
+            except OSError:
+                current = False
+            if current:
+                progress['documents_unchanged'] += 1
+                continue
+        changed_ids.append(doc.id)
+        if progress['documents_scanned'] % PROGRESS_EVERY_DOCUMENTS == 0:
+            _report_progress(task, progress)
+
+    if changed_ids:
+        # Один UPDATE і одна відправка групи замість save() + delay() на кожен документ
+        ClientDocument.objects.filter(id__in=changed_ids).update(is_processed=False, processing_error="")
+        group(process_client_document.s(doc_id) for doc_id in changed_ids).apply_async()
+    progress['documents_queued'] += len(changed_ids)
+    _report_progress(task, progress)
+
 
 @shared_task(bind=True, max_retries=3)
-def reindex_client_documents_task(self, client_id: int):
-    """Reindex all documents for a specific client.
+def reindex_client_documents_task(self, client_id: int, incremental: bool = True):
+    """Reindex documents for a specific client.
     
     This task:
     1. Gets the client's selected embedding model
-    2. Marks all processed documents as unprocessed
-    3. Deletes old embeddings for this client
-    4. Enqueues document processing tasks with the new model
+    2. In incremental mode, skips documents already indexed for this model from the same file
+    3. Marks the remaining processed documents as unprocessed and enqueues them
+
+    Old embeddings are not deleted up front: the ingestion pipeline reuses vectors of
+    unchanged chunks (content_hash) and replaces each document's rows atomically.
+    Progress (documents_scanned / documents_unchanged / documents_queued) is reported
+    via the task state.
     """
     try:
         client = Client.objects.get(id=client_id)
@@ -27,8 +95,7 @@ def reindex_client_documents_task(self, client_id: int):
             }
         
         # Знаходимо всі оброблені документи клієнта
-        documents = ClientDocument.objects.filter(client=client, is_processed=True)
-        documents_count = documents.count()
+        documents_count = ClientDocument.objects.filter(client=client, is_processed=True).count()
         
         if documents_count == 0:
             return {
@@ -38,35 +105,29 @@ def reindex_client_documents_task(self, client_id: int):
                 "documents_count": 0
             }
         
-        embeddings_deleted = 0
-
-        # Видаляємо тільки embeddings, створені з поточною моделлю клієнта
-        # ВАЖЛИВО: Embeddings для інших моделей НЕ видаляються!
-        # Це дозволяє при поверненні до старої моделі використовувати існуючі embeddings
-        # без повторної індексації
-        deleted, _ = ClientEmbedding.objects.filter(
-            client=client,
-            embedding_model=embedding_model
-        ).delete()
-        embeddings_deleted += deleted
-        
-        # Помічаємо всі документи для повторної обробки
-        for doc in documents:
-            doc.is_processed = False
-            doc.processing_error = ""  # Очищаємо попередні помилки
-            doc.save(update_fields=['is_processed', 'processing_error'])
-            
-            # Запускаємо обробку з новою моделлю
-            process_client_document.delay(doc.id)
+        # Embeddings поточної моделі не видаляємо: pipeline перевикористає вектори
+        # незмінних чанків і замінить рядки документа в одній транзакції.
+        # Embeddings для інших моделей теж лишаються — при поверненні до старої моделі
+        # вони використовуються без повторної індексації
+        progress = {
+            "documents_total": documents_count,
+            "documents_scanned": 0,
+            "documents_unchanged": 0,
+            "documents_queued": 0,
+        }
+        _queue_client_reindex(self, client, embedding_model, incremental, progress)
         
         return {
             "status": "success",
             "client_id": client_id,
             "model_id": embedding_model.id,
             "model_name": embedding_model.name,
-            "documents_queued": documents_count,
-            "embeddings_deleted": embeddings_deleted,
-            "message": f"Reindexing queued for {documents_count} document(s)"
+            "incremental": incremental,
+            **progress,
+            "message": (
+                f"Reindexing queued for {progress['documents_queued']} document(s), "
+                f"{progress['documents_unchanged']} unchanged"
+            ),
         }
         
     except Client.DoesNotExist:
@@ -80,14 +141,14 @@ def reindex_client_documents_task(self, client_id: int):
 
 
 @shared_task(bind=True, max_retries=3)
-def reindex_documents_for_model(self, model_id: int):
-    """Reindex all documents for clients using a specific embedding model.
+def reindex_documents_for_model(self, model_id: int, incremental: bool = True):
+    """Reindex documents for clients using a specific embedding model.
     
     This task:
     1. Finds all clients using the specified model
-    2. Marks their documents as unprocessed
-    3. Deletes old embeddings
-    4. Enqueues document processing tasks with the new model
+    2. Skips (in incremental mode) documents already indexed from the same file
+    3. Enqueues processing of the rest (rows are replaced by the pipeline, vectors of
+       unchanged chunks are reused)
     """
     try:
         model = EmbeddingModel.objects.get(id=model_id)
@@ -100,31 +161,22 @@ def reindex_documents_for_model(self, model_id: int):
         
         # Знаходимо всіх клієнтів, які використовують цю модель
         clients_with_model = Client.objects.filter(embedding_model=model)
+        clients_count = clients_with_model.count()
+        
+        progress = {
+            "clients_total": clients_count,
+            "clients_done": 0,
+            "documents_total": ClientDocument.objects.filter(
+                client__in=clients_with_model, is_processed=True
+            ).count(),
+            "documents_scanned": 0,
+            "documents_unchanged": 0,
+            "documents_queued": 0,
+        }
         
-        documents_count = 0
-        embeddings_deleted = 0
-        
-        for client in clients_with_model:
-            # Знаходимо всі документи клієнта
-            documents = ClientDocument.objects.filter(client=client, is_processed=True)
-            
-            for doc in documents:
-                # Видаляємо старі embeddings для цього документа
-                deleted, _ = ClientEmbedding.objects.filter(
-                    client=client,
-                    document=doc,
-                    embedding_model=model
-                ).delete()
-                embeddings_deleted += deleted
-                
-                # Помічаємо документ для повторної обробки
-                doc.is_processed = False
-                doc.processing_error = ""  # Очищаємо попередні помилки
-                doc.save(update_fields=['is_processed', 'processing_error'])
-                
-                # Запускаємо обробку з новою моделлю
-                process_client_document.delay(doc.id)
-                documents_count += 1
+        for client in clients_with_model.iterator():
+            _queue_client_reindex(self, client, model, incremental, progress)
+            progress["clients_done"] += 1
         
         # Якщо модель має прапор reindex_required, скидаємо його після початку реіндексації
         if model.reindex_required:
@@ -135,10 +187,13 @@ def reindex_documents_for_model(self, model_id: int):
             "status": "success",
             "model_id": model_id,
             "model_name": model.name,
-            "clients_count": clients_with_model.count(),
-            "documents_queued": documents_count,
-            "embeddings_deleted": embeddings_deleted,
-            "message": f"Reindexing queued for {documents_count} documents across {clients_with_model.count()} clients"
+            "clients_count": clients_count,
+            "incremental": incremental,
+            **progress,
+            "message": (
+                f"Reindexing queued for {progress['documents_queued']} documents across {clients_count} clients, "
+                f"{progress['documents_unchanged']} unchanged"
+            ),
         }
         
     except EmbeddingModel.DoesNotExist:
@@ -151,6 +206,32 @@ def reindex_documents_for_model(self, model_id: int):
         raise self.retry(exc=e, countdown=60)
 
 
+@shared_task(bind=True, max_retries=3)
+def ensure_vector_indexes_task(self, model_id: int):
+    """Build the model's partial HNSW indexes in every embedding table.
+
+    Also builds the binary-quantised indexes used by the two-stage search on the
+    branch/specialization tables. Indexes are created CONCURRENTLY (writes to the
+    tables are not blocked); existing valid indexes are kept, so the task is safe to re-run.
+    """
+    try:
+        model = EmbeddingModel.objects.get(id=model_id)
+        indexes = ensure_vector_indexes(model) + ensure_binary_indexes(model)
+        return {
+            "status": "success",
+            "model_id": model_id,
+            "indexes": indexes,
+        }
+    except EmbeddingModel.DoesNotExist:
+        return {
+            "status": "error",
+            "message": f"EmbeddingModel with id={model_id} not found",
+            "model_id": model_id
+        }
+    except Exception as e:  # noqa: BLE001
+        raise self.retry(exc=e, countdown=60)
+
+
 @shared_task(bind=True, max_retries=3)
 def index_new_client_documents_task(self, client_id: int):
     """Index only new (unprocessed) documents for a specific client.
@@ -207,3 +288,182 @@ def index_new_client_documents_task(self, client_id: int):
     except Exception as e:  # noqa: BLE001
         raise self.retry(exc=e, countdown=60)
 
+
+def start_shadow_build(client: Client, model: EmbeddingModel):
+    """Record `model` as the client's pending model and enqueue its background build.
+
+    Search keeps using client.embedding_model until build_shadow_embeddings_task
+    verifies the new embeddings and flips the client atomically.
+    """
+    client.pending_embedding_model = model
+    client.save(update_fields=['pending_embedding_model'])
+    client_pk = int(client.pk)
+    model_pk = int(model.pk)
+    # Таск стартує тільки після коміту, щоб побачити pending_embedding_model
+    transaction.on_commit(lambda: build_shadow_embeddings_task.delay(client_pk, model_pk))
+
+
+def _seconds_until_off_peak(config: dict) -> int:
+    """0 if a build may run now, otherwise seconds until the off-peak window opens."""
+    start = config.get('off_peak_start_hour')
+    end = config.get('off_peak_end_hour')
+    if start is None or end is None or start == end:
+        return 0
+    now = timezone.localtime()
+    hour = now.hour
+    in_window = start <= hour < end if start < end else (hour >= start or hour < end)
+    if in_window:
+        return 0
+    opens_at = now.replace(hour=start, minute=0, second=0, microsecond=0)
+    if opens_at <= now:
+        opens_at += timedelta(days=1)
+    return int((opens_at - now).total_seconds())
+
+
+def _incomplete_shadow_documents(client: Client, model: EmbeddingModel) -> list[int]:
+    """IDs of processed documents whose rows for `model` are missing or incomplete."""
+    documents = ClientDocument.objects.filter(client=client, is_processed=True).values_list('id', 'chunks_count')
+    row_counts = dict(
+        ClientEmbedding.objects
+        .filter(client=client, embedding_model=model, vector__isnull=False)
+        .values('document_id')
+        .annotate(rows=Count('id'))
+        .values_list('document_id', 'rows')
+    )
+    return [doc_id for doc_id, chunks_count in documents if row_counts.get(doc_id, 0) != chunks_count]
+
+
+def _cut_over(client_id: int, model: EmbeddingModel) -> tuple[bool, list[int]]:
+    """Atomically make the pending model the client's active model.
+
+    Completeness is checked again under the client row lock, so documents processed
+    between the task's own check and the switch are not missed. Returns
+    (switched, incomplete document ids).
+    """
+    with transaction.atomic():
+        client = Client.objects.select_for_update().get(id=client_id)
+        if client.pending_embedding_model_id != model.id:
+            return False, []
+        incomplete = _incomplete_shadow_documents(client, model)
+        if incomplete:
+            return False, incomplete
+        client.embedding_model_id = model.id
+        client.pending_embedding_model = None
+        client.save(update_fields=['embedding_model', 'pending_embedding_model'])
+    return True, []
+
+
+@shared_task(bind=True, max_retries=3)
+def build_shadow_embeddings_task(self, client_id: int, model_id: int, document_ids: list[int] | None = None,
+                                 attempt: int = 0):
+    """Build embeddings for a client's pending model while search uses the current one.
+
+    Runs only inside the configured off-peak window (SHADOW_BUILD_CONFIG) and processes at
+    most `documents_per_run` documents per run, re-scheduling itself until done. Documents
+    already indexed for the model from the same file are skipped, so continuations resume
+    where the previous run stopped. When every processed document has a complete set of
+    rows for the model, the client is switched over in one transaction.
+
+    Documents left incomplete (failed, or uploaded during the build and indexed only for
+    the active model) are rebuilt by a rescheduled run with `document_ids`, at most
+    `incomplete_retries` times; after that the switch is cancelled.
+    """
+    config = getattr(settings, 'SHADOW_BUILD_CONFIG', {})
+    pause_seconds = config.get('pause_seconds', 60)
+    task_kwargs = {"document_ids": document_ids, "attempt": attempt}
+    try:
+        client = Client.objects.get(id=client_id)
+        if client.pending_embedding_model_id != model_id:
+            # Клієнт обрав іншу модель або скасував перемикання
+            return {"status": "superseded", "client_id": client_id, "model_id": model_id}
+        model = EmbeddingModel.objects.get(id=model_id)
+
+        wait_seconds = _seconds_until_off_peak(config)
+        if wait_seconds:
+            build_shadow_embeddings_task.apply_async((client_id, model_id), task_kwargs, countdown=wait_seconds)
+            return {"status": "deferred", "client_id": client_id, "model_id": model_id, "countdown": wait_seconds}
+
+        documents = ClientDocument.objects.filter(client=client, is_processed=True).only('id', 'file', 'metadata', 'is_processed')
+        if document_ids is not None:
+            documents = documents.filter(id__in=document_ids)
+        progress = {
+            "documents_total": documents.count(),
+            "documents_scanned": 0,
+            "documents_built": 0,
+            "documents_unchanged": 0,
+            "documents_failed": 0,
+        }
+        documents_per_run = max(int(config.get('documents_per_run', 50)), 1)
+        pipeline = IngestionPipeline('client')
+
+        for doc in documents.iterator():
+            if progress["documents_built"] >= documents_per_run:
+                # Ліміт на запуск вичерпано — продовжимо наступним таском (throttling)
+                build_shadow_embeddings_task.apply_async((client_id, model_id), task_kwargs, countdown=pause_seconds)
+                return {"status": "in_progress", "client_id": client_id, "model_id": model_id, **progress}
+
+            progress["documents_scanned"] += 1
+            try:
+                # Повторно поставлені документи перебудовуються примусово: їхніх рядків бракує
+                if document_ids is None and is_document_current(doc, model, file_hash(doc.file.path)):
+                    progress["documents_unchanged"] += 1
+                    continue
+                pipeline.run(doc.id, embedding_model=model)
+                progress["documents_built"] += 1
+            except Exception as e:  # noqa: BLE001
+                # processing_error не пишемо: документ справний для активної моделі
+                logger.error(f"Shadow build failed for client {client_id} document {doc.id} model {model_id}: {e}")
+                progress["documents_failed"] += 1
+            _report_progress(self, progress)
+
+        switched = False
+        incomplete = _incomplete_shadow_documents(client, model)
+        if not incomplete:
+            switched, incomplete = _cut_over(client_id, model)
+        if switched:
+            logger.info(f"Client {client_id} switched to embedding model {model_id} after shadow build")
+        if not incomplete:
+            return {
+                "status": "switched" if switched else "superseded",
+                "client_id": client_id,
+                "model_id": model_id,
+                **progress,
+            }
+
+        max_attempts = int(config.get('incomplete_retries', 3))
+        if attempt < max_attempts:
+            logger.warning(
+                f"Shadow build for client {client_id} model {model_id} incomplete: documents {incomplete[:20]}, "
+                f"rebuilding (attempt {attempt + 1}/{max_attempts})"
+            )
+            build_shadow_embeddings_task.apply_async(
+                (client_id, model_id), {"document_ids": incomplete, "attempt": attempt + 1}, countdown=pause_seconds
+            )
+            status = "incomplete"
+        else:
+            # Не лишаємо клієнта з pending_embedding_model назавжди — перемикання скасовується
+            Client.objects.filter(id=client_id, pending_embedding_model_id=model_id).update(
+                pending_embedding_model=None
+            )
+            logger.error(
+                f"Shadow build for client {client_id} model {model_id} cancelled after {attempt} retries: "
+                f"documents {incomplete[:20]} still incomplete"
+            )
+            status = "failed"
+        return {
+            "status": status,
+            "client_id": client_id,
+            "model_id": model_id,
+            "incomplete_documents": incomplete,
+            "attempt": attempt,
+            **progress,
+        }
+
+    except (Client.DoesNotExist, EmbeddingModel.DoesNotExist):
+        return {
+            "status": "error",
+            "message": f"Client {client_id} or EmbeddingModel {model_id} not found",
+            "client_id": client_id,
+        }
+    except Exception as e:  # noqa: BLE001
+        raise self.retry(exc=e, countdown=60)
@@ -4,7 +4,7 @@ from django.views.decorators.http import require_GET, require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.text import slugify
 from .models import EmbeddingModel
-from MASTER.clients.models import Client
+from MASTER.clients.models import Client, ClientDocument
 from MASTER.processing.tasks import process_client_document
 import json
 
@@ -71,9 +71,25 @@ def select_model(request):
         model_pk = getattr(model, 'pk', None) or getattr(model, 'id', None)
         reindex_needed = (previous_model_id != model_pk and previous_model_id is not None)
         
+        # Blue/green: при наявності проіндексованих документів будуємо нову модель у фоні,
+        # пошук лишається на попередній до атомарного перемикання
+        if reindex_needed and data.get('mode', 'shadow') != 'immediate' and \
+                ClientDocument.objects.filter(client=client, is_processed=True).exists():
+            from MASTER.EmbeddingModel.tasks import start_shadow_build
+            start_shadow_build(client, model)
+            return JsonResponse({
+                "status": "ok",
+                "selected_model": model.slug,
+                "reindex_required": False,
+                "cutover": "pending",
+                "message": "Embeddings for the new model are being built in the background. "
+                           "The current model stays active until the build is complete."
+            })
+        
         # Оновлюємо модель клієнта
         client.embedding_model = model
-        client.save(update_fields=['embedding_model'])
+        client.pending_embedding_model = None
+        client.save(update_fields=['embedding_model', 'pending_embedding_model'])
         
         # Не запускаємо реіндексацію автоматично - клієнт сам має натиснути кнопку
         # Тільки повідомляємо, що потрібна реіндексація
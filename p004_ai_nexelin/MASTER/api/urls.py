@@ -1,5 +1,6 @@
 from django.urls import path
 from . import views
+from . import views_async
 from . import views_bootstrap
 
 
@@ -8,6 +9,10 @@ urlpatterns = [
     path('upload/', views.DocumentUploadView.as_view(), name='rag-upload'),
     path('docs/', views.APIDocsView.as_view(), name='rag-docs'),
     path('chat/', views.PublicRAGChatView.as_view(), name='rag-chat'),
+    path('chat/stream/', views.PublicRAGChatStreamView.as_view(), name='rag-chat-stream'),
+    # Async (ASGI) варіанти чату
+    path('chat/async/', views_async.AsyncRAGChatView.as_view(), name='rag-chat-async'),
+    path('chat/stream/async/', views_async.AsyncRAGChatStreamView.as_view(), name='rag-chat-stream-async'),
     path('auth/token-by-client-token/', views.TokenByClientTokenView.as_view(), name='token-by-client-token'),
     path('bootstrap/<slug:branch_slug>/<slug:specialization_slug>/<slug:client_token>/', views_bootstrap.BootstrapProvisionView.as_view(), name='bootstrap-provision'),
     path('provision-link/', views.ProvisionLinkView.as_view(), name='provision-link'),
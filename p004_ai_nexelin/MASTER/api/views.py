@@ -12,7 +12,9 @@ from django.utils.crypto import get_random_string
 from django.utils.text import slugify
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
+from django.http import StreamingHttpResponse
 import hashlib
+from types import SimpleNamespace
 from MASTER.accounts.models import User as AppUser
 import requests
 
@@ -102,6 +104,18 @@ class APIDocsView(APIView):
                         'query': 'Your question here'
                     }
                 },
+                'chat_stream': {
+                    'url': '/api/rag/chat/stream/',
+                    'method': 'POST',
+                    'headers': {
+                        'X-API-Key': 'your_api_key',
+                        'Content-Type': 'application/json'
+                    },
+                    'body': {
+                        'message': 'Your question here'
+                    },
+                    'response': 'text/event-stream: JSON events sources → token… → done (usage)'
+                },
                 'upload': {
                     'url': '/api/rag/upload/',
                     'method': 'POST',
@@ -132,6 +146,36 @@ class APIDocsView(APIView):
         return Response(docs)
 
 
+def resolve_chat_client(user, api_key):
+    """Клієнт публічного чату: (client, None) або (None, (error, status)).
+
+    Спільна для PublicRAGChatView і async-views (MASTER.api.views_async): спершу клієнт
+    JWT-користувача (user уже автентифікований), інакше — за X-API-Key.
+    """
+    client = None
+    if user is not None and user.is_authenticated:
+        # Якщо користувач авторизований через JWT, отримуємо його клієнта
+        try:
+            from MASTER.clients.views import get_client_from_request
+            client = get_client_from_request(SimpleNamespace(user=user))
+        except Exception:
+            pass
+
+    # Якщо немає JWT, перевіряємо X-API-Key
+    if not client:
+        if not api_key:
+            return None, ('Authentication required (JWT or API key)', status.HTTP_401_UNAUTHORIZED)
+        try:
+            key_obj = ClientAPIKey.objects.select_related('client').get(key=api_key, is_active=True)
+        except ClientAPIKey.DoesNotExist:
+            return None, ('Invalid API key', status.HTTP_401_UNAUTHORIZED)
+        if not key_obj.is_valid():
+            return None, ('Invalid API key', status.HTTP_401_UNAUTHORIZED)
+        client = key_obj.client
+
+    return client, None
+
+
 class PublicRAGChatView(APIView):
     """Public RAG chat endpoint - доступний для всіх клієнтів.
 
@@ -144,35 +188,14 @@ class PublicRAGChatView(APIView):
     """
     permission_classes = [AllowAny]
 
-    def post(self, request):
-        # Перевіряємо чи є JWT авторизація
-        client = None
-        if request.user and request.user.is_authenticated:
-            # Якщо користувач авторизований через JWT, отримуємо його клієнта
-            try:
-                from MASTER.clients.views import get_client_from_request
-                client = get_client_from_request(request)
-            except Exception:
-                pass
-
-        # Якщо немає JWT, перевіряємо X-API-Key
-        if not client:
-            api_key = request.headers.get('X-API-Key')
-            if not api_key:
-                return Response({'error': 'Authentication required (JWT or API key)'}, status=status.HTTP_401_UNAUTHORIZED)
-
-            try:
-                key_obj = ClientAPIKey.objects.get(key=api_key, is_active=True)
-                if not key_obj.is_valid():
-                    return Response({'error': 'Invalid API key'}, status=status.HTTP_401_UNAUTHORIZED)
-                client = key_obj.client
-            except ClientAPIKey.DoesNotExist:
-                return Response({'error': 'Invalid API key'}, status=status.HTTP_401_UNAUTHORIZED)
-
-        message = request.data.get('message', '')
-        if not message:
-            return Response({'error': 'message is required'}, status=status.HTTP_400_BAD_REQUEST)
+    def authenticate_client(self, request):
+        """Повертає (client, None) або (None, Response з помилкою)."""
+        client, error = resolve_chat_client(request.user, request.headers.get('X-API-Key'))
+        if error is not None:
+            return None, Response({'error': error[0]}, status=error[1])
+        return client, None
 
+    def generate(self, client, message, stream):
         # Використовуємо клієнта для пошуку в його даних + даних бранча та спеціалізації
         generator = ResponseGenerator()
 
@@ -184,13 +207,24 @@ class PublicRAGChatView(APIView):
         # - Client embeddings (приватні дані клієнта)
         # - Specialization embeddings (спільні дані для всіх клієнтів цієї спеціалізації)
         # - Branch embeddings (спільні дані для всіх клієнтів цього бранча)
-        rag_response = generator.generate(
+        return generator.generate(
             query=message,
             client=client,
             specialization=specialization,
             branch=branch,
-            stream=False
+            stream=stream
         )
+
+    def post(self, request):
+        client, error = self.authenticate_client(request)
+        if error is not None:
+            return error
+
+        message = request.data.get('message', '')
+        if not message:
+            return Response({'error': 'message is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rag_response = self.generate(client, message, stream=False)
         return Response({
             'response': getattr(rag_response, 'answer', ''),
             'sources': getattr(rag_response, 'sources', []),
@@ -199,6 +233,34 @@ class PublicRAGChatView(APIView):
         })
 
 
+class PublicRAGChatStreamView(PublicRAGChatView):
+    """Streaming variant of the public RAG chat (Server-Sent Events).
+
+    Auth and body are the same as PublicRAGChatView. Response is `text/event-stream`,
+    every event is a JSON object in a `data:` line:
+    - {"type": "sources", "sources": [...], "num_chunks": N}
+    - {"type": "token", "content": "..."}  (one per answer delta)
+    - {"type": "done", "num_chunks": N, "total_tokens": N, "usage": {...} | null, "from_cache": bool}
+    - {"type": "error", "error": "..."}  (instead of "done" if generation fails mid-stream)
+    """
+
+    def post(self, request):
+        client, error = self.authenticate_client(request)
+        if error is not None:
+            return error
+
+        message = request.data.get('message', '')
+        if not message:
+            return Response({'error': 'message is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        events = self.generate(client, message, stream=True)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Вимикаємо буферизацію nginx, щоб токени йшли клієнту одразу
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
 class TokenByClientTokenView(APIView):
     """Issue JWT for client user by provided client_token (ClientAPIKey.key) or client tag.
 
@@ -711,9 +773,40 @@ class ClientEmbeddingModelSetView(APIView):
         model_pk = getattr(model, 'pk', None) or getattr(model, 'id', None)
         reindex_required = (previous_model_id != model_pk and previous_model_id is not None)
         
+        # Blue/green: якщо є проіндексовані документи, нова модель будується у фоні,
+        # а пошук працює на попередній до атомарного перемикання.
+        # mode=immediate — стара поведінка (миттєва зміна + ручний reindex)
+        shadow_build = (
+            reindex_required
+            and data.get('mode', 'shadow') != 'immediate'
+            and ClientDocument.objects.filter(client=client, is_processed=True).exists()
+        )
+        if shadow_build:
+            from MASTER.EmbeddingModel.tasks import start_shadow_build
+            start_shadow_build(client, model)
+            return Response({
+                'success': True,
+                'model': {
+                    'id': model_pk,
+                    'name': model.name,
+                    'slug': model.slug,
+                    'provider': model.provider,
+                    'model_name': model.model_name,
+                    'dimensions': model.dimensions,
+                    'cost_per_1k_tokens': float(model.cost_per_1k_tokens),
+                },
+                'model_type': 'embedding',
+                'reindex_required': False,
+                'cutover': 'pending',
+                'active_model_id': previous_model_id,
+                'message': 'Embeddings for the new model are being built in the background. '
+                           'The current model stays active until the build is complete.',
+            })
+        
         # Update client's embedding model
         client.embedding_model = model
-        client.save(update_fields=['embedding_model'])
+        client.pending_embedding_model = None
+        client.save(update_fields=['embedding_model', 'pending_embedding_model'])
         
         return Response({
             'success': True,
@@ -737,6 +830,7 @@ class EmbeddingModelReindexView(APIView):
     
     Auth: Admin only (JWT with admin role) or staff user.
     Path: /api/embedding-models/<model_id>/reindex/
+    Body (optional): { full: bool } — rebuild all documents instead of only changed ones
     Response: { success: bool, message: str, documents_count: int }
     """
     def post(self, request, model_id):
@@ -768,7 +862,9 @@ class EmbeddingModelReindexView(APIView):
         if model_pk is None:
             return Response({'error': 'Invalid model ID'}, status=status.HTTP_400_BAD_REQUEST)
         
-        task_result = reindex_documents_for_model.delay(int(model_pk))
+        # full=true — перебудувати всі документи, інакше тільки змінені (incremental)
+        full = str(request.data.get('full', '')).lower() in ('1', 'true', 'yes')
+        task_result = reindex_documents_for_model.delay(int(model_pk), incremental=not full)
         
         return Response({
             'success': True,
@@ -825,10 +921,16 @@ class ClientReindexDocumentsView(APIView):
     """Trigger reindexing for all documents of authenticated client.
     
     Auth: JWT (client user) or X-API-Key (sets request.client).
-    Response: { success: bool, message: str, documents_count: int, task_id: str }
+    Response: { success: bool, message: str, documents_count: int, incremental: bool,
+                documents_total: int, documents_queued: int | null, task_id: str }
     
-    This endpoint reindexes ALL processed documents (marks them as unprocessed and reindexes).
+    By default only documents whose file changed (or that have no embeddings for the
+    current model yet) are reprocessed; pass {"full": true} to rebuild ALL processed documents.
     Use this when switching models or when you need to completely rebuild embeddings.
+    documents_count (kept for existing consumers) and documents_total are both the number
+    of processed documents the task checks. Which of them are queued is decided by the task
+    (file hashes), so in incremental mode documents_queued is null here; the counts are
+    available via the task state (task_id).
     """
     def post(self, request):
         client = getattr(request, 'client', None)
@@ -849,14 +951,22 @@ class ClientReindexDocumentsView(APIView):
         if client_pk is None:
             return Response({'error': 'Invalid client ID'}, status=status.HTTP_400_BAD_REQUEST)
         
-        task_result = reindex_client_documents_task.delay(int(client_pk))
+        full = str(request.data.get('full', '')).lower() in ('1', 'true', 'yes')
+        task_result = reindex_client_documents_task.delay(int(client_pk), incremental=not full)
         
         # Підраховуємо документи для інформації
-        documents_count = ClientDocument.objects.filter(client=client, is_processed=True).count()
+        documents_total = ClientDocument.objects.filter(client=client, is_processed=True).count()
+        if full:
+            message = f'Reindexing started for {documents_total} document(s).'
+        else:
+            message = f'Reindexing started: {documents_total} document(s) will be checked, only changed ones are reprocessed.'
         
         return Response({
             'success': True,
-            'message': f'Reindexing started for {documents_count} document(s).',
-            'documents_count': documents_count,
+            'message': message,
+            'documents_count': documents_total,
+            'incremental': not full,
+            'documents_total': documents_total,
+            'documents_queued': documents_total if full else None,
             'task_id': task_result.id,
         })
@@ -0,0 +1,94 @@
+"""
+Async (ASGI) RAG chat views.
+
+Same auth and body as PublicRAGChatView / PublicRAGChatStreamView, but the pipeline runs
+through ResponseGenerator.agenerate(): while a chat waits for OpenAI it holds no worker
+thread, so one ASGI worker serves many concurrent conversations.
+Plain Django async views — DRF APIView is sync-only.
+"""
+import json
+
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from MASTER.api.views import resolve_chat_client
+from MASTER.rag.response_generator import ResponseGenerator, db_sync_to_async
+
+
+def authenticate_chat_request(request):
+    """Повертає (client, specialization, branch, None) або (None, None, None, (error, status)).
+
+    Та сама перевірка, що й у PublicRAGChatView: JWT тим самим DRF-автентифікатором, далі
+    спільна resolve_chat_client. Синхронна (звертається до БД) — через db_sync_to_async.
+    """
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed as e:
+        # Як DRF для синхронного view: невалідний токен — 401, а не перехід до API-ключа
+        detail = e.detail.get('detail', e.detail) if isinstance(e.detail, dict) else e.detail
+        return None, None, None, (str(detail), 401)
+    user = authenticated[0] if authenticated else None
+
+    client, error = resolve_chat_client(user, request.headers.get('X-API-Key'))
+    if error is not None:
+        return None, None, None, error
+
+    # Завантажуємо зв'язки тут, щоб async-код не робив lazy-запитів у event loop
+    specialization = getattr(client, 'specialization', None)
+    branch = getattr(specialization, 'branch', None) if specialization else None
+    return client, specialization, branch, None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncRAGChatView(View):
+    """Async public RAG chat.
+
+    Body JSON: { "message": "..." }
+    Response: { "response": "...", "sources": [...], "num_chunks": N, "total_tokens": N }
+    """
+    http_method_names = ['post']
+    stream = False
+
+    async def post(self, request):
+        try:
+            body = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+        message = (body or {}).get('message', '') if isinstance(body, dict) else ''
+
+        client, specialization, branch, error = await db_sync_to_async(authenticate_chat_request)(request)
+        if error is not None:
+            return JsonResponse({'error': error[0]}, status=error[1])
+        if not message:
+            return JsonResponse({'error': 'message is required'}, status=400)
+
+        generator = await db_sync_to_async(ResponseGenerator)()
+        rag_response = await generator.agenerate(
+            query=message,
+            client=client,
+            specialization=specialization,
+            branch=branch,
+            stream=self.stream,
+        )
+
+        if self.stream:
+            response = StreamingHttpResponse(rag_response, content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        return JsonResponse({
+            'response': getattr(rag_response, 'answer', ''),
+            'sources': getattr(rag_response, 'sources', []),
+            'num_chunks': getattr(rag_response, 'num_chunks', 0),
+            'total_tokens': getattr(rag_response, 'total_tokens', 0),
+        })
+
+
+class AsyncRAGChatStreamView(AsyncRAGChatView):
+    """Async SSE chat: the same events as PublicRAGChatStreamView."""
+    stream = True
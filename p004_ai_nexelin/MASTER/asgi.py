@@ -1,5 +1,5 @@
 """
-ASGI config for admin_panel project.
+ASGI config for MASTER project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
@@ -11,6 +11,6 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'admin_panel.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MASTER.settings')
 
 application = get_asgi_application()
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0004_make_vector_nullable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branchembedding',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        # Бекфіл: той самий SHA-256 (hex), що й MASTER.processing.hashing.content_hash
+        migrations.RunSQL(
+            sql="UPDATE branches_branchembedding SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex') WHERE content_hash = '';",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='branchembedding',
+            index=models.Index(fields=['embedding_model', 'content_hash'], name='branch_emb_model_hash_idx'),
+        ),
+    ]
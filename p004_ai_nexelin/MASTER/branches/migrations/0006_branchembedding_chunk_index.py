@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0005_branchembedding_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branchembedding',
+            name='chunk_index',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # Бекфіл з metadata['chunk_index'], яке пайплайн пише в кожен рядок
+        migrations.RunSQL(
+            sql="UPDATE branches_branchembedding SET chunk_index = (metadata->>'chunk_index')::integer WHERE jsonb_typeof(metadata->'chunk_index') = 'number';",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='branchembedding',
+            index=models.Index(fields=['document', 'chunk_index'], name='branch_emb_doc_chunk_idx'),
+        ),
+    ]
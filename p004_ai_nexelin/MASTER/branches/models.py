@@ -3,6 +3,8 @@ from django.conf import settings
 from django.core.exceptions import ValidationError
 from pgvector.django import VectorField
 from MASTER.EmbeddingModel.models import EmbeddingModel
+from MASTER.processing.hashing import content_hash as compute_content_hash
+from MASTER.processing.vectors import fit_vector
 
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -145,13 +147,15 @@ class BranchEmbedding(models.Model):
         related_name='branch_embeddings'
     )
     
-    # TECHNICAL DEBT: Fixed at 3072 dimensions (max for text-embedding-3-large)
-    # Most models use 1536 (text-embedding-3-small), wasting 50% storage
-    # TODO: Consider dynamic dimensions or separate tables per model dimension
-    # Current approach: pad smaller vectors with zeros (see save() method)
-    vector = VectorField(dimensions=3072, null=True, blank=True)
+    # Нативна розмірність embedding_model (без доповнення нулями); ANN-індекси —
+    # часткові, по одному на модель (див. MASTER.processing.vectors)
+    vector = VectorField(null=True, blank=True)
     content = models.TextField()
     metadata = models.JSONField(default=dict, blank=True)
+    # SHA-256 від content — для повторного використання векторів ідентичних чанків
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    # Позиція чанка в документі (дублює metadata['chunk_index']) — для вибірки сусідніх чанків
+    chunk_index = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -160,19 +164,18 @@ class BranchEmbedding(models.Model):
         indexes = [
             models.Index(fields=['branch']),
             models.Index(fields=['embedding_model']),
+            models.Index(fields=['embedding_model', 'content_hash'], name='branch_emb_model_hash_idx'),
+            models.Index(fields=['document', 'chunk_index'], name='branch_emb_doc_chunk_idx'),
         ]
 
     def __str__(self):
         return f"Branch {self.branch.name} - {self.content[:50]}"
     
     def save(self, *args, **kwargs):
+        self.content_hash = compute_content_hash(self.content)
+        self.chunk_index = (self.metadata or {}).get('chunk_index', self.chunk_index) or 0
         if self.vector is not None and self.embedding_model:
-            expected_dim = self.embedding_model.dimensions
-            actual_dim = len(self.vector)
-            if actual_dim > 3072:
-                raise ValidationError(f"Vector dimensions exceed maximum: {actual_dim} > 3072")
-            if actual_dim < 3072:
-                self.vector = list(self.vector) + [0.0] * (3072 - actual_dim)
+            self.vector = fit_vector(self.vector, self.embedding_model.dimensions)
         super().save(*args, **kwargs)
 
 
@@ -209,7 +212,8 @@ def auto_generate_embedding_vector(sender, instance, **kwargs):
             text=instance.content,
             embedding_model=instance.embedding_model
         )
-        instance.vector = result['vector']
+        # Локальний fallback має 1536 вимірів — приводимо до нативної розмірності моделі
+        instance.vector = fit_vector(result['vector'], instance.embedding_model.dimensions, truncate=True)
         
         # Оновлюємо metadata з інформацією про вектор
         if not instance.metadata:
@@ -0,0 +1,137 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from MASTER.EmbeddingModel.models import EmbeddingModel
+from MASTER.processing.vectors import (
+    BINARY_INDEX_PREFIXES,
+    binary_index_name,
+    distance_sql,
+    embedding_tables,
+    ensure_vector_indexes,
+    vector_index_name,
+)
+
+# Колонка власника (тенанта) для таблиць, де вона є — так фільтрує пошук у чаті
+OWNER_COLUMNS = {
+    'client_emb': 'client_id',
+    'branch_emb': 'branch_id',
+    'spec_emb': 'specialization_id',
+}
+
+
+class Command(BaseCommand):
+    help = "Report per-model ANN (HNSW) indexes of the embedding tables: size, usage and query plans"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model-id", type=int, help="Only this embedding model")
+        parser.add_argument("--build", action="store_true", help="Create missing or stale indexes (CONCURRENTLY) first")
+        parser.add_argument("--explain", action="store_true", help="EXPLAIN a search query per table/model")
+        parser.add_argument("--analyze", action="store_true", help="Use EXPLAIN ANALYZE (runs the query)")
+        parser.add_argument("--limit", type=int, default=10, help="LIMIT of the explained query")
+
+    def handle(self, *args, **opts):
+        models_qs = EmbeddingModel.objects.all().order_by('id')
+        if opts.get("model_id"):
+            models_qs = models_qs.filter(id=opts["model_id"])
+
+        for embedding_model in models_qs:
+            if opts["build"]:
+                created = ensure_vector_indexes(embedding_model)
+                self.stdout.write(f"Ensured {len(created)} index(es) for {embedding_model}")
+
+            self.stdout.write(self.style.SUCCESS(f"\n{embedding_model} (id={embedding_model.pk})"))
+            for table, prefix in embedding_tables():
+                self._report_index(table, prefix, vector_index_name(prefix, embedding_model.pk), embedding_model, opts)
+                if prefix in BINARY_INDEX_PREFIXES:
+                    # Бінарний індекс двоетапного пошуку — для порівняння розміру з повним
+                    self._report_index(
+                        table, prefix, binary_index_name(prefix, embedding_model.pk), embedding_model,
+                        {**opts, "explain": False},
+                    )
+
+    def _report_index(self, table, prefix, name, embedding_model, opts):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM {table} WHERE embedding_model_id = %s AND vector IS NOT NULL",
+                [embedding_model.pk],
+            )
+            rows = cursor.fetchone()[0]
+            # Для partitioned-таблиці (clients 0024) — сума по індексах усіх партицій
+            cursor.execute(
+                "SELECT pg_size_pretty(sum(pg_relation_size(t.relid))), "
+                "bool_and(i.indisvalid) FILTER (WHERE t.level = 0), "
+                "COALESCE(sum(s.idx_scan), 0), COALESCE(sum(s.idx_tup_read), 0), "
+                "array_agg(c2.relname::text), count(*) FILTER (WHERE t.isleaf) "
+                "FROM pg_class c CROSS JOIN LATERAL pg_partition_tree(c.oid) t "
+                "JOIN pg_index i ON i.indexrelid = t.relid "
+                "JOIN pg_class c2 ON c2.oid = t.relid "
+                "LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = t.relid "
+                "WHERE c.relname = %s AND c.relkind IN ('i', 'I')",
+                [name],
+            )
+            size, is_valid, scans, tuples_read, index_names, leaves = cursor.fetchone()
+
+        if not index_names:
+            self.stdout.write(self.style.WARNING(f"  {table}: {rows} row(s), index {name} MISSING"))
+        else:
+            partitions = f" across {leaves} partition(s)" if len(index_names) > 1 else ""
+            line = f"  {table}: {rows} row(s), {name} {size}{partitions}, scans={scans}, tuples read={tuples_read}"
+            self.stdout.write(line if is_valid else self.style.ERROR(f"{line} INVALID"))
+
+        if opts["explain"] and rows:
+            self._explain(table, prefix, set(index_names or [name]), embedding_model, opts)
+
+    def _explain(self, table, prefix, index_names, embedding_model, opts):
+        """EXPLAIN the chat query shape (tenant filter + model filter + ORDER BY distance LIMIT k)."""
+        owner_column = OWNER_COLUMNS.get(prefix)
+        owner_select = f", {owner_column}" if owner_column else ""
+        dimensions = embedding_model.dimensions
+
+        # Параметри пошуку (ef_search тощо) — як у VectorSearchService; ANALYZE — у транзакції з відкатом
+        from MASTER.rag.vector_search import VectorSearchService
+
+        with transaction.atomic():
+            VectorSearchService()._set_pgvector_parameters()
+            with connection.cursor() as cursor:
+                # Запит — вектор існуючого рядка, тенант — його власник
+                cursor.execute(
+                    f"SELECT vector::text{owner_select} FROM {table} "
+                    "WHERE embedding_model_id = %s AND vector IS NOT NULL LIMIT 1",
+                    [embedding_model.pk],
+                )
+                sample = cursor.fetchone()
+                params = [embedding_model.pk]
+                owner_filter = ""
+                if owner_column:
+                    owner_filter = f" AND e.{owner_column} = %s"
+                    params.append(sample[1])
+                params.extend([sample[0], opts["limit"]])
+
+                cursor.execute(
+                    f"EXPLAIN ({'ANALYZE, ' if opts['analyze'] else ''}FORMAT JSON) "
+                    f"SELECT e.id FROM {table} e WHERE e.embedding_model_id = %s{owner_filter} "
+                    f"ORDER BY {distance_sql('e.vector', '%s::vector', dimensions)} LIMIT %s",
+                    params,
+                )
+                plan = cursor.fetchone()[0]
+            transaction.set_rollback(True)
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        root = plan[0]
+        used = sorted(self._index_names(root['Plan']))
+        uses_ann = bool(index_names & set(used))
+        timing = f", {root['Execution Time']:.1f} ms" if 'Execution Time' in root else ""
+        verdict = "uses ANN index" if uses_ann else "NO ANN index"
+        message = f"    plan{' (tenant-filtered)' if owner_column else ''}: {verdict}; indexes={used or '-'}; cost={root['Plan']['Total Cost']}{timing}"
+        self.stdout.write(self.style.SUCCESS(message) if uses_ann else self.style.WARNING(message))
+
+    def _index_names(self, node):
+        names = set()
+        if node.get('Index Name'):
+            names.add(node['Index Name'])
+        for child in node.get('Plans', []):
+            names |= self._index_names(child)
+        return names
@@ -0,0 +1,96 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from MASTER.EmbeddingModel.models import EmbeddingModel
+from MASTER.branches.models import Branch, BranchEmbedding
+from MASTER.rag.vector_search import VectorSearchService
+from MASTER.specializations.models import Specialization, SpecializationEmbedding
+
+# Рівні з бінарними індексами: (модель embeddings, FK власника, модель власника, аргумент search())
+LEVELS = {
+    'branch': (BranchEmbedding, 'branch_id', Branch, 'branch'),
+    'specialization': (SpecializationEmbedding, 'specialization_id', Specialization, 'specialization'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure recall@k and latency of the quantized two-stage search against exact search, "
+        "both as the combined SQL statement and through the per-level ORM path"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--level", choices=sorted(LEVELS), default="specialization")
+        parser.add_argument("--model-id", type=int, required=True, help="Embedding model to test")
+        parser.add_argument("--samples", type=int, default=50, help="Number of sample queries")
+        parser.add_argument("--k", type=int, help="Results per query (default: max_results_per_level)")
+        parser.add_argument("--candidates", type=int, help="First-stage candidates (default: quantized_candidates)")
+
+    def handle(self, *args, **opts):
+        try:
+            embedding_model = EmbeddingModel.objects.get(id=opts["model_id"])
+        except EmbeddingModel.DoesNotExist:
+            raise CommandError(f"EmbeddingModel with id={opts['model_id']} not found")
+        embedding_cls, owner_field, owner_cls, search_arg = LEVELS[opts["level"]]
+
+        exact = VectorSearchService(strategy='exact')
+        quantized = VectorSearchService(strategy='quantized')
+        for service in (exact, quantized):
+            # Без порогу схожості: порівнюємо чисті top-k
+            service.similarity_threshold = -1.0
+            if opts.get("k"):
+                service.max_results_per_level = opts["k"]
+        if opts.get("candidates"):
+            quantized.config = {**quantized.config, 'quantized_candidates': opts["candidates"]}
+        # (назва, сервіс, combined): квантизований пошук — і одним SQL, і окремим ORM-запитом рівня
+        runs = (
+            ('exact', exact, True),
+            ('quantized', quantized, True),
+            ('quantized_per_level', quantized, False),
+        )
+
+        # Запити — вектори випадкових рядків, тенант — їхній власник
+        samples = list(
+            embedding_cls.objects
+            .filter(embedding_model=embedding_model, vector__isnull=False)
+            .order_by('?')
+            .values_list(owner_field, 'vector')[:opts["samples"]]
+        )
+        if not samples:
+            raise CommandError(f"No {opts['level']} embeddings for {embedding_model}")
+        owners = owner_cls.objects.in_bulk({owner_id for owner_id, _vector in samples})
+
+        recalls = {name: [] for name, _service, _combined in runs if name != 'exact'}
+        timings = {name: [] for name, _service, _combined in runs}
+        for owner_id, vector in samples:
+            query_vector = [float(v) for v in vector]
+            found = {}
+            for name, service, combined in runs:
+                started = time.perf_counter()
+                results = service.search(
+                    query_vector=query_vector,
+                    embedding_model=embedding_model,
+                    combined=combined,
+                    **{search_arg: owners[owner_id]},
+                )
+                timings[name].append((time.perf_counter() - started) * 1000)
+                found[name] = {(r.document_id, r.chunk_index) for r in results}
+            if found['exact']:
+                for name in recalls:
+                    recalls[name].append(len(found['exact'] & found[name]) / len(found['exact']))
+
+        self.stdout.write(
+            f"{opts['level']} / {embedding_model}: {len(samples)} queries, "
+            f"k={exact.max_results_per_level}, candidates={quantized._quantized_candidates()}"
+        )
+        for name, values in recalls.items():
+            if values:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{name} recall@k: mean {statistics.mean(values):.3f}, min {min(values):.3f}"
+                ))
+        for name, values in timings.items():
+            values.sort()
+            p95 = values[min(int(len(values) * 0.95), len(values) - 1)]
+            self.stdout.write(f"{name}: p50 {statistics.median(values):.1f} ms, p95 {p95:.1f} ms")
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0019_add_unique_tag_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientembedding',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        # Бекфіл: той самий SHA-256 (hex), що й MASTER.processing.hashing.content_hash
+        migrations.RunSQL(
+            sql="UPDATE clients_clientembedding SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex') WHERE content_hash = '';",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='clientembedding',
+            index=models.Index(fields=['embedding_model', 'content_hash'], name='client_emb_model_hash_idx'),
+        ),
+    ]
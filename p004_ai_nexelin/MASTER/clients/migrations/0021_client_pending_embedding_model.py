@@ -0,0 +1,25 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EmbeddingModel', '0002_vector_dimensions_fixed'),
+        ('clients', '0020_clientembedding_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='pending_embedding_model',
+            field=models.ForeignKey(
+                blank=True,
+                help_text='Embedding model being built in the background; becomes embedding_model after cut-over.',
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='pending_clients',
+                to='EmbeddingModel.EmbeddingModel',
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0021_client_pending_embedding_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientembedding',
+            name='chunk_index',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # Бекфіл з metadata['chunk_index'], яке пайплайн пише в кожен рядок
+        migrations.RunSQL(
+            sql="UPDATE clients_clientembedding SET chunk_index = (metadata->>'chunk_index')::integer WHERE jsonb_typeof(metadata->'chunk_index') = 'number';",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='clientembedding',
+            index=models.Index(fields=['document', 'chunk_index'], name='client_emb_doc_chunk_idx'),
+        ),
+    ]
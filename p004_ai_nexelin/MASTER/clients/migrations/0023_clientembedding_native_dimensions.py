@@ -0,0 +1,34 @@
+from django.db import migrations
+import pgvector.django.vector
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0022_clientembedding_chunk_index'),
+        ('EmbeddingModel', '0002_vector_dimensions_fixed'),
+    ]
+
+    # Нативні розмірності замість vector(3072) — див. MASTER.processing.vectors
+    operations = [
+        migrations.RunSQL(
+            sql="DROP INDEX IF EXISTS client_emb_vector_idx;",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='clientembedding',
+            name='vector',
+            field=pgvector.django.vector.VectorField(blank=True, null=True),
+        ),
+        migrations.RunSQL(
+            sql=(
+                "UPDATE clients_clientembedding e SET vector = subvector(e.vector, 1, m.dimensions) "
+                "FROM \"EmbeddingModel_embeddingmodel\" m "
+                "WHERE m.id = e.embedding_model_id AND vector_dims(e.vector) > m.dimensions;"
+            ),
+            reverse_sql=(
+                "UPDATE clients_clientembedding SET vector = (vector::real[] || array_fill(0::real, ARRAY[3072 - vector_dims(vector)]))::vector "
+                "WHERE vector_dims(vector) < 3072;"
+            ),
+        ),
+    ]
@@ -0,0 +1,107 @@
+from django.db import migrations
+
+TABLE = 'clients_clientembedding'
+# Кількість hash-партицій за client_id; змінити — лише новою міграцією з перенесенням даних
+PARTITIONS = 16
+
+
+def _index_and_fk_definitions(cursor, table):
+    """(CREATE INDEX ..., [(constraint name, FK definition)]) таблиці, крім первинного ключа."""
+    cursor.execute(
+        "SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i "
+        "WHERE i.indrelid = %s::regclass AND NOT i.indisprimary",
+        [table],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    return indexes, cursor.fetchall()
+
+
+def _rebuild(schema_editor, partitioned):
+    """Переносить таблицу в нову (partitioned або звичайну) з тими самими індексами, FK та id."""
+    old = f'{TABLE}_old'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {old}")
+        indexes, foreign_keys = _index_and_fk_definitions(cursor, old)
+        # pg_get_indexdef() завжди кваліфікує таблицю схемою (public.<table>_old),
+        # тож посилання будуємо так само: quote_ident(schema).quote_ident(relname)
+        cursor.execute(
+            "SELECT quote_ident(n.nspname) || '.' || quote_ident(c.relname) "
+            "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.oid = %s::regclass",
+            [old],
+        )
+        old_ref = cursor.fetchone()[0]
+
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING STORAGE)"
+            + (" PARTITION BY HASH (client_id)" if partitioned else "")
+        )
+        if partitioned:
+            # Первинний ключ partitioned-таблиці мусить містити ключ партиціювання
+            cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, client_id)")
+            for remainder in range(PARTITIONS):
+                cursor.execute(
+                    f"CREATE TABLE {TABLE}_p{remainder:02d} PARTITION OF {TABLE} "
+                    f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})"
+                )
+        else:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id)")
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {old}")
+
+        # serial-послідовність належить старій таблиці — переносимо, щоб DROP її не видалив
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+            [old],
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [old])
+            sequence = cursor.fetchone()[0]
+            if sequence:
+                cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id")
+        cursor.execute(f"DROP TABLE {old}")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE(max(id), 0) + 1, false) FROM {TABLE}"
+        )
+
+        # Індекси (B-tree та часткові HNSW по моделях) на батьківській таблиці
+        # автоматично створюються в кожній партиції
+        for definition in indexes:
+            recreated = definition.replace(f" ON ONLY {old_ref} ", f" ON {TABLE} ", 1)
+            recreated = recreated.replace(f" ON {old_ref} ", f" ON {TABLE} ", 1)
+            if recreated == definition:
+                raise RuntimeError(f"Unexpected index definition for {old_ref}: {definition}")
+            cursor.execute(recreated)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+
+
+def partition_table(apps, schema_editor):
+    _rebuild(schema_editor, partitioned=True)
+
+
+def unpartition_table(apps, schema_editor):
+    _rebuild(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+    """Hash-партиціювання ClientEmbedding за client_id.
+
+    Пошук завжди фільтрує по client_id, тож запит торкається однієї партиції та її
+    HNSW-індексів, а переіндексація одного клієнта не роздуває таблицю й індекси інших.
+    Дані копіюються в одній транзакції (таблиця заблокована на час міграції).
+    """
+
+    dependencies = [
+        ('clients', '0023_clientembedding_native_dimensions'),
+        ('EmbeddingModel', '0003_vector_indexes_per_model'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table, unpartition_table),
+    ]
@@ -1,3 +1,138 @@
-from django.test import TestCase
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from MASTER.EmbeddingModel.models import EmbeddingModel
+from MASTER.processing.embedding_service import EmbeddingService
+from MASTER.processing.hashing import content_hash
+from MASTER.processing.pipeline import IngestionPipeline
+
+from .models import Client, ClientDocument, ClientEmbedding
+
+EMBEDDING_TABLE = 'clients_clientembedding'
+
+
+class PgvectorTestMixin:
+    """Пропускає тест, якщо тестова БД не має розширення vector."""
+
+    def setUp(self):
+        super().setUp()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'vector'")
+            if cursor.fetchone() is None:
+                self.skipTest('Потрібен PostgreSQL з pgvector')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Потрібен PostgreSQL з pgvector')
+class PartitionClientEmbeddingMigrationTests(PgvectorTestMixin, TransactionTestCase):
+    """Міграція 0024 в обидва боки: індекси й FK мають опинитися на новій таблиці."""
+
+    before = [('clients', '0023_clientembedding_native_dimensions')]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+
+    def _table_state(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [EMBEDDING_TABLE])
+            relkind = cursor.fetchone()[0]
+            cursor.execute(
+                "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE i.indrelid = %s::regclass AND NOT i.indisprimary ORDER BY 1",
+                [EMBEDDING_TABLE],
+            )
+            indexes = [row[0] for row in cursor.fetchall()]
+            cursor.execute(
+                "SELECT count(*) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                [EMBEDDING_TABLE],
+            )
+            foreign_keys = cursor.fetchone()[0]
+            cursor.execute("SELECT to_regclass(%s)", [f'{EMBEDDING_TABLE}_old'])
+            leftover = cursor.fetchone()[0]
+        return relkind, indexes, foreign_keys, leftover
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self._migrate(executor.loader.graph.leaf_nodes())
+
+    def test_round_trip_keeps_indexes_on_new_table(self):
+        self._migrate(self.before)
+        relkind, plain_indexes, plain_fks, leftover = self._table_state()
+        self.assertEqual(relkind, 'r')
+        self.assertIsNone(leftover)
+        self.assertTrue(plain_indexes)
+
+        self._migrate([('clients', '0024_partition_clientembedding')])
+        relkind, indexes, foreign_keys, leftover = self._table_state()
+        self.assertEqual(relkind, 'p')
+        self.assertIsNone(leftover)
+        self.assertEqual(indexes, plain_indexes)
+        self.assertEqual(foreign_keys, plain_fks)
+
+        self._migrate(self.before)
+        relkind, indexes, foreign_keys, leftover = self._table_state()
+        self.assertEqual(relkind, 'r')
+        self.assertIsNone(leftover)
+        self.assertEqual(indexes, plain_indexes)
+        self.assertEqual(foreign_keys, plain_fks)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Потрібен PostgreSQL з pgvector')
+class VectorReuseTests(PgvectorTestMixin, TestCase):
+    """Повторне завантаження ідентичного тексту не звертається до провайдера."""
+
+    def setUp(self):
+        super().setUp()
+        self.embedding_model = EmbeddingModel.objects.create(
+            name='Reuse test', provider='openai', model_name='text-embedding-3-small', dimensions=8,
+        )
+        self.client_obj = Client.objects.create(
+            user='reuse-test', tag='reuse-test', description='', embedding_model=self.embedding_model,
+        )
+        # bulk_create — без save() і post_save, що запускає обробку файлу
+        self.documents = ClientDocument.objects.bulk_create([
+            ClientDocument(client=self.client_obj, title=f'doc {n}', file=f'clients/doc{n}.txt',
+                           file_type='txt', file_size=0)
+            for n in range(2)
+        ])
+        self.pipeline = IngestionPipeline('client')
+        self.chunks = [{'text': 'Identical chunk text', 'metadata': {'chunk_index': 0}}]
+
+    def _ingest(self, document):
+        results = self.pipeline.embed(self.chunks, self.embedding_model, self.client_obj)
+        totals = {'chunks': 0, 'reused': 0, 'tokens': 0, 'cost': 0.0}
+        rows = self.pipeline.build_rows(
+            self.client_obj, document, self.embedding_model, self.chunks, results, {}, totals, 1,
+        )
+        self.pipeline.persist(document, rows, self.embedding_model)
+        return results
+
+    def test_second_ingest_reuses_stored_vector(self):
+        generated = [{'vector': [0.5] * 8, 'token_count': 3, 'dimensions': 8}]
+        with mock.patch.object(EmbeddingService, 'create_embeddings_batch', return_value=generated):
+            first = self._ingest(self.documents[0])
+        self.assertFalse(first[0]['reused'])
+
+        with mock.patch('MASTER.processing.embedding_service.get_openai_client') as openai_client, \
+                mock.patch.object(EmbeddingService, 'create_embedding') as create_embedding:
+            second = self._ingest(self.documents[1])
+
+        openai_client.assert_not_called()
+        create_embedding.assert_not_called()
+        self.assertTrue(second[0]['reused'])
+        self.assertEqual(second[0]['vector'], [0.5] * 8)
+        self.assertEqual(ClientEmbedding.objects.filter(client=self.client_obj).count(), 2)
+
+    def test_fallback_vectors_are_not_reused(self):
+        generated = [{'vector': [0.5] * 8, 'token_count': 3, 'dimensions': 8, 'fallback': True}]
+        with mock.patch.object(EmbeddingService, 'create_embeddings_batch', return_value=generated):
+            self._ingest(self.documents[0])
+        self.assertEqual(
+            self.pipeline.find_existing_vectors(
+                {content_hash(self.chunks[0]['text'])}, self.embedding_model, self.client_obj
+            ), {}
+        )
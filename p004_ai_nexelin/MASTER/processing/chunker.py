@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List
 
 try:
     import tiktoken
@@ -47,7 +48,9 @@ def chunk_text(
             start = end - min(overlap, end)
         return chunks
 
-    encoding = tiktoken.get_encoding(encoding_name)
+    from .provider_clients import get_encoding_by_name
+
+    encoding = get_encoding_by_name(encoding_name)
     tokens = encoding.encode(text)
     num_tokens = len(tokens)
     if num_tokens == 0:
@@ -79,6 +82,124 @@ def chunk_text(
 
     return chunks
 
+def iter_chunks(
+    segments: Iterable[str],
+    chunk_size: int = 512,
+    overlap: int = 50,
+    encoding_name: str = "cl100k_base",
+) -> Iterator[Dict[str, Any]]:
+    """Lazily chunk a stream of text segments (pages, sections) like chunk_text.
+
+    Metadata matches chunk_text (start_pos/end_pos are token indices) plus start_char/end_char,
+    the character offsets of the chunk in the concatenated source. Chunk text is sliced
+    from the source at those offsets instead of decoding token slices, and only the
+    current window (token offsets + its text) is kept, so memory does not grow with the
+    document. A chunk is emitted once more tokens are known to follow it, which keeps the
+    boundaries identical to chunk_text (up to tokenisation across segment boundaries).
+    """
+    step = max(chunk_size - overlap, 1)
+    idx = 0
+
+    # Вже використаний префікс буферів не видаляється на кожен чанк (це копіювало б увесь
+    # залишок — квадратично для одного великого сегмента): рухаємо індекс голови, а
+    # стискаємо буфер, лише коли використаний префікс перевищує половину
+    if tiktoken is None:
+        # Fallback: approximate by characters if tiktoken is unavailable
+        text_buffer = ""
+        head = 0
+        offset = 0
+        for segment in segments:
+            if not segment:
+                continue
+            text_buffer += segment
+            while len(text_buffer) - head > chunk_size:
+                chunk_str = text_buffer[head:head + chunk_size]
+                yield _chunk(chunk_str, idx, offset, offset + len(chunk_str), len(chunk_str.split()),
+                             offset, offset + len(chunk_str))
+                idx += 1
+                head += step
+                offset += step
+            if head > len(text_buffer) // 2:
+                text_buffer = text_buffer[head:]
+                head = 0
+        if len(text_buffer) > head:
+            chunk_str = text_buffer[head:]
+            yield _chunk(chunk_str, idx, offset, offset + len(chunk_str), len(chunk_str.split()),
+                         offset, offset + len(chunk_str))
+        return
+
+    from .provider_clients import get_encoding_by_name
+
+    encoding = get_encoding_by_name(encoding_name)
+    # Символьні зсуви (від початку джерела) початку кожного токена; вікно — token_chars[head:]
+    token_chars: List[int] = []
+    head = 0
+    text_buffer = ""
+    buffer_char_start = 0
+    consumed_chars = 0
+    token_start = 0
+    for segment in segments:
+        if not segment:
+            continue
+        tokens = encoding.encode(segment)
+        # Один decode на сегмент дає char-зсув кожного токена (без decode на кожен чанк)
+        _, offsets = encoding.decode_with_offsets(tokens)
+        token_chars.extend(consumed_chars + offset for offset in offsets)
+        text_buffer += segment
+        consumed_chars += len(segment)
+
+        while len(token_chars) - head > chunk_size:
+            start_char = token_chars[head]
+            end_char = token_chars[head + chunk_size]
+            yield _chunk(
+                text_buffer[start_char - buffer_char_start:end_char - buffer_char_start],
+                idx, token_start, token_start + chunk_size, chunk_size, start_char, end_char,
+            )
+            idx += 1
+            head += step
+            token_start += step
+
+            if head > len(token_chars) // 2:
+                del token_chars[:head]
+                head = 0
+            # Відкидаємо текст, що вже не потрапить у жоден наступний чанк
+            used_chars = token_chars[head] - buffer_char_start
+            if used_chars > len(text_buffer) // 2:
+                text_buffer = text_buffer[used_chars:]
+                buffer_char_start = token_chars[head]
+
+    if len(token_chars) > head:
+        start_char = token_chars[head]
+        yield _chunk(
+            text_buffer[start_char - buffer_char_start:],
+            idx, token_start, token_start + len(token_chars) - head, len(token_chars) - head,
+            start_char, consumed_chars,
+        )
+
+
+def _chunk(
+    text: str, idx: int, start: int, end: int, token_count: int, start_char: int, end_char: int
+) -> Dict[str, Any]:
+    return {
+        "text": text,
+        "metadata": {
+            "chunk_index": idx,
+            "start_pos": start,
+            "end_pos": end,
+            "token_count": token_count,
+            "start_char": start_char,
+            "end_char": end_char,
+        },
+    }
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Групує потік у списки по `size` елементів (останній може бути коротшим)."""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
 def split_text_into_chunks(text, chunk_size=800, overlap=100):
     chunks = []
     start = 0
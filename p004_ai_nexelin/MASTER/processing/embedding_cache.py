@@ -0,0 +1,182 @@
+"""
+Two-tier cache for query embeddings.
+
+Key: (provider:model, normalised text). Tier 1 is a size/TTL-bounded LRU inside the
+process, tier 2 is Redis (the Celery broker by default) shared by all workers. Redis
+errors never break a request — the cache just degrades to the local tier.
+
+Only real provider embeddings are cached; local TF-IDF fallbacks are not.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_COUNT = struct.Struct("<I")
+
+
+def normalize_text(text: str) -> str:
+    """NFKC + casefold + схлопування пробілів: "  Меню?" і "меню?" дають один ключ."""
+    return " ".join(unicodedata.normalize("NFKC", text or "").casefold().split())
+
+
+class EmbeddingCache:
+    """In-process LRU in front of Redis with hit/miss counters."""
+
+    def __init__(self, config: dict[str, Any] | None = None):
+        config = config if config is not None else getattr(settings, "EMBEDDING_CACHE_CONFIG", {})
+        self.enabled = config.get("enabled", True)
+        self.local_max_entries = int(config.get("local_max_entries", 1024))
+        self.local_ttl = float(config.get("local_ttl_seconds", 600))
+        self.redis_ttl = int(config.get("redis_ttl_seconds", 86400))
+        self.redis_url = config.get("redis_url") or ""
+        self.key_prefix = config.get("key_prefix", "embcache:v1")
+
+        self._lock = threading.Lock()
+        self._local: OrderedDict[str, tuple[float, tuple[float, ...], int]] = OrderedDict()
+        self._redis = None
+        self._redis_pid: int | None = None
+        self._stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "errors": 0}
+
+    def make_key(self, model_key: str, text: str) -> str:
+        digest = hashlib.sha256(f"{model_key}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+        return f"{self.key_prefix}:{digest}"
+
+    def get(self, model_key: str, text: str) -> dict[str, Any] | None:
+        if not self.enabled:
+            return None
+        key = self.make_key(model_key, text)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                expires_at, vector, token_count = entry
+                if expires_at > now:
+                    self._local.move_to_end(key)
+                    self._stats["local_hits"] += 1
+                    return self._result(vector, token_count)
+                del self._local[key]
+
+        cached = self._redis_get(key)
+        if cached is not None:
+            vector, token_count = cached
+            self._store_local(key, vector, token_count)
+            with self._lock:
+                self._stats["redis_hits"] += 1
+            return self._result(vector, token_count)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, model_key: str, text: str, result: dict[str, Any]) -> None:
+        if not self.enabled or not result.get("vector"):
+            return
+        key = self.make_key(model_key, text)
+        vector = tuple(float(v) for v in result["vector"])
+        token_count = int(result.get("token_count") or 0)
+        self._store_local(key, vector, token_count)
+        self._redis_set(key, vector, token_count)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            data = dict(self._stats)
+            data["local_entries"] = len(self._local)
+        lookups = data["local_hits"] + data["redis_hits"] + data["misses"]
+        data["hit_rate"] = round((data["local_hits"] + data["redis_hits"]) / lookups, 4) if lookups else None
+        return data
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+    @staticmethod
+    def _result(vector: tuple[float, ...], token_count: int) -> dict[str, Any]:
+        return {
+            "vector": list(vector),
+            "token_count": token_count,
+            "dimensions": len(vector),
+            "cached": True,
+        }
+
+    def _store_local(self, key: str, vector: tuple[float, ...], token_count: int) -> None:
+        if self.local_max_entries <= 0:
+            return
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, vector, token_count)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    def _get_redis(self):
+        if not self.redis_url:
+            return None
+        # Після fork створюємо власне з'єднання в дочірньому процесі
+        if self._redis is None or self._redis_pid != os.getpid():
+            import redis
+
+            self._redis = redis.Redis.from_url(
+                self.redis_url, socket_timeout=0.2, socket_connect_timeout=0.2
+            )
+            self._redis_pid = os.getpid()
+        return self._redis
+
+    def _redis_get(self, key: str) -> tuple[tuple[float, ...], int] | None:
+        try:
+            client = self._get_redis()
+            if client is None:
+                return None
+            raw = client.get(key)
+        except Exception as e:  # noqa: BLE001
+            self._count_error(e)
+            return None
+        if not raw or len(raw) < _TOKEN_COUNT.size:
+            return None
+        # Формат: uint32 token_count + float32 вектор (вдвічі менше, ніж JSON/float64)
+        (token_count,) = _TOKEN_COUNT.unpack_from(raw)
+        vector = array("f")
+        vector.frombytes(raw[_TOKEN_COUNT.size:])
+        return tuple(vector), token_count
+
+    def _redis_set(self, key: str, vector: tuple[float, ...], token_count: int) -> None:
+        try:
+            client = self._get_redis()
+            if client is None:
+                return
+            payload = _TOKEN_COUNT.pack(token_count) + array("f", vector).tobytes()
+            client.set(key, payload, ex=self.redis_ttl)
+        except Exception as e:  # noqa: BLE001
+            self._count_error(e)
+
+    def _count_error(self, error: Exception) -> None:
+        with self._lock:
+            self._stats["errors"] += 1
+        logger.debug(f"Embedding cache Redis error: {error}")
+
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Спільний для процесу екземпляр кешу (налаштування — settings.EMBEDDING_CACHE_CONFIG)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
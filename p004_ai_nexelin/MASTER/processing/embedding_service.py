@@ -1,22 +1,39 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
 # pyright: reportMissingTypeStubs=false
 from MASTER.EmbeddingModel.models import EmbeddingModel
 
+from .embedding_cache import get_embedding_cache
+from .provider_clients import get_async_openai_client, get_encoding, get_openai_client
+
 
 class EmbeddingService:
     @staticmethod
-    def embed_text(text: str, model_name: str):
+    def embed_text(text: str, model_name: str, use_cache: bool = False):
         """Створює embedding для одиничного тексту через OpenAI з обробкою помилок і локальним fallback.
 
+        use_cache=True — для запитів користувачів: повторні тексти беруться з EmbeddingCache.
         Повертає dict: { 'vector': list[float], 'token_count': int, 'dimensions': int }
         """
+        cache = get_embedding_cache() if use_cache else None
+        model_key = f"openai:{model_name}"
+        if cache is not None:
+            cached = cache.get(model_key, text)
+            if cached is not None:
+                return cached
+
         try:
-            return EmbeddingService._openai_embed(text, model_name)
+            result = EmbeddingService._openai_embed(text, model_name)
         except Exception:  # noqa: BLE001
             if getattr(settings, "EMBEDDINGS_FALLBACK_LOCAL", True):
+                # Fallback не кешуємо — наступний запит знову спробує провайдера
                 return EmbeddingService._local_tfidf_embed(text)
             raise
 
+        if cache is not None:
+            cache.set(model_key, text, result)
+        return result
+
     @staticmethod
     def embed_batch(texts: list[str], model_name: str):
         """Створює embeddings для списку текстів батчем. При помилці — локальний TF-IDF fallback.
@@ -24,55 +41,188 @@ class EmbeddingService:
         Повертає list[dict], де кожен елемент: { 'vector': list[float], 'token_count': int, 'dimensions': int }
         """
         try:
-            from openai import OpenAI
-            import tiktoken
-
-            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-            encoding = tiktoken.encoding_for_model(model_name)
+            client = get_openai_client()
+            encoding = EmbeddingService._get_encoding(model_name)
             token_counts = [len(encoding.encode(t)) for t in texts]
+            return EmbeddingService._openai_embed_batch(client, texts, model_name, token_counts)
+        except Exception:  # noqa: BLE001
+            if getattr(settings, "EMBEDDINGS_FALLBACK_LOCAL", True):
+                return EmbeddingService._local_tfidf_embed_batch(texts)
+            raise
+
+    @staticmethod
+    def create_embeddings_batch(
+        texts: list[str],
+        embedding_model: EmbeddingModel,
+        batch_size: int | None = None,
+        max_tokens_per_request: int | None = None,
+    ) -> list[dict]:
+        """Створює embeddings для багатьох текстів мінімальною кількістю запитів до провайдера.
+
+        Тексти діляться на батчі не більше `batch_size` елементів і не більше
+        `max_tokens_per_request` токенів (дефолти — settings.EMBEDDING_BATCH_CONFIG).
+        Порядок результатів відповідає порядку `texts`; формат елемента — як у create_embedding.
+        """
+        if not texts:
+            return []
+
+        config = getattr(settings, "EMBEDDING_BATCH_CONFIG", {})
+        batch_size = max(int(batch_size or config.get("batch_size", 128)), 1)
+        max_tokens = max(int(max_tokens_per_request or config.get("max_tokens_per_request", 250000)), 1)
+
+        provider = embedding_model.provider
+        model_name = embedding_model.model_name
+
+        if provider != 'openai':
+            # Батчевий API реалізовано тільки для OpenAI — інші провайдери по одному тексту
+            return [EmbeddingService.create_embedding(t, embedding_model) for t in texts]
 
-            response = client.embeddings.create(input=texts, model=model_name)
-            vectors = [d.embedding for d in response.data]
-
-            results = []
-            for vec, tok in zip(vectors, token_counts):
-                results.append({
-                    'vector': vec,
-                    'token_count': tok,
-                    'dimensions': len(vec),
-                })
-            return results
+        try:
+            # Без ключа OpenAI (ValueError) чи tiktoken — той самий fallback, що й у create_embedding
+            encoding = EmbeddingService._get_encoding(model_name)
+            token_counts = [len(encoding.encode(t)) for t in texts]
+            client = get_openai_client()
         except Exception:  # noqa: BLE001
             if getattr(settings, "EMBEDDINGS_FALLBACK_LOCAL", True):
                 return EmbeddingService._local_tfidf_embed_batch(texts)
             raise
+
+        results: list[dict] = []
+        for start, end in EmbeddingService._batch_bounds(token_counts, batch_size, max_tokens):
+            batch_texts = texts[start:end]
+            try:
+                results.extend(EmbeddingService._openai_embed_batch(
+                    client, batch_texts, model_name, token_counts[start:end]
+                ))
+            except Exception:  # noqa: BLE001
+                if getattr(settings, "EMBEDDINGS_FALLBACK_LOCAL", True):
+                    results.extend(EmbeddingService._local_tfidf_embed_batch(batch_texts))
+                else:
+                    raise
+        return results
+
+    @staticmethod
+    def _batch_bounds(token_counts: list[int], batch_size: int, max_tokens: int) -> list[tuple[int, int]]:
+        """Ділить послідовність на [start, end) діапазони з обмеженням за кількістю і токенами.
+
+        Текст, що сам по собі перевищує ліміт токенів, іде окремим батчем.
+        """
+        bounds: list[tuple[int, int]] = []
+        start = 0
+        batch_tokens = 0
+        for idx, tokens in enumerate(token_counts):
+            batch_len = idx - start
+            if batch_len and (batch_len >= batch_size or batch_tokens + tokens > max_tokens):
+                bounds.append((start, idx))
+                start = idx
+                batch_tokens = 0
+            batch_tokens += tokens
+        if start < len(token_counts):
+            bounds.append((start, len(token_counts)))
+        return bounds
+
+    @staticmethod
+    def _openai_embed_batch(client, texts: list[str], model_name: str, token_counts: list[int]):
+        response = client.embeddings.create(input=texts, model=model_name)
+        # OpenAI повертає index для кожного елемента — не покладаємось на порядок у відповіді
+        vectors = [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+        results = []
+        for vec, tok in zip(vectors, token_counts):
+            results.append({
+                'vector': vec,
+                'token_count': tok,
+                'dimensions': len(vec),
+            })
+        return results
+
+    @staticmethod
+    def _get_encoding(model_name: str):
+        return get_encoding(model_name)
+
     @staticmethod
-    def create_embedding(text, embedding_model: EmbeddingModel):
+    def create_embedding(text, embedding_model: EmbeddingModel, use_cache: bool = False):
         provider = embedding_model.provider
         model_name = embedding_model.model_name
+
+        cache = get_embedding_cache() if use_cache else None
+        model_key = f"{provider}:{model_name}"
+        if cache is not None:
+            cached = cache.get(model_key, text)
+            if cached is not None:
+                return cached
         
         try:
             if provider == 'openai':
-                return EmbeddingService._openai_embed(text, model_name)
+                result = EmbeddingService._openai_embed(text, model_name)
             elif provider == 'huggingface':
-                return EmbeddingService._huggingface_embed(text, model_name)
+                result = EmbeddingService._huggingface_embed(text, model_name)
             elif provider == 'cohere':
-                return EmbeddingService._cohere_embed(text, model_name)
+                result = EmbeddingService._cohere_embed(text, model_name)
             else:
                 raise ValueError(f"Unknown provider: {provider}")
         except Exception:  # noqa: BLE001
             if getattr(settings, "EMBEDDINGS_FALLBACK_LOCAL", True):
+                # Fallback не кешуємо — наступний запит знову спробує провайдера
                 return EmbeddingService._local_tfidf_embed(text)
             raise
+
+        if cache is not None:
+            cache.set(model_key, text, result)
+        return result
     
+    @staticmethod
+    async def acreate_embedding(text, embedding_model: EmbeddingModel, use_cache: bool = False):
+        """Async варіант create_embedding для ASGI: ті самі кеш і fallback.
+
+        OpenAI викликається через AsyncOpenAI; Redis-кеш, інші провайдери і TF-IDF fallback —
+        блокуючі, тож виконуються в пулі потоків, а не в event loop.
+        """
+        provider = embedding_model.provider
+        model_name = embedding_model.model_name
+        if provider != 'openai':
+            return await sync_to_async(EmbeddingService.create_embedding, thread_sensitive=False)(
+                text, embedding_model, use_cache
+            )
+
+        cache = get_embedding_cache() if use_cache else None
+        model_key = f"{provider}:{model_name}"
+        if cache is not None:
+            cached = await sync_to_async(cache.get, thread_sensitive=False)(model_key, text)
+            if cached is not None:
+                return cached
+
+        try:
+            result = await EmbeddingService._aopenai_embed(text, model_name)
+        except Exception:  # noqa: BLE001
+            if getattr(settings, "EMBEDDINGS_FALLBACK_LOCAL", True):
+                return await sync_to_async(EmbeddingService._local_tfidf_embed, thread_sensitive=False)(text)
+            raise
+
+        if cache is not None:
+            await sync_to_async(cache.set, thread_sensitive=False)(model_key, text, result)
+        return result
+
+    @staticmethod
+    async def _aopenai_embed(text: str, model_name: str):
+        client = get_async_openai_client()
+        # Перше завантаження tiktoken читає файл/мережу — не в event loop
+        token_count = await sync_to_async(
+            lambda: len(get_encoding(model_name).encode(text)), thread_sensitive=False
+        )()
+        response = await client.embeddings.create(input=text, model=model_name)
+        vector = response.data[0].embedding
+        return {
+            'vector': vector,
+            'token_count': token_count,
+            'dimensions': len(vector)
+        }
+
     @staticmethod
     def _openai_embed(text: str, model_name: str):
-        from openai import OpenAI
-        import tiktoken
-        
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        client = get_openai_client()
         
-        encoding = tiktoken.encoding_for_model(model_name)
+        encoding = get_encoding(model_name)
         tokens = encoding.encode(text)
         token_count = len(tokens)
         
@@ -119,7 +269,9 @@ class EmbeddingService:
         return {
             'vector': vector,
             'token_count': token_count,
-            'dimensions': len(vector)
+            'dimensions': len(vector),
+            # Ознака локального fallback: такі вектори не кешуються і не перевикористовуються
+            'fallback': True,
         }
     
     @staticmethod
@@ -156,6 +308,7 @@ class EmbeddingService:
                 'vector': vector,
                 'token_count': token_count,
                 'dimensions': len(vector),
+                'fallback': True,
             })
         return results
     
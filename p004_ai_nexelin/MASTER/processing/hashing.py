@@ -0,0 +1,18 @@
+import hashlib
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 тексту чанка (hex).
+
+    Збігається з SQL-бекфілом у міграціях: encode(sha256(convert_to(content, 'UTF8')), 'hex').
+    """
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 вмісту файлу (hex), читання блоками без завантаження файлу в пам'ять."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
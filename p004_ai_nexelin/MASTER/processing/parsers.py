@@ -1,8 +1,55 @@
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Розмір сегмента для потокового читання текстових файлів (символів)
+STREAM_SEGMENT_CHARS = 64 * 1024
+
+
+def _pdf_parallel_config():
+    """(workers, min_pages, pages_per_task) з INGESTION_CONFIG; парсери працюють і без Django."""
+    try:
+        from django.conf import settings
+        config = getattr(settings, 'INGESTION_CONFIG', {})
+    except Exception:
+        config = {}
+    workers = int(config.get('pdf_parse_workers', 0) or 0)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    min_pages = int(config.get('pdf_parallel_min_pages', 50))
+    pages_per_task = max(int(config.get('pdf_pages_per_task', 20)), 1)
+    return workers, min_pages, pages_per_task
+
+
+def _extract_pdf_pages(file_path, start, end):
+    """Текст сторінок [start, end) — виконується у дочірньому процесі, тож відкриває файл сам."""
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        return [(reader.pages[i].extract_text() or "") + "\n" for i in range(start, end)]
+
+
 class BaseParser:
     @staticmethod
     def parse(file_path):
         raise NotImplementedError
 
+    @classmethod
+    def iter_text(cls, file_path, metadata=None):
+        """Yield the document text in segments (pages, sections) for streaming ingestion.
+
+        `metadata` (if given) is filled with the same keys as parse() returns once the
+        generator is exhausted. Parsers without a native stream yield the whole text.
+        """
+        parsed = cls.parse(file_path)
+        if metadata is not None:
+            metadata.update(parsed.get('metadata', {}))
+        yield parsed.get('text', '')
+
 
 class TextParser(BaseParser):
     @staticmethod
@@ -15,28 +62,113 @@ class TextParser(BaseParser):
         }
         return {'text': text, 'metadata': metadata}
 
+    @staticmethod
+    def iter_text(file_path, metadata=None):
+        # Сегменти по цілих рядках, щоб не розрізати слова між сегментами
+        line_count = 0
+        char_count = 0
+        parts = []
+        size = 0
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line_count += 1
+                char_count += len(line)
+                parts.append(line)
+                size += len(line)
+                if size >= STREAM_SEGMENT_CHARS:
+                    yield ''.join(parts)
+                    parts, size = [], 0
+        if parts:
+            yield ''.join(parts)
+        if metadata is not None:
+            metadata.update({'line_count': line_count, 'char_count': char_count})
+
 
 class PDFParser(BaseParser):
     @staticmethod
     def parse(file_path):
+        metadata = {}
+        text = ''.join(PDFParser.iter_text(file_path, metadata))
+        return {'text': text.strip(), 'metadata': metadata}
+
+    @staticmethod
+    def iter_text(file_path, metadata=None):
+        """Yield extracted text page by page; only the current page is held in memory.
+
+        Large PDFs (INGESTION_CONFIG['pdf_parallel_min_pages'] pages and more) are split
+        into page ranges that are extracted in a process pool; ranges are yielded in page
+        order, at most two ranges per worker are in flight.
+        """
         try:
             import PyPDF2
-            text = ""
-            page_count = 0
-            with open(file_path, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                page_count = len(reader.pages)
-                for page in reader.pages:
-                    extracted = page.extract_text() or ""
-                    text += extracted + "\n"
-            metadata = {
-                'page_count': page_count,
-                'char_count': len(text),
-            }
-            return {'text': text.strip(), 'metadata': metadata}
         except ImportError:
             raise ImportError("Install PyPDF2")
 
+        with open(file_path, 'rb') as f:
+            page_count = len(PyPDF2.PdfReader(f).pages)
+
+        workers, min_pages, pages_per_task = _pdf_parallel_config()
+        ranges = [(start, min(start + pages_per_task, page_count))
+                  for start in range(0, page_count, pages_per_task)]
+        pages = None
+        if workers > 1 and len(ranges) > 1 and page_count >= min_pages:
+            pages = PDFParser._iter_pages_parallel(file_path, ranges, min(workers, len(ranges)))
+        if pages is None:
+            pages = PDFParser._iter_pages(file_path)
+
+        char_count = 0
+        for extracted in pages:
+            char_count += len(extracted)
+            yield extracted
+        if metadata is not None:
+            metadata.update({
+                'page_count': page_count,
+                'char_count': char_count,
+            })
+
+    @staticmethod
+    def _iter_pages(file_path):
+        import PyPDF2
+        with open(file_path, 'rb') as f:
+            for page in PyPDF2.PdfReader(f).pages:
+                yield (page.extract_text() or "") + "\n"
+
+    @staticmethod
+    def _iter_pages_parallel(file_path, ranges, workers):
+        """Генератор сторінок з пулу процесів або None, якщо пул тут недоступний."""
+        # Дочірні процеси prefork-пулу Celery — daemon, їм заборонено створювати процеси;
+        # черга ingestion обслуговується воркером з --pool=threads (CELERY_TASK_ROUTES)
+        if multiprocessing.current_process().daemon:
+            logger.warning("PDF parsing: daemon process (prefork worker?), extracting pages sequentially")
+            return None
+        try:
+            # spawn: воркери не успадковують з'єднання з БД і потоки HTTP-клієнта батьківського процесу
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        except (OSError, AssertionError, NotImplementedError) as e:
+            logger.warning(f"PDF parsing: process pool unavailable ({e}), extracting pages sequentially")
+            return None
+
+        def pages():
+            ranges_iter = iter(ranges)
+            pending = deque()
+
+            def submit_next():
+                page_range = next(ranges_iter, None)
+                if page_range is not None:
+                    pending.append(executor.submit(_extract_pdf_pages, file_path, *page_range))
+
+            try:
+                for _ in range(workers * 2):
+                    submit_next()
+                while pending:
+                    extracted = pending.popleft().result()
+                    submit_next()
+                    yield from extracted
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        return pages()
+
 
 class DOCXParser(BaseParser):
     @staticmethod
@@ -56,6 +188,31 @@ class DOCXParser(BaseParser):
         except ImportError:
             raise ImportError("Install python-docx")
 
+    @staticmethod
+    def iter_text(file_path, metadata=None):
+        try:
+            import docx
+        except ImportError:
+            raise ImportError("Install python-docx")
+        doc = docx.Document(file_path)
+        paragraphs = 0
+        heading_count = 0
+        char_count = 0
+        for para in doc.paragraphs:
+            # Як у parse(): абзаци розділені '\n'
+            segment = para.text if paragraphs == 0 else '\n' + para.text
+            paragraphs += 1
+            char_count += len(segment)
+            if getattr(para.style, 'name', '').lower().startswith('heading'):
+                heading_count += 1
+            yield segment
+        if metadata is not None:
+            metadata.update({
+                'paragraphs': paragraphs,
+                'heading_count': heading_count,
+                'char_count': char_count,
+            })
+
 
 class CSVParser(BaseParser):
     @staticmethod
@@ -73,6 +230,20 @@ class CSVParser(BaseParser):
         }
         return {'text': text, 'metadata': metadata}
 
+    @staticmethod
+    def iter_text(file_path, metadata=None):
+        import csv
+        rows = 0
+        columns = 0
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if rows == 0:
+                    columns = len(row)
+                yield ('\n' if rows else '') + ' '.join(row)
+                rows += 1
+        if metadata is not None:
+            metadata.update({'rows': rows, 'columns': columns})
+
 
 class JSONParser(BaseParser):
     @staticmethod
@@ -0,0 +1,555 @@
+"""
+Document ingestion pipeline.
+
+One engine for client, branch and specialization documents:
+parse → extract metadata → chunk → embed → persist → account usage.
+Large files are streamed (page/section → chunks → bounded embed/insert batches).
+
+The levels differ only in their models, the owner FK and how the embedding model is
+chosen; these are described by `DocumentOwner`, so every ingestion optimisation is
+implemented once in `IngestionPipeline` and applies to all three levels.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from django.conf import settings
+from django.db import connection, models, transaction
+
+from MASTER.EmbeddingModel.models import EmbeddingModel
+from MASTER.clients.models import ClientDocument, ClientEmbedding
+from MASTER.branches.models import BranchDocument, BranchEmbedding
+from MASTER.specializations.models import SpecializationDocument, SpecializationEmbedding
+from MASTER.rag.answer_cache import invalidate as invalidate_answer_cache
+
+from .parsers import get_parser
+from .chunker import iter_chunks, batched
+from .embedding_service import EmbeddingService
+from .hashing import content_hash, file_hash
+from .vectors import fit_vector
+from .models import UsageStats
+from .metadata_extractor import extract_metadata
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DocumentOwner:
+    """Describes one ingestion level: its models, owner FK and embedding model lookup."""
+    level: str
+    document_model: type[models.Model]
+    embedding_row_model: type[models.Model]
+    # Назва FK на власника — однакова в документі, embedding і UsageStats
+    owner_field: str
+    get_embedding_model: Callable[[Any], EmbeddingModel | None]
+    # Таблиця embeddings hash-партиціонована по власнику (clients 0024): кожен запит до
+    # неї фільтрується ще й по owner_field, щоб планувальник брав одну партицію
+    partitioned: bool = False
+
+    def get_owner(self, document: Any) -> Any:
+        return getattr(document, self.owner_field)
+
+    def tenant_filter(self, owner_id: Any) -> dict[str, Any]:
+        """Фільтр по власнику для партиціонованої таблиці embeddings (інакше порожній)."""
+        if not self.partitioned or owner_id is None:
+            return {}
+        return {f"{self.owner_field}_id": owner_id}
+
+
+def _client_embedding_model(client: Any) -> EmbeddingModel | None:
+    # Пріоритет: client.embedding_model > specialization.get_embedding_model()
+    embedding_model = getattr(client, 'embedding_model', None)
+    if embedding_model is None and client.specialization:
+        embedding_model = client.specialization.get_embedding_model()
+    return embedding_model
+
+
+OWNERS: dict[str, DocumentOwner] = {
+    'client': DocumentOwner(
+        level='client',
+        document_model=ClientDocument,
+        embedding_row_model=ClientEmbedding,
+        owner_field='client',
+        get_embedding_model=_client_embedding_model,
+        partitioned=True,
+    ),
+    'branch': DocumentOwner(
+        level='branch',
+        document_model=BranchDocument,
+        embedding_row_model=BranchEmbedding,
+        owner_field='branch',
+        get_embedding_model=lambda branch: branch.get_embedding_model(),
+    ),
+    'specialization': DocumentOwner(
+        level='specialization',
+        document_model=SpecializationDocument,
+        embedding_row_model=SpecializationEmbedding,
+        owner_field='specialization',
+        get_embedding_model=lambda specialization: specialization.get_embedding_model(),
+    ),
+}
+
+
+def indexing_state(document: Any, embedding_model: EmbeddingModel, source_hash: str) -> dict[str, Any]:
+    """Document metadata recording which file hash each embedding model was built from.
+
+    Entries of other models survive only if they were built from the same file.
+    """
+    metadata = document.metadata or {}
+    previous = metadata.get("indexed_models") or {}
+    if metadata.get("file_hash") != source_hash:
+        previous = {}
+    return {
+        "file_hash": source_hash,
+        "indexed_models": {**previous, str(embedding_model.id): source_hash},
+    }
+
+
+def is_document_current(document: Any, embedding_model: EmbeddingModel, source_hash: str) -> bool:
+    """True if the document's rows for the model were built from a file with this hash."""
+    indexed_models = (document.metadata or {}).get("indexed_models") or {}
+    return document.is_processed and indexed_models.get(str(embedding_model.id)) == source_hash
+
+
+class IngestionPipeline:
+    """Parses, chunks, embeds and stores a single document for one owner level."""
+
+    def __init__(self, owner: DocumentOwner | str):
+        self.owner = OWNERS[owner] if isinstance(owner, str) else owner
+
+    def run(self, document_id: int, embedding_model: EmbeddingModel | None = None) -> dict[str, Any]:
+        """Process the document end to end and return the task result payload.
+
+        `embedding_model` overrides the owner's model (used for shadow builds of a
+        model the client is switching to). Files of at least
+        INGESTION_CONFIG['streaming_min_file_bytes'] go through `ingest_streaming`.
+        """
+        document = self.load_document(document_id)
+        file_path = document.file.path
+
+        source_hash = file_hash(file_path)
+        owner = self.owner.get_owner(document)
+        if embedding_model is None:
+            embedding_model = self.resolve_embedding_model(owner)
+
+        totals = {"chunks": 0, "reused": 0, "tokens": 0, "cost": 0.0}
+        if self.should_stream(file_path):
+            document_metadata = self.ingest_streaming(document, owner, embedding_model, totals)
+        else:
+            document_metadata = self.ingest(document, owner, embedding_model, totals)
+        # bulk_create не шле сигналів — інвалідуємо кеш відповідей явно
+        invalidate_answer_cache(self.owner.level, owner.pk)
+
+        if totals["reused"]:
+            logger.info(
+                f"{self.owner.level} document {document_id}: reused {totals['reused']}/{totals['chunks']} chunk vectors"
+            )
+
+        self.mark_processed(document, totals["chunks"], {
+            **document_metadata,
+            **indexing_state(document, embedding_model, source_hash),
+        })
+        self.account_usage(owner, document, embedding_model, totals["chunks"], totals["tokens"], totals["cost"])
+
+        return {
+            "status": "success",
+            "document_id": document_id,
+            "chunks_count": totals["chunks"],
+            "chunks_reused": totals["reused"],
+            "tokens_used": totals["tokens"],
+            "cost": float(totals["cost"]),
+        }
+
+    def ingest(
+        self, document: Any, owner: Any, embedding_model: EmbeddingModel, totals: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Whole-document mode: parse, chunk and embed in memory, replace rows in one transaction."""
+        file_path = document.file.path
+        file_type = document.file_type
+
+        text, parser_metadata = self.parse(file_path, file_type)
+        file_metadata = extract_metadata(file_path, file_type)
+
+        # Зберігаємо базові метадані одразу після парсингу (стан індексації — до успішного persist)
+        document_metadata = {"file": file_metadata, "parser": parser_metadata}
+        self.save_parse_metadata(document, document_metadata)
+
+        chunks = self.chunk(text)
+        embeddings = self.embed(chunks, embedding_model, owner)
+        rows = self.build_rows(owner, document, embedding_model, chunks, embeddings,
+                               document_metadata, totals, total_chunks=len(chunks))
+        self.persist(document, rows, embedding_model)
+        return document_metadata
+
+    def ingest_streaming(
+        self, document: Any, owner: Any, embedding_model: EmbeddingModel, totals: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Streaming mode for large files: memory stays bounded by one batch of chunks.
+
+        The parser yields text per page/section, the chunker consumes that stream and
+        every INGESTION_CONFIG['stream_batch_chunks'] chunks are embedded and inserted in
+        their own transaction, tagged with this run's id. When the stream ends, rows of
+        previous runs are deleted in one statement; on failure the partial run is removed
+        and the previous rows stay untouched.
+        """
+        file_path = document.file.path
+        file_type = document.file_type
+        config = getattr(settings, "INGESTION_CONFIG", {})
+        batch_chunks = max(int(config.get("stream_batch_chunks", 256)), 1)
+
+        file_metadata = extract_metadata(file_path, file_type)
+        parser_metadata: dict[str, Any] = {}
+        run_id = uuid.uuid4().hex
+        row_metadata = {"file": file_metadata, "ingest_run": run_id}
+        self.save_parse_metadata(document, {"file": file_metadata, "parser": parser_metadata})
+
+        rows_qs = self.document_rows(document, embedding_model)
+        try:
+            segments = get_parser(file_type).iter_text(file_path, parser_metadata)
+            for batch in batched(iter_chunks(segments), batch_chunks):
+                embeddings = self.embed(batch, embedding_model, owner)
+                rows = self.build_rows(owner, document, embedding_model, batch, embeddings,
+                                       row_metadata, totals, total_chunks=None)
+                self.insert_rows(rows, embedding_model)
+
+            with transaction.atomic():
+                # exclude(metadata__ingest_run=run_id) пропустив би рядки без ключа ingest_run
+                # (непотокові запуски та старі дані) — вони лишилися б у пошуку дублями
+                rows_qs.filter(
+                    models.Q(metadata__ingest_run__isnull=True) | ~models.Q(metadata__ingest_run=run_id)
+                ).delete()
+                self.set_run_metadata(document, embedding_model, run_id, totals["chunks"], parser_metadata)
+        except Exception:
+            # Прибираємо частково вставлені рядки цього запуску — лишаються попередні
+            rows_qs.filter(metadata__ingest_run=run_id).delete()
+            raise
+
+        return {"file": file_metadata, "parser": parser_metadata}
+
+    def should_stream(self, file_path: str) -> bool:
+        config = getattr(settings, "INGESTION_CONFIG", {})
+        threshold = config.get("streaming_min_file_bytes", 5 * 1024 * 1024)
+        if threshold is None or threshold < 0:
+            return False
+        try:
+            return os.path.getsize(file_path) >= threshold
+        except OSError:
+            return False
+
+    def save_parse_metadata(self, document: Any, document_metadata: dict[str, Any]) -> None:
+        previous_state = {
+            key: value for key, value in (document.metadata or {}).items()
+            if key in ("file_hash", "indexed_models")
+        }
+        try:
+            document.metadata = {**document_metadata, **previous_state}
+            document.save(update_fields=["metadata"])
+        except Exception:  # noqa: BLE001
+            pass
+
+    def build_rows(
+        self,
+        owner: Any,
+        document: Any,
+        embedding_model: EmbeddingModel,
+        chunks: list[dict[str, Any]],
+        embeddings: list[dict[str, Any]],
+        base_metadata: dict[str, Any],
+        totals: dict[str, Any],
+        total_chunks: int | None,
+    ) -> list[models.Model]:
+        """Model instances for a list of chunks; accumulates chunk/token/cost totals."""
+        rows = []
+        for chunk, result in zip(chunks, embeddings):
+            chunk_index = chunk.get("metadata", {}).get("chunk_index", totals["chunks"])
+            rows.append(self.build_row(
+                owner=owner,
+                document=document,
+                embedding_model=embedding_model,
+                chunk=chunk,
+                chunk_index=chunk_index,
+                total_chunks=total_chunks,
+                result=result,
+                base_metadata=base_metadata,
+            ))
+            totals["chunks"] += 1
+            if result.get("reused"):
+                # Вектор узято з існуючого рядка — провайдер не викликався
+                totals["reused"] += 1
+                continue
+            totals["tokens"] += result["token_count"]
+            totals["cost"] += EmbeddingService.calculate_cost(result["token_count"], embedding_model)
+        return rows
+
+    def load_document(self, document_id: int) -> Any:
+        return self.owner.document_model.objects.select_related(self.owner.owner_field).get(id=document_id)
+
+    def parse(self, file_path: str, file_type: str) -> tuple[str, dict[str, Any]]:
+        parser = get_parser(file_type)
+        parsed = parser.parse(file_path)
+        if isinstance(parsed, dict):
+            return parsed.get("text", ""), parsed.get("metadata", {})
+        return str(parsed), {}
+
+    def chunk(self, text: str) -> list[dict[str, Any]]:
+        return list(iter_chunks([text]))
+
+    def resolve_embedding_model(self, owner: Any) -> EmbeddingModel:
+        embedding_model = self.owner.get_embedding_model(owner)
+        if embedding_model is None:
+            # Fallback to default model
+            embedding_model = EmbeddingModel.objects.filter(is_default=True, is_active=True).first()
+            if embedding_model is None:
+                embedding_model = EmbeddingModel.objects.filter(is_active=True).first()
+                if embedding_model is None:
+                    raise ValueError("No embedding model available")
+        return embedding_model
+
+    def embed(
+        self, chunks: list[dict[str, Any]], embedding_model: EmbeddingModel, owner: Any = None
+    ) -> list[dict[str, Any]]:
+        """Embeds chunks, calling the provider only for text without a stored vector.
+
+        Each result carries `content_hash`; `reused=True` marks vectors taken from existing
+        rows or from an identical chunk earlier in the same document. For a partitioned
+        owner level stored vectors are looked up in `owner`'s partition only.
+        """
+        texts = [chunk.get("text", "") for chunk in chunks]
+        hashes = [content_hash(text) for text in texts]
+        known = self.find_existing_vectors(set(hashes), embedding_model, owner)
+
+        # Унікальні нові тексти в порядку першої появи
+        new_texts: dict[str, str] = {}
+        for digest, text in zip(hashes, texts):
+            if digest not in known and digest not in new_texts:
+                new_texts[digest] = text
+        generated = dict(zip(new_texts.keys(), self.embed_texts(list(new_texts.values()), embedding_model)))
+
+        results = []
+        # Індекс першого результату для кожного hash — без hashes.index() на кожен дубль
+        first_index: dict[str, int] = {}
+        for digest in hashes:
+            if digest in generated:
+                result = {**generated.pop(digest), "content_hash": digest, "reused": False}
+                if not result.get("fallback"):
+                    known[digest] = result
+            elif digest in known:
+                result = {**known[digest], "content_hash": digest, "reused": True}
+            else:
+                # Дубль fallback-чанка в межах документа — використовуємо той самий вектор
+                result = {**results[first_index[digest]], "reused": True}
+            first_index.setdefault(digest, len(results))
+            results.append(result)
+        return results
+
+    @staticmethod
+    def embed_texts(texts: list[str], embedding_model: EmbeddingModel) -> list[dict[str, Any]]:
+        """Batch embedding with one result per text; a short provider response is an error.
+
+        Results are matched to texts by position, so a missing one would silently shift or
+        drop vectors.
+        """
+        if not texts:
+            return []
+        results = EmbeddingService.create_embeddings_batch(texts, embedding_model)
+        if len(results) != len(texts):
+            raise ValueError(
+                f"Embedding provider returned {len(results)} vectors for {len(texts)} texts "
+                f"(model {embedding_model.model_name})"
+            )
+        return results
+
+    def find_existing_vectors(
+        self, hashes: set[str], embedding_model: EmbeddingModel, owner: Any = None
+    ) -> dict[str, dict[str, Any]]:
+        """Stored vectors for (embedding_model, content_hash) pairs, keyed by hash.
+
+        Vectors produced by the local TF-IDF fallback are never reused. One row
+        per hash is selected in SQL (``DISTINCT ON (content_hash)``, newest first).
+        """
+        if not hashes:
+            return {}
+        rows = (
+            self.owner.embedding_row_model.objects
+            .filter(embedding_model=embedding_model, content_hash__in=hashes, vector__isnull=False,
+                    **self.owner.tenant_filter(getattr(owner, "pk", None)))
+            # exclude(metadata__fallback=True) відкидав би й рядки без ключа fallback (NULL)
+            .filter(~models.Q(metadata__has_key="fallback") | models.Q(metadata__fallback=False))
+            .order_by("content_hash", "-id")
+            .distinct("content_hash")
+            .values_list("content_hash", "vector", "metadata__dimensions", "metadata__token_count")
+        )
+        found: dict[str, dict[str, Any]] = {}
+        for digest, vector, dimensions, token_count in rows:
+            # Старі рядки могли бути доповнені нулями — беремо лише metadata.dimensions
+            dimensions = int(dimensions or embedding_model.dimensions or len(vector))
+            found[digest] = {
+                "vector": [float(v) for v in vector[:dimensions]],
+                "token_count": int(token_count or 0),
+                "dimensions": dimensions,
+            }
+        return found
+
+    def build_row(
+        self,
+        owner: Any,
+        document: Any,
+        embedding_model: EmbeddingModel,
+        chunk: dict[str, Any],
+        chunk_index: int,
+        total_chunks: int | None,
+        result: dict[str, Any],
+        base_metadata: dict[str, Any],
+    ) -> models.Model:
+        metadata = {
+            "chunk_index": chunk_index,
+            # У потоковому режимі відома тільки в кінці — див. set_run_metadata
+            "total_chunks": total_chunks,
+            "source_file": document.title,
+            "file_type": document.file_type,
+            "token_count": result["token_count"],
+            "dimensions": result["dimensions"],
+            **base_metadata,
+            "chunker": chunk.get("metadata", {}),
+        }
+        if result.get("fallback"):
+            metadata["fallback"] = True
+        return self.owner.embedding_row_model(**{
+            self.owner.owner_field: owner,
+            "document": document,
+            "embedding_model": embedding_model,
+            "vector": result["vector"],
+            "content": chunk.get("text", ""),
+            "content_hash": result.get("content_hash") or content_hash(chunk.get("text", "")),
+            "chunk_index": chunk_index,
+            "metadata": metadata,
+        })
+
+    def persist(
+        self, document: Any, rows: list[models.Model], embedding_model: EmbeddingModel
+    ) -> list[models.Model]:
+        """Замінює embeddings документа для моделі: DELETE старих + bulk INSERT в одній транзакції.
+
+        Повторна обробка документа (reindex, retry) не лишає дублів і не потребує
+        попереднього видалення — пошук до кінця транзакції бачить старі рядки.
+        """
+        self.prepare_rows(rows, embedding_model)
+        batch_size = getattr(settings, "EMBEDDING_BATCH_CONFIG", {}).get("insert_batch_size", 200)
+        with transaction.atomic():
+            self.document_rows(document, embedding_model).delete()
+            return self.owner.embedding_row_model.objects.bulk_create(rows, batch_size=batch_size)
+
+    def document_rows(self, document: Any, embedding_model: EmbeddingModel) -> models.QuerySet:
+        """Рядки документа для моделі (для партиціонованої таблиці — лише з партиції власника)."""
+        owner_id = getattr(document, f"{self.owner.owner_field}_id", None)
+        return self.owner.embedding_row_model.objects.filter(
+            document=document, embedding_model=embedding_model, **self.owner.tenant_filter(owner_id),
+        )
+
+    def insert_rows(self, rows: list[models.Model], embedding_model: EmbeddingModel) -> list[models.Model]:
+        """Вставляє один батч рядків (потоковий режим) в окремій транзакції."""
+        self.prepare_rows(rows, embedding_model)
+        batch_size = getattr(settings, "EMBEDDING_BATCH_CONFIG", {}).get("insert_batch_size", 200)
+        with transaction.atomic():
+            return self.owner.embedding_row_model.objects.bulk_create(rows, batch_size=batch_size)
+
+    def prepare_rows(self, rows: list[models.Model], embedding_model: EmbeddingModel) -> None:
+        """Готує рядки до bulk_create.
+
+        bulk_create не викликає save() і pre_save сигнали, тому вектори приводяться до
+        нативної розмірності моделі тут, а рядки без вектора (що їх згенерував би
+        auto_generate_*_embedding_vector) отримують його одним батчевим запитом.
+        """
+        missing = [row for row in rows if row.vector is None and row.content]
+        if missing:
+            generated = self.embed_texts([row.content for row in missing], embedding_model)
+            for row, result in zip(missing, generated):
+                row.vector = result["vector"]
+                row.content_hash = row.content_hash or content_hash(row.content)
+                row.metadata = {
+                    **(row.metadata or {}),
+                    "dimensions": result["dimensions"],
+                    "token_count": result.get("token_count", 0),
+                    "auto_generated": True,
+                    **({"fallback": True} if result.get("fallback") else {}),
+                }
+
+        for row in rows:
+            if row.vector is not None:
+                row.vector = fit_vector(
+                    row.vector,
+                    embedding_model.dimensions,
+                    truncate=bool((row.metadata or {}).get("fallback")),
+                )
+
+    def set_run_metadata(
+        self,
+        document: Any,
+        embedding_model: EmbeddingModel,
+        run_id: str,
+        total: int,
+        parser_metadata: dict[str, Any],
+    ) -> None:
+        """Проставляє metadata.total_chunks і metadata.parser рядкам потокового запуску одним UPDATE.
+
+        Обидва значення відомі лише після того, як парсер дочитав файл.
+        """
+        table = connection.ops.quote_name(self.owner.embedding_row_model._meta.db_table)
+        params = [total, json.dumps(parser_metadata, default=str), document.pk, embedding_model.pk, run_id]
+        tenant_sql = ""
+        for column, owner_id in self.owner.tenant_filter(
+            getattr(document, f"{self.owner.owner_field}_id", None)
+        ).items():
+            tenant_sql += f" AND {connection.ops.quote_name(column)} = %s"
+            params.append(owner_id)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET metadata = metadata || jsonb_build_object("
+                "'total_chunks', %s::int, 'parser', %s::jsonb) "
+                f"WHERE document_id = %s AND embedding_model_id = %s AND metadata->>'ingest_run' = %s{tenant_sql}",
+                params,
+            )
+
+    def mark_processed(self, document: Any, chunks_count: int, document_metadata: dict[str, Any]) -> None:
+        document.is_processed = True
+        document.chunks_count = chunks_count
+        # Очистити попередню помилку, якщо була
+        document.processing_error = ""
+        document.metadata = document_metadata
+        document.save(update_fields=["is_processed", "chunks_count", "processing_error", "metadata"])
+
+    def account_usage(
+        self,
+        owner: Any,
+        document: Any,
+        embedding_model: EmbeddingModel,
+        chunks_count: int,
+        total_tokens: int,
+        total_cost: float,
+    ) -> None:
+        UsageStats.objects.create(**{
+            self.owner.owner_field: owner,
+            "embedding_model": embedding_model,
+            "operation_type": "create_embedding",
+            "tokens_used": total_tokens,
+            "cost": total_cost,
+            "metadata": {
+                "document_id": int(document.pk),
+                "document_title": document.title,
+                "chunks_count": chunks_count,
+            },
+        })
+
+    def mark_failed(self, document_id: int, error: Exception) -> None:
+        """Store the processing error on the document (if it still exists)."""
+        updated = self.owner.document_model.objects.filter(id=document_id).update(
+            processing_error=str(error)
+        )
+        if not updated:
+            logger.warning(f"{self.owner.level} document {document_id} not found while recording error: {error}")
@@ -0,0 +1,169 @@
+"""
+Process-wide registry of provider clients.
+
+One lazily created OpenAI client per worker process (HTTP keep-alive via a pooled
+httpx.Client), one AsyncOpenAI client per event loop for the ASGI views and cached
+tiktoken encodings. After fork (Celery prefork, gunicorn) the
+child drops the inherited client and builds its own on first use, so sockets are never
+shared between processes.
+
+`get_connection_stats()` reports how many requests reused an already open connection.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from functools import lru_cache
+from typing import Any
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_openai_client: Any = None
+# httpx.AsyncClient прив'язаний до event loop, у якому відкрито його з'єднання
+_async_openai_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_stats = {"requests": 0, "new_connections": 0}
+
+
+def get_openai_client():
+    """Повертає спільний для процесу OpenAI клієнт (створюється при першому виклику)."""
+    global _openai_client
+    client = _openai_client
+    if client is None:
+        with _lock:
+            if _openai_client is None:
+                _openai_client = _build_openai_client()
+            client = _openai_client
+    return client
+
+
+def get_async_openai_client():
+    """AsyncOpenAI клієнт для поточного event loop (створюється при першому виклику в loop)."""
+    loop = asyncio.get_running_loop()
+    client = _async_openai_clients.get(loop)
+    if client is None:
+        client = _build_async_openai_client()
+        _async_openai_clients[loop] = client
+    return client
+
+
+def _api_key() -> str:
+    api_key = (settings.OPENAI_API_KEY or "").strip()
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY is not set or empty")
+    return api_key
+
+
+def _http_client_options() -> dict[str, Any]:
+    import httpx
+
+    config = getattr(settings, "OPENAI_HTTP_CONFIG", {})
+    return {
+        "limits": httpx.Limits(
+            max_connections=config.get("max_connections", 20),
+            max_keepalive_connections=config.get("max_keepalive_connections", 10),
+            keepalive_expiry=config.get("keepalive_expiry_seconds", 60.0),
+        ),
+        "timeout": httpx.Timeout(
+            config.get("timeout_seconds", 60.0),
+            connect=config.get("connect_timeout_seconds", 5.0),
+        ),
+    }
+
+
+def _build_openai_client():
+    import httpx
+    from openai import OpenAI
+
+    api_key = _api_key()
+    http_client = httpx.Client(**_http_client_options(), event_hooks={"request": [_attach_trace]})
+    logger.info(f"OpenAI client created for pid {os.getpid()}")
+    return OpenAI(api_key=api_key, http_client=http_client)
+
+
+def _build_async_openai_client():
+    import httpx
+    from openai import AsyncOpenAI
+
+    api_key = _api_key()
+    http_client = httpx.AsyncClient(**_http_client_options(), event_hooks={"request": [_attach_async_trace]})
+    logger.info(f"Async OpenAI client created for pid {os.getpid()}")
+    return AsyncOpenAI(api_key=api_key, http_client=http_client)
+
+
+def _attach_trace(request) -> None:
+    # httpcore викликає trace на кожне нове TCP-з'єднання — так рахуємо reuse
+    request.extensions = {**request.extensions, "trace": _trace}
+    with _lock:
+        _stats["requests"] += 1
+
+
+def _trace(event_name: str, info: dict) -> None:
+    if event_name == "connection.connect_tcp.complete":
+        with _lock:
+            _stats["new_connections"] += 1
+
+
+async def _attach_async_trace(request) -> None:
+    # В async httpcore і hook, і trace мають бути корутинами
+    request.extensions = {**request.extensions, "trace": _async_trace}
+    with _lock:
+        _stats["requests"] += 1
+
+
+async def _async_trace(event_name: str, info: dict) -> None:
+    _trace(event_name, info)
+
+
+def get_connection_stats() -> dict[str, Any]:
+    """Статистика HTTP-з'єднань OpenAI клієнта в поточному процесі."""
+    with _lock:
+        requests = _stats["requests"]
+        new_connections = _stats["new_connections"]
+    reused = max(requests - new_connections, 0)
+    return {
+        "pid": os.getpid(),
+        "requests": requests,
+        "new_connections": new_connections,
+        "reused_connections": reused,
+        "reuse_rate": round(reused / requests, 4) if requests else None,
+    }
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name: str):
+    """Кешований tiktoken encoding для моделі (fallback — cl100k_base)."""
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=None)
+def get_encoding_by_name(encoding_name: str):
+    """Кешований tiktoken encoding за назвою (наприклад, cl100k_base)."""
+    import tiktoken
+
+    return tiktoken.get_encoding(encoding_name)
+
+
+def _reset_after_fork() -> None:
+    global _lock, _openai_client, _async_openai_clients
+    # Не закриваємо успадкований клієнт: його сокети належать батьківському процесу
+    _lock = threading.Lock()
+    _openai_client = None
+    _async_openai_clients = weakref.WeakKeyDictionary()
+    _stats["requests"] = 0
+    _stats["new_connections"] = 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,75 @@
+from unittest import skipUnless
+
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase
+
+from .chunker import chunk_text, iter_chunks, tiktoken
+from .embedding_service import EmbeddingService
+from .vectors import fit_vector
+
+
+def _boundaries(chunks):
+    return [
+        (chunk['text'], chunk['metadata']['chunk_index'], chunk['metadata']['start_pos'],
+         chunk['metadata']['end_pos'], chunk['metadata']['token_count'])
+        for chunk in chunks
+    ]
+
+
+@skipUnless(tiktoken is not None, 'Потрібен tiktoken')
+class IterChunksTests(SimpleTestCase):
+    """Потоковий чанкер дає ті самі межі, що й chunk_text."""
+
+    def assertSameChunks(self, segments, chunk_size, overlap):
+        expected = chunk_text(''.join(segments), chunk_size=chunk_size, overlap=overlap)
+        streamed = list(iter_chunks(segments, chunk_size=chunk_size, overlap=overlap))
+        self.assertGreater(len(expected), 1)
+        self.assertEqual(_boundaries(streamed), _boundaries(expected))
+
+    def test_multi_paragraph_segments(self):
+        # Сегменти закінчуються на \n\n, тож токени на межах сегментів ті самі, що й у цілому тексті
+        segments = [
+            f'Paragraph {n} describes the menu, opening hours and delivery terms of branch {n}.\n\n'
+            for n in range(40)
+        ]
+        self.assertSameChunks(segments, chunk_size=64, overlap=8)
+
+    def test_oversized_sentence(self):
+        sentence = ' '.join(f'word{n}' for n in range(600)) + '.'
+        self.assertSameChunks([sentence], chunk_size=50, overlap=10)
+
+
+class BatchBoundsTests(SimpleTestCase):
+    """Межі батчів embeddings: ліміт за кількістю та за токенами."""
+
+    def test_splits_by_batch_size(self):
+        self.assertEqual(EmbeddingService._batch_bounds([1] * 5, 2, 100), [(0, 2), (2, 4), (4, 5)])
+
+    def test_splits_by_token_limit(self):
+        self.assertEqual(EmbeddingService._batch_bounds([40, 40, 40, 10], 10, 100), [(0, 2), (2, 4)])
+
+    def test_oversized_text_gets_own_batch(self):
+        self.assertEqual(EmbeddingService._batch_bounds([10, 500, 10], 10, 100), [(0, 1), (1, 2), (2, 3)])
+
+    def test_empty(self):
+        self.assertEqual(EmbeddingService._batch_bounds([], 10, 100), [])
+
+
+class FitVectorTests(SimpleTestCase):
+    """Приведення вектора до нативної розмірності моделі."""
+
+    def test_pads_short_vector(self):
+        self.assertEqual(fit_vector([1.0, 2.0], 4), [1.0, 2.0, 0.0, 0.0])
+
+    def test_keeps_exact_vector(self):
+        self.assertEqual(fit_vector((1.0, 2.0), 2), [1.0, 2.0])
+
+    def test_rejects_long_vector(self):
+        with self.assertRaises(ValidationError):
+            fit_vector([1.0, 2.0, 3.0], 2)
+
+    def test_truncates_long_vector_when_allowed(self):
+        self.assertEqual(fit_vector([1.0, 2.0, 3.0], 2, truncate=True), [1.0, 2.0])
+
+    def test_no_dimensions_returns_vector_unchanged(self):
+        self.assertEqual(fit_vector([1.0, 2.0], None), [1.0, 2.0])
@@ -0,0 +1,282 @@
+"""
+Native-dimension vector storage helpers.
+
+The `vector` columns of the embedding tables have no fixed dimension: every row keeps its
+EmbeddingModel's native size. ANN indexes are partial expression indexes, one per
+(table, embedding model), on `vector::vector(N)` — or `vector::halfvec(N)` for models above
+the 2000-dimension HNSW limit of `vector` — so searches must use the same expression
+(`distance_sql`) together with `embedding_model_id = <id>` to be served by them.
+
+Background for the `*_native_dimensions` migrations of the embedding apps: vectors used to be
+zero-padded to a fixed `vector(3072)`, and pgvector cannot build an HNSW index on that
+(`vector` indexes stop at 2000 dimensions). Those migrations drop the old unusable index,
+make the column dimensionless and trim the padding with `subvector` (reversing them pads
+back to 3072; `fit_vector` now pads only up to the model's own size); the per-model
+indexes are then built by EmbeddingModel 0003/0004 through `ensure_vector_indexes` /
+`ensure_binary_indexes`.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from django.core.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Межі pgvector для HNSW/IVFFlat: vector — до 2000 вимірів, halfvec — до 4000
+VECTOR_INDEX_MAX_DIMENSIONS = 2000
+HALFVEC_INDEX_MAX_DIMENSIONS = 4000
+
+# Таблиці embeddings: (app_label, model_name, префікс назв індексів)
+EMBEDDING_TABLES = (
+    ('clients', 'ClientEmbedding', 'client_emb'),
+    ('branches', 'BranchEmbedding', 'branch_emb'),
+    ('specializations', 'SpecializationEmbedding', 'spec_emb'),
+    ('restaurant', 'MenuItemEmbedding', 'menu_emb'),
+)
+
+HNSW_OPTIONS = "m = 16, ef_construction = 64"
+
+# Таблиці з бінарно квантизованими індексами (великі корпуси branch/specialization):
+# HNSW по binary_quantize(vector)::bit(N) — 1 біт на вимір замість 4 байтів
+BINARY_INDEX_PREFIXES = ('branch_emb', 'spec_emb')
+# Межа pgvector для HNSW по bit
+BIT_INDEX_MAX_DIMENSIONS = 64000
+
+
+def fit_vector(vector: Any, dimensions: int | None, truncate: bool = False) -> list[float]:
+    """Приводить вектор до нативної розмірності моделі.
+
+    Коротший вектор доповнюється нулями (косинусна відстань не змінюється), довший —
+    помилка, якщо не truncate (локальний TF-IDF fallback має фіксовані 1536 вимірів).
+    """
+    vector = list(vector)
+    if not dimensions:
+        return vector
+    actual_dim = len(vector)
+    if actual_dim > dimensions:
+        if not truncate:
+            raise ValidationError(f"Vector dimensions exceed model dimensions: {actual_dim} > {dimensions}")
+        return vector[:dimensions]
+    if actual_dim < dimensions:
+        return vector + [0.0] * (dimensions - actual_dim)
+    return vector
+
+
+def vector_type(dimensions: int) -> str:
+    """Тип, до якого приводиться колонка для відстані та індексу."""
+    return 'vector' if dimensions <= VECTOR_INDEX_MAX_DIMENSIONS else 'halfvec'
+
+
+def distance_sql(column: str, query: str, dimensions: int) -> str:
+    """Косинусна відстань у формі, що збігається з виразом ANN-індексу моделі."""
+    cast = f"{vector_type(dimensions)}({int(dimensions)})"
+    return f"(({column})::{cast} <=> ({query})::{cast})"
+
+
+def hamming_distance_sql(column: str, query: str, dimensions: int) -> str:
+    """Відстань Хеммінга між бінарно квантизованими векторами — вираз бінарного індексу моделі."""
+    return f"(binary_quantize({column})::bit({int(dimensions)}) <~> binary_quantize({query}))"
+
+
+def vector_index_name(prefix: str, model_id: int) -> str:
+    return f"{prefix}_vec_m{int(model_id)}_idx"
+
+
+def binary_index_name(prefix: str, model_id: int) -> str:
+    return f"{prefix}_bq_m{int(model_id)}_idx"
+
+
+def create_binary_index_sql(table: str, prefix: str, model_id: int, dimensions: int, concurrently: bool = True) -> str | None:
+    """DDL часткового HNSW-індексу по бінарно квантизованих векторах однієї моделі."""
+    if dimensions > BIT_INDEX_MAX_DIMENSIONS:
+        return None
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {binary_index_name(prefix, model_id)} "
+        f"ON {table} USING hnsw ((binary_quantize(vector)::bit({int(dimensions)})) bit_hamming_ops) "
+        f"WITH ({HNSW_OPTIONS}) WHERE embedding_model_id = {int(model_id)}"
+    )
+
+
+def create_vector_index_sql(
+    table: str,
+    prefix: str,
+    model_id: int,
+    dimensions: int,
+    concurrently: bool = True,
+    name: str | None = None,
+    only: bool = False,
+) -> str | None:
+    """DDL часткового HNSW-індексу для однієї моделі (None, якщо розмірність завелика).
+
+    only=True — індекс лише на батьківській partitioned-таблиці (ON ONLY), без побудови.
+    """
+    if dimensions > HALFVEC_INDEX_MAX_DIMENSIONS:
+        return None
+    kind = vector_type(dimensions)
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+        f"{name or vector_index_name(prefix, model_id)} ON {'ONLY ' if only else ''}{table} "
+        f"USING hnsw ((vector::{kind}({int(dimensions)})) {kind}_cosine_ops) "
+        f"WITH ({HNSW_OPTIONS}) WHERE embedding_model_id = {int(model_id)}"
+    )
+
+
+def embedding_tables(apps: Any = None) -> list[tuple[str, str]]:
+    """(db_table, префікс індексів) для всіх моделей embeddings.
+
+    apps — реєстр моделей; міграції передають історичний (RunPython apps).
+    """
+    if apps is None:
+        from django.apps import apps
+
+    return [
+        (apps.get_model(app_label, model_name)._meta.db_table, prefix)
+        for app_label, model_name, prefix in EMBEDDING_TABLES
+    ]
+
+
+def model_has_vectors(model_id: int) -> bool:
+    """True, якщо в будь-якій таблиці embeddings є рядки цієї моделі."""
+    from django.apps import apps
+
+    return any(
+        apps.get_model(app_label, model_name).objects.filter(embedding_model_id=model_id).exists()
+        for app_label, model_name, _prefix in EMBEDDING_TABLES
+    )
+
+
+def table_partitions(cursor: Any, table: str) -> list[str] | None:
+    """Партиції таблиці або None, якщо таблиця не partitioned (див. clients 0024)."""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [table])
+    if cursor.fetchone()[0] != 'p':
+        return None
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass ORDER BY c.relname",
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _index_exists(cursor: Any, name: str) -> bool:
+    cursor.execute("SELECT 1 FROM pg_class WHERE relname = %s AND relkind IN ('i', 'I')", [name])
+    return cursor.fetchone() is not None
+
+
+def _stale_index(
+    cursor: Any, name: str, dimensions: int, check_valid: bool = True, kind: str | None = None,
+) -> bool:
+    """Індекс є, але невалідний (перерваний CONCURRENTLY) або побудований для іншої розмірності."""
+    cursor.execute(
+        "SELECT i.indisvalid, pg_get_indexdef(i.indexrelid) FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = %s",
+        [name],
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return False
+    is_valid, definition = row
+    kind = kind or vector_type(dimensions)
+    return (check_valid and not is_valid) or f"{kind}({int(dimensions)})" not in definition
+
+
+def _ensure_partitioned_index(
+    cursor: Any,
+    table: str,
+    prefix: str,
+    partitions: list[str],
+    embedding_model: Any,
+    concurrently: bool,
+) -> None:
+    """Індекс моделі на partitioned-таблиці: ON ONLY на батьківській, CONCURRENTLY по партиціях.
+
+    Батьківський індекс стає валідним, коли до нього приєднано індекси всіх партицій.
+    """
+    name = vector_index_name(prefix, embedding_model.pk)
+    dimensions = embedding_model.dimensions
+    # Невалідний батьківський індекс — норма до приєднання партицій, тож перевіряємо лише розмірність
+    if _stale_index(cursor, name, dimensions, check_valid=False):
+        logger.info(f"Dropping stale vector index {name} (all partitions)")
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    elif _index_exists(cursor, name) and not _stale_index(cursor, name, dimensions):
+        # Валідний — індекси всіх партицій уже приєднані
+        return
+    cursor.execute(create_vector_index_sql(table, prefix, embedding_model.pk, dimensions, False, only=True))
+
+    for partition in partitions:
+        child = vector_index_name(partition, embedding_model.pk)
+        if _stale_index(cursor, child, dimensions):
+            # Ще не приєднаний (збій CONCURRENTLY) — можна видалити окремо
+            cursor.execute(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {child}")
+        cursor.execute(create_vector_index_sql(partition, prefix, embedding_model.pk, dimensions, concurrently, name=child))
+        cursor.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+
+
+def ensure_vector_indexes(
+    embedding_model: Any, concurrently: bool = True, apps: Any = None, connection: Any = None,
+) -> list[str]:
+    """Створює відсутні ANN-індекси моделі в усіх таблицях embeddings; повертає їхні назви.
+
+    Невалідні індекси та індекси під стару розмірність моделі перебудовуються.
+    CONCURRENTLY не блокує запис, але не працює всередині транзакції — викликати поза atomic().
+    Для partitioned-таблиць індекс будується по партиціях і приєднується до батьківського.
+    Міграції передають історичні apps і schema_editor.connection: живий реєстр моделей може
+    не збігатися зі схемою на цьому кроці міграцій, а глобальний connection — не та база,
+    яку мігрують (напр. --database).
+    """
+    if connection is None:
+        from django.db import connection
+
+    created = []
+    for table, prefix in embedding_tables(apps):
+        name = vector_index_name(prefix, embedding_model.pk)
+        sql = create_vector_index_sql(table, prefix, embedding_model.pk, embedding_model.dimensions, concurrently)
+        if sql is None:
+            logger.warning(
+                f"No ANN index for {embedding_model} on {table}: "
+                f"{embedding_model.dimensions} > {HALFVEC_INDEX_MAX_DIMENSIONS} dimensions"
+            )
+            continue
+        with connection.cursor() as cursor:
+            partitions = table_partitions(cursor, table)
+            if partitions is not None:
+                _ensure_partitioned_index(cursor, table, prefix, partitions, embedding_model, concurrently)
+            else:
+                if _stale_index(cursor, name, embedding_model.dimensions):
+                    logger.info(f"Dropping stale vector index {name}")
+                    cursor.execute(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {name}")
+                cursor.execute(sql)
+        created.append(name)
+    return created
+
+
+def ensure_binary_indexes(
+    embedding_model: Any, concurrently: bool = True, apps: Any = None, connection: Any = None,
+) -> list[str]:
+    """Створює відсутні бінарні індекси моделі (BINARY_INDEX_PREFIXES); повертає їхні назви.
+
+    Використовуються двоетапним пошуком VectorSearchService (стратегія 'quantized').
+    Міграції передають історичні apps і schema_editor.connection (див. ensure_vector_indexes).
+    """
+    if connection is None:
+        from django.db import connection
+
+    created = []
+    for table, prefix in embedding_tables(apps):
+        if prefix not in BINARY_INDEX_PREFIXES:
+            continue
+        name = binary_index_name(prefix, embedding_model.pk)
+        sql = create_binary_index_sql(table, prefix, embedding_model.pk, embedding_model.dimensions, concurrently)
+        if sql is None:
+            logger.warning(f"No binary index for {embedding_model} on {table}: too many dimensions")
+            continue
+        with connection.cursor() as cursor:
+            if _stale_index(cursor, name, embedding_model.dimensions, kind='bit'):
+                logger.info(f"Dropping stale binary index {name}")
+                cursor.execute(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {name}")
+            cursor.execute(sql)
+        created.append(name)
+    return created
@@ -0,0 +1,224 @@
+"""
+Semantic answer cache for the RAG pipeline.
+
+Stores (query embedding, answer, sources) per client and embedding model in Redis. A new
+query whose embedding is within `max_cosine_distance` of a cached query gets the cached
+answer without vector search or an LLM call.
+
+Invalidation is version based: every scope key embeds the current version counters of the
+client and of the specialization and branch that were searched for it (the ones passed to
+the RAG pipeline, not the client's own `branch` FK). Any document, menu or embedding change bumps the
+matching counter (see `MASTER.rag.signals` and the ingestion pipeline), so stale entries
+are never read again and simply expire by TTL.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from django.conf import settings
+
+if TYPE_CHECKING:
+    from MASTER.branches.models import Branch
+    from MASTER.clients.models import Client
+    from MASTER.EmbeddingModel.models import EmbeddingModel
+    from MASTER.specializations.models import Specialization
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<I")
+
+
+class SemanticAnswerCache:
+    """Per-client semantic cache of RAG answers backed by Redis."""
+
+    def __init__(self, config: dict[str, Any] | None = None):
+        config = config if config is not None else getattr(settings, "SEMANTIC_CACHE_CONFIG", {})
+        self.enabled = config.get("enabled", False)
+        self.max_distance = float(config.get("max_cosine_distance", 0.05))
+        self.max_entries = int(config.get("max_entries_per_client", 50))
+        self.ttl = int(config.get("ttl_seconds", 6 * 3600))
+        self.redis_url = config.get("redis_url") or ""
+        self.key_prefix = config.get("key_prefix", "answercache:v1")
+
+        self._redis = None
+        self._redis_pid: int | None = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    def lookup(
+        self,
+        client: Client,
+        embedding_model: EmbeddingModel,
+        query_vector: list[float],
+        specialization: Specialization | None = None,
+        branch: Branch | None = None,
+    ) -> dict[str, Any] | None:
+        """Return the cached payload of the closest query within the distance limit."""
+        redis = self._get_redis()
+        if redis is None:
+            return None
+        try:
+            scope = self._scope_key(redis, client, embedding_model, specialization, branch)
+            entries = redis.lrange(scope, 0, -1)
+        except Exception as e:  # noqa: BLE001
+            self._count_error(e)
+            return None
+
+        best_payload, best_distance = self._closest(entries, query_vector)
+        if best_payload is not None and best_distance <= self.max_distance:
+            self._count("hits")
+            logger.info(f"Semantic cache hit for client {client.id}: distance={best_distance:.4f}")
+            return {**best_payload, "cache_distance": best_distance}
+
+        self._count("misses")
+        return None
+
+    def store(
+        self,
+        client: Client,
+        embedding_model: EmbeddingModel,
+        query_vector: list[float],
+        payload: dict[str, Any],
+        specialization: Specialization | None = None,
+        branch: Branch | None = None,
+    ) -> None:
+        """Add an answer for the query; the list is trimmed to `max_entries_per_client`."""
+        redis = self._get_redis()
+        if redis is None:
+            return
+        vector = np.asarray(query_vector, dtype=np.float32)
+        # Формат запису: uint32 dims + float32 вектор + JSON payload
+        entry = _HEADER.pack(len(vector)) + vector.tobytes() + json.dumps(
+            {**payload, "cached_at": int(time.time())}, ensure_ascii=False
+        ).encode("utf-8")
+        try:
+            scope = self._scope_key(redis, client, embedding_model, specialization, branch)
+            pipe = redis.pipeline()
+            pipe.lpush(scope, entry)
+            pipe.ltrim(scope, 0, self.max_entries - 1)
+            pipe.expire(scope, self.ttl)
+            pipe.execute()
+            self._count("stores")
+        except Exception as e:  # noqa: BLE001
+            self._count_error(e)
+
+    def bump(self, level: str, owner_id: int | None) -> None:
+        """Invalidate cached answers that depend on the given client/branch/specialization."""
+        if not owner_id or not self.enabled:
+            return
+        redis = self._get_redis()
+        if redis is None:
+            return
+        try:
+            redis.incr(self._version_key(level, owner_id))
+        except Exception as e:  # noqa: BLE001
+            self._count_error(e)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            data = dict(self._stats)
+        lookups = data["hits"] + data["misses"]
+        data["hit_rate"] = round(data["hits"] / lookups, 4) if lookups else None
+        return data
+
+    def _scope_key(
+        self,
+        redis,
+        client: Client,
+        embedding_model: EmbeddingModel,
+        specialization: Specialization | None,
+        branch: Branch | None,
+    ) -> str:
+        # Версії беремо з тих рівнів, по яких реально йшов пошук
+        specialization_id = specialization.pk if specialization is not None else None
+        branch_id = branch.pk if branch is not None else None
+        versions = redis.mget([
+            self._version_key("client", client.id),
+            self._version_key("specialization", specialization_id),
+            self._version_key("branch", branch_id),
+        ])
+        version = "-".join((v or b"0").decode() if isinstance(v, bytes) else str(v or 0) for v in versions)
+        return (
+            f"{self.key_prefix}:{client.id}:{specialization_id or 0}:{branch_id or 0}"
+            f":{embedding_model.id}:{version}"
+        )
+
+    def _version_key(self, level: str, owner_id: int | None) -> str:
+        return f"{self.key_prefix}:ver:{level}:{owner_id or 0}"
+
+    @staticmethod
+    def _closest(entries: list[bytes], query_vector: list[float]) -> tuple[dict[str, Any] | None, float]:
+        if not entries:
+            return None, 1.0
+        query = np.asarray(query_vector, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        if query_norm == 0.0:
+            return None, 1.0
+
+        best_raw: bytes | None = None
+        best_offset = 0
+        best_distance = 1.0
+        for raw in entries:
+            (dims,) = _HEADER.unpack_from(raw)
+            if dims != len(query):
+                continue
+            offset = _HEADER.size + dims * 4
+            cached = np.frombuffer(raw, dtype=np.float32, count=dims, offset=_HEADER.size)
+            cached_norm = float(np.linalg.norm(cached))
+            if cached_norm == 0.0:
+                continue
+            distance = 1.0 - float(np.dot(query, cached)) / (query_norm * cached_norm)
+            if distance < best_distance:
+                best_raw, best_offset, best_distance = raw, offset, distance
+
+        if best_raw is None:
+            return None, 1.0
+        return json.loads(best_raw[best_offset:].decode("utf-8")), best_distance
+
+    def _get_redis(self):
+        if not self.enabled or not self.redis_url:
+            return None
+        # Після fork створюємо власне з'єднання в дочірньому процесі
+        if self._redis is None or self._redis_pid != os.getpid():
+            import redis
+
+            self._redis = redis.Redis.from_url(
+                self.redis_url, socket_timeout=0.2, socket_connect_timeout=0.2
+            )
+            self._redis_pid = os.getpid()
+        return self._redis
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _count_error(self, error: Exception) -> None:
+        self._count("errors")
+        logger.debug(f"Semantic cache Redis error: {error}")
+
+
+_cache: SemanticAnswerCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Shared per-process instance configured from settings.SEMANTIC_CACHE_CONFIG."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticAnswerCache()
+    return _cache
+
+
+def invalidate(level: str, owner_id: int | None) -> None:
+    """Bump the cache version for a client, branch or specialization."""
+    get_answer_cache().bump(level, owner_id)
@@ -6,4 +6,7 @@ class RagConfig(AppConfig):
     name = 'MASTER.rag'
     verbose_name = 'RAG Engine'
 
+    def ready(self):
+        import MASTER.rag.signals  # noqa: F401
+
 
@@ -15,11 +15,13 @@ from typing import TYPE_CHECKING, Any
 from collections import defaultdict
 
 from django.conf import settings
+from django.db import connection
 
 from MASTER.rag.vector_search import SearchResult
 from MASTER.branches.models import BranchEmbedding, BranchDocument
 from MASTER.specializations.models import SpecializationEmbedding, SpecializationDocument
 from MASTER.clients.models import ClientEmbedding, ClientDocument
+from MASTER.processing.provider_clients import get_encoding
 
 if TYPE_CHECKING:
     pass
@@ -32,6 +34,38 @@ except ImportError:
     tiktoken = None
     logger.warning("tiktoken not available, using approximate token counting")
 
+# Levels whose chunks have neighbours: embedding table + document table (for the title)
+_NEIGHBOR_SOURCES = {
+    'branch': (BranchEmbedding, BranchDocument),
+    'specialization': (SpecializationEmbedding, SpecializationDocument),
+    'client': (ClientEmbedding, ClientDocument),
+}
+
+# Stored token count with the same precedence as vector_search.stored_token_count: the chunker's
+# cl100k count, then the embedding one; NULL (recounted) for TF-IDF fallback rows.
+_NEIGHBOR_TOKEN_COUNT_SQL = (
+    "CASE WHEN e.metadata->>'fallback' = 'true' THEN NULL "
+    "ELSE COALESCE((e.metadata->'chunker'->>'token_count')::integer, "
+    "(e.metadata->>'token_count')::integer) END"
+)
+
+# Requested (document_id, chunk_index, embedding_model_id) triples come in as three parallel
+# arrays. Rows are taken from the model the hit was found with, so a document that also has
+# rows for another model (shadow build, model switch) never mixes them in; DISTINCT ON keeps
+# one row per position (the newest) when the model is unknown or a re-ingest is in flight.
+# {tenant_filter} pins hash-partitioned tables (clients_clientembedding) to the tenant's
+# partition so the planner prunes the others.
+_NEIGHBOR_LEVEL_SQL = (
+    "(SELECT DISTINCT ON (e.document_id, e.chunk_index) "
+    "'{level}'::text AS level, e.document_id::bigint AS document_id, e.chunk_index, "
+    "e.embedding_model_id, e.content, d.title::text AS document_title, {token_count} AS token_count "
+    "FROM unnest(%s::bigint[], %s::integer[], %s::bigint[]) AS w(document_id, chunk_index, embedding_model_id) "
+    "JOIN {table} e ON e.document_id = w.document_id AND e.chunk_index = w.chunk_index "
+    "AND (w.embedding_model_id IS NULL OR e.embedding_model_id = w.embedding_model_id){tenant_filter} "
+    "LEFT JOIN {document_table} d ON d.id = e.document_id "
+    "ORDER BY e.document_id, e.chunk_index, e.id DESC)"
+)
+
 
 class ContextChunk:
     """Single chunk of context with metadata for LLM."""
@@ -43,12 +77,14 @@ class ContextChunk:
         source_level: str,
         chunk_index: int,
         similarity: float,
+        token_count: int = 0,
     ):
         self.content = content
         self.source_title = source_title
         self.source_level = source_level
         self.chunk_index = chunk_index
         self.similarity = similarity
+        self.token_count = token_count
     
     def to_citation(self) -> str:
         """Format as citation for LLM context."""
@@ -68,7 +104,7 @@ class ContextBuilder:
         self.max_tokens = self.config['max_context_tokens']
         
         if tiktoken:
-            self.encoding = tiktoken.encoding_for_model("gpt-4")
+            self.encoding = get_encoding("gpt-4")
         else:
             self.encoding = None
     
@@ -76,6 +112,7 @@ class ContextBuilder:
         self,
         search_results: list[SearchResult],
         include_neighbors: bool = True,
+        client_id: int | None = None,
     ) -> tuple[str, list[ContextChunk]]:
         """
         Build context string for LLM from search results.
@@ -83,6 +120,8 @@ class ContextBuilder:
         Args:
             search_results: Sorted list of search results
             include_neighbors: Whether to load neighboring chunks for better context
+            client_id: Client the client-level hits belong to (limits the neighbour
+                lookup to that client's partition)
             
         Returns:
             Tuple of (context_string, list_of_chunks)
@@ -94,7 +133,7 @@ class ContextBuilder:
         
         # Load neighbor chunks if requested
         if include_neighbors and self.context_window > 0:
-            chunks_by_doc = self._load_neighbor_chunks(chunks_by_doc)
+            chunks_by_doc = self._load_neighbor_chunks(chunks_by_doc, client_id)
         
         # Flatten, deduplicate, and limit by tokens
         context_chunks = self._assemble_chunks(chunks_by_doc, search_results)
@@ -102,7 +141,7 @@ class ContextBuilder:
         # Build final context string
         context_string = self._format_context(context_chunks)
         
-        logger.info(f"Built context: {len(context_chunks)} chunks, ~{self._count_tokens(context_string)} tokens")
+        logger.info(f"Built context: {len(context_chunks)} chunks, ~{self.count_context_tokens(context_chunks)} tokens")
         
         return context_string, context_chunks
     
@@ -122,12 +161,15 @@ class ContextBuilder:
     def _load_neighbor_chunks(
         self,
         chunks_by_doc: dict[tuple[str, int | None], list[SearchResult]],
+        client_id: int | None = None,
     ) -> dict[tuple[str, int | None], list[SearchResult]]:
         """Load neighboring chunks for better context continuity."""
         enhanced_results: dict[tuple[str, int | None], list[SearchResult]] = {}
+        wanted: dict[tuple[str, int], set[int]] = {}
+        search_models: dict[tuple[str, int], int | None] = {}
         
         for (level, doc_id), results in chunks_by_doc.items():
-            if not doc_id:
+            if not doc_id or level not in _NEIGHBOR_SOURCES:
                 enhanced_results[(level, doc_id)] = results
                 continue
             
@@ -137,17 +179,24 @@ class ContextBuilder:
                 idx = result.chunk_index
                 # Add neighbors: idx-window, idx-window+1, ..., idx, ..., idx+window
                 for offset in range(-self.context_window, self.context_window + 1):
-                    chunk_indices.add(idx + offset)
-            
-            # Load chunks from database
-            neighbor_results = self._load_chunks_from_db(level, doc_id, chunk_indices)
-            
+                    if idx + offset >= 0:
+                        chunk_indices.add(idx + offset)
+            wanted[(level, doc_id)] = chunk_indices
+            # A level is searched with one model, so all hits of a document share it
+            search_models[(level, doc_id)] = next(
+                (r.embedding_model_id for r in results if r.embedding_model_id is not None), None
+            )
+        
+        # One query for all documents and levels
+        neighbors = self._load_chunks_from_db(wanted, search_models, client_id)
+        
+        for key in wanted:
             # Merge with original results (keep original similarity scores)
-            all_results = {r.chunk_index: r for r in neighbor_results}
-            for result in results:
+            all_results = {r.chunk_index: r for r in neighbors.get(key, [])}
+            for result in chunks_by_doc[key]:
                 all_results[result.chunk_index] = result  # Original takes precedence
             
-            enhanced_results[(level, doc_id)] = sorted(
+            enhanced_results[key] = sorted(
                 all_results.values(),
                 key=lambda r: r.chunk_index
             )
@@ -156,66 +205,64 @@ class ContextBuilder:
     
     def _load_chunks_from_db(
         self,
-        level: str,
-        doc_id: int,
-        chunk_indices: set[int],
-    ) -> list[SearchResult]:
-        """Load specific chunks from database by indices."""
-        results = []
+        wanted: dict[tuple[str, int], set[int]],
+        search_models: dict[tuple[str, int], int | None] | None = None,
+        client_id: int | None = None,
+    ) -> dict[tuple[str, int], list[SearchResult]]:
+        """
+        Load specific chunks for many documents in a single query.
+
+        Every level becomes a UNION ALL branch that joins the requested (document, chunk_index)
+        pairs against the (document, chunk_index) index and fetches only content and title,
+        so the cost depends on the window size, not on the document length. Chunks are taken
+        from the embedding model in `search_models` (the one the hits were found with);
+        client-level rows are also filtered by `client_id`, so only that client's hash
+        partition is scanned.
+        """
+        search_models = search_models or {}
+        subqueries: list[str] = []
+        params: list[Any] = []
         
-        if level == 'branch':
-            embeddings = BranchEmbedding.objects.filter(
-                document_id=doc_id
-            ).select_related('document')
-            
-            for emb in embeddings:
-                chunk_idx = emb.metadata.get('chunk_index', 0) if emb.metadata else 0
-                if chunk_idx in chunk_indices:
-                    results.append(SearchResult(
-                        content=emb.content,
-                        similarity=0.0,  # Neighbor, not from search
-                        level='branch',
-                        document_id=doc_id,
-                        document_title=emb.document.title if emb.document else None,
-                        metadata=emb.metadata or {},
-                        chunk_index=chunk_idx,
-                    ))
+        for level, (embedding_cls, document_cls) in _NEIGHBOR_SOURCES.items():
+            pairs = [
+                (doc_id, idx, search_models.get((level, doc_id)))
+                for (pair_level, doc_id), indices in wanted.items() if pair_level == level
+                for idx in sorted(indices)
+            ]
+            if not pairs:
+                continue
+            tenant_id = client_id if level == 'client' else None
+            subqueries.append(_NEIGHBOR_LEVEL_SQL.format(
+                level=level,
+                table=embedding_cls._meta.db_table,
+                document_table=document_cls._meta.db_table,
+                token_count=_NEIGHBOR_TOKEN_COUNT_SQL,
+                tenant_filter=" AND e.client_id = %s" if tenant_id is not None else "",
+            ))
+            params.append([doc_id for doc_id, _, _ in pairs])
+            params.append([idx for _, idx, _ in pairs])
+            params.append([model_id for _, _, model_id in pairs])
+            if tenant_id is not None:
+                params.append(tenant_id)
         
-        elif level == 'specialization':
-            embeddings = SpecializationEmbedding.objects.filter(
-                document_id=doc_id
-            ).select_related('document')
-            
-            for emb in embeddings:
-                chunk_idx = emb.metadata.get('chunk_index', 0) if emb.metadata else 0
-                if chunk_idx in chunk_indices:
-                    results.append(SearchResult(
-                        content=emb.content,
-                        similarity=0.0,
-                        level='specialization',
-                        document_id=doc_id,
-                        document_title=emb.document.title if emb.document else None,
-                        metadata=emb.metadata or {},
-                        chunk_index=chunk_idx,
-                    ))
+        results: dict[tuple[str, int], list[SearchResult]] = defaultdict(list)
+        if not subqueries:
+            return results
         
-        elif level == 'client':
-            embeddings = ClientEmbedding.objects.filter(
-                document_id=doc_id
-            ).select_related('document')
-            
-            for emb in embeddings:
-                chunk_idx = emb.metadata.get('chunk_index', 0) if emb.metadata else 0
-                if chunk_idx in chunk_indices:
-                    results.append(SearchResult(
-                        content=emb.content,
-                        similarity=0.0,
-                        level='client',
-                        document_id=doc_id,
-                        document_title=emb.document.title if emb.document else None,
-                        metadata=emb.metadata or {},
-                        chunk_index=chunk_idx,
-                    ))
+        with connection.cursor() as cursor:
+            cursor.execute(" UNION ALL ".join(subqueries), params)
+            for level, doc_id, chunk_idx, model_id, content, title, token_count in cursor.fetchall():
+                results[(level, doc_id)].append(SearchResult(
+                    content=content,
+                    similarity=0.0,  # Neighbor, not from search
+                    level=level,
+                    document_id=doc_id,
+                    document_title=title,
+                    metadata={},
+                    chunk_index=chunk_idx,
+                    token_count=token_count,
+                    embedding_model_id=model_id,
+                ))
         
         return results
     
@@ -242,8 +289,10 @@ class ContextBuilder:
                 if doc_result.content in seen_content:
                     continue
                 
-                # Count tokens
-                chunk_tokens = self._count_tokens(doc_result.content)
+                # Stored count from ingestion; tokenise only chunks without one
+                chunk_tokens = doc_result.token_count
+                if chunk_tokens is None:
+                    chunk_tokens = self._count_tokens(doc_result.content)
                 if total_tokens + chunk_tokens > self.max_tokens:
                     logger.warning(f"Token limit reached: {total_tokens}/{self.max_tokens}")
                     break
@@ -255,6 +304,7 @@ class ContextBuilder:
                     source_level=doc_result.level,
                     chunk_index=doc_result.chunk_index,
                     similarity=doc_result.similarity,
+                    token_count=chunk_tokens,
                 ))
                 
                 seen_content.add(doc_result.content)
@@ -268,7 +318,7 @@ class ContextBuilder:
         
         return context_chunks
     
-    def _format_context(self, chunks: list[ContextChunk]) -> str:
+    def _format_context(self, chunks: list[ContextChunk], include_content: bool = True) -> str:
         """Format chunks into context string for LLM."""
         if not chunks:
             return ""
@@ -278,13 +328,28 @@ class ContextBuilder:
         for i, chunk in enumerate(chunks, 1):
             parts.append(f"\n--- Context {i} ---")
             parts.append(f"{chunk.to_citation()}")
-            parts.append(chunk.content)
+            if include_content:
+                parts.append(chunk.content)
             parts.append("")
         
         parts.append("=== END CONTEXT ===")
         
         return "\n".join(parts)
     
+    def count_context_tokens(self, chunks: list[ContextChunk]) -> int:
+        """
+        Token size of the formatted context without re-encoding it.
+
+        Chunk bodies use their stored counts; only the headers and citations (which have
+        no stored count) are tokenised. Token merges across the joins make this approximate
+        to a few tokens per chunk.
+        """
+        if not chunks:
+            return 0
+        return sum(chunk.token_count for chunk in chunks) + self._count_tokens(
+            self._format_context(chunks, include_content=False)
+        )
+    
     def _count_tokens(self, text: str) -> int:
         """Count tokens in text."""
         if not text:
@@ -10,15 +10,17 @@ Handles:
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import time
-from typing import TYPE_CHECKING, Generator, Any, cast, Iterable
+from typing import TYPE_CHECKING, AsyncGenerator, AsyncIterable, Generator, Any, cast, Iterable
 
 from django.conf import settings
 
 from MASTER.clients.models import Client
 from MASTER.branches.models import Branch
 from MASTER.specializations.models import Specialization
+from MASTER.processing.provider_clients import get_async_openai_client, get_openai_client
 
 if TYPE_CHECKING:
     pass
@@ -56,7 +58,8 @@ class LLMClient:
         if not api_key:
             raise ValueError("OPENAI_API_KEY is not set or empty")
         
-        self.client = OpenAI(api_key=api_key)
+        # Спільний для процесу клієнт з пулом keep-alive з'єднань
+        self.client = get_openai_client()
         self.model = self.config['model']
         self.temperature = self.config['temperature']
         self.max_tokens = self.config['max_tokens']
@@ -72,6 +75,7 @@ class LLMClient:
         specialization: Specialization | None = None,
         branch: Branch | None = None,
         stream: bool = True,
+        usage: dict[str, int] | None = None,
     ) -> str | Generator[str, None, None]:
         """
         Generate response from LLM.
@@ -83,45 +87,30 @@ class LLMClient:
             specialization: Specialization for industry-specific prompts
             branch: Branch for general prompts
             stream: Whether to stream response
+            usage: Optional dict filled with the provider's token usage
+                (prompt_tokens, completion_tokens, total_tokens); when streaming
+                it is filled once the generator is exhausted
             
         Returns:
             Complete response string or generator of chunks if streaming
         """
-        system_prompt = self._get_system_prompt(client, specialization, branch)
-        
-        messages: list[ChatCompletionMessageParam] = cast(
-            list[ChatCompletionMessageParam],
-            [
-                {"role": "system", "content": system_prompt},
-                {
-                    "role": "user",
-                    "content": f"{context}\n\n=== USER QUESTION ===\n{user_query}",
-                },
-            ],
-        )
+        messages = self.build_messages(user_query, context, client, specialization, branch)
         
         logger.info(f"LLM request: model={self.model}, stream={stream}")
-        logger.debug(f"System prompt: {system_prompt[:200]}...")
         
         for attempt in range(self.max_retries):
             try:
                 response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens,
-                    top_p=self.config['top_p'],
-                    frequency_penalty=self.config['frequency_penalty'],
-                    presence_penalty=self.config['presence_penalty'],
-                    stream=stream,
-                    timeout=self.timeout,
+                    **self._completion_options(messages, stream, usage),
                 )
                 
                 if stream:
                     response_stream = cast(Iterable[Any], response)
-                    return self._stream_response(response_stream)
+                    return self._stream_response(response_stream, usage)
                 else:
                     completion = cast(Any, response)
+                    if usage is not None:
+                        self._copy_usage(completion, usage)
                     return completion.choices[0].message.content or ""
             
             except RateLimitError as e:
@@ -144,6 +133,101 @@ class LLMClient:
         
         raise Exception("Max retries exceeded")
     
+    async def agenerate_response(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        stream: bool = True,
+        usage: dict[str, int] | None = None,
+    ) -> str | AsyncGenerator[str, None]:
+        """
+        Async variant of generate_response() for ASGI views.
+
+        Takes prebuilt messages (see build_messages(), which may query the database and
+        therefore runs outside the event loop). Retries the same errors as the sync path,
+        with asyncio.sleep between attempts.
+        """
+        async_client = get_async_openai_client()
+        logger.info(f"LLM request (async): model={self.model}, stream={stream}")
+        
+        for attempt in range(self.max_retries):
+            try:
+                response = await async_client.chat.completions.create(
+                    **self._completion_options(messages, stream, usage),
+                )
+                
+                if stream:
+                    return self._astream_response(response, usage)
+                completion = cast(Any, response)
+                if usage is not None:
+                    self._copy_usage(completion, usage)
+                return completion.choices[0].message.content or ""
+            
+            except RateLimitError as e:
+                logger.warning(f"Rate limit hit (attempt {attempt + 1}/{self.max_retries}): {e}")
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(self.retry_delay * (attempt + 1))
+                else:
+                    raise
+            
+            except APITimeoutError as e:
+                logger.warning(f"API timeout (attempt {attempt + 1}/{self.max_retries}): {e}")
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(self.retry_delay)
+                else:
+                    raise
+            
+            except OpenAIError as e:
+                logger.error(f"OpenAI API error: {e}")
+                raise
+        
+        raise Exception("Max retries exceeded")
+    
+    def build_messages(
+        self,
+        user_query: str,
+        context: str,
+        client: Client | None = None,
+        specialization: Specialization | None = None,
+        branch: Branch | None = None,
+    ) -> list[ChatCompletionMessageParam]:
+        """System prompt (Client > Specialization > Branch > Default) plus context and question."""
+        system_prompt = self._get_system_prompt(client, specialization, branch)
+        logger.debug(f"System prompt: {system_prompt[:200]}...")
+        
+        return cast(
+            list[ChatCompletionMessageParam],
+            [
+                {"role": "system", "content": system_prompt},
+                {
+                    "role": "user",
+                    "content": f"{context}\n\n=== USER QUESTION ===\n{user_query}",
+                },
+            ],
+        )
+    
+    def _completion_options(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        stream: bool,
+        usage: dict[str, int] | None,
+    ) -> dict[str, Any]:
+        """Keyword arguments for chat.completions.create (shared by sync and async paths)."""
+        options: dict[str, Any] = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.config['top_p'],
+            "frequency_penalty": self.config['frequency_penalty'],
+            "presence_penalty": self.config['presence_penalty'],
+            "stream": stream,
+            "timeout": self.timeout,
+        }
+        if stream and usage is not None:
+            # Останній chunk потоку містить usage (і порожній choices)
+            options["stream_options"] = {"include_usage": True}
+        return options
+    
     def _get_system_prompt(
         self,
         client: Client | None,
@@ -235,11 +319,42 @@ class LLMClient:
         
         return 'default'
     
-    def _stream_response(self, response: Iterable[Any]) -> Generator[str, None, None]:
+    def _stream_response(
+        self, response: Iterable[Any], usage: dict[str, int] | None = None
+    ) -> Generator[str, None, None]:
         """Stream response chunks from OpenAI."""
         for chunk in response:
+            if usage is not None:
+                self._copy_usage(chunk, usage)
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content or ""
+            if content:
+                yield content
+    
+    async def _astream_response(
+        self, response: AsyncIterable[Any], usage: dict[str, int] | None = None
+    ) -> AsyncGenerator[str, None]:
+        """Stream response chunks from AsyncOpenAI."""
+        async for chunk in response:
+            if usage is not None:
+                self._copy_usage(chunk, usage)
+            if not chunk.choices:
+                continue
             content = chunk.choices[0].delta.content or ""
             if content:
                 yield content
+    
+    @staticmethod
+    def _copy_usage(response: Any, usage: dict[str, int]) -> None:
+        """Copy token usage from a completion or the final stream chunk into `usage`."""
+        provider_usage = getattr(response, "usage", None)
+        if provider_usage is None:
+            return
+        usage.update({
+            "prompt_tokens": int(getattr(provider_usage, "prompt_tokens", 0) or 0),
+            "completion_tokens": int(getattr(provider_usage, "completion_tokens", 0) or 0),
+            "total_tokens": int(getattr(provider_usage, "total_tokens", 0) or 0),
+        })
 
 
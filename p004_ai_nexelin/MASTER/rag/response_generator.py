@@ -10,15 +10,19 @@ Combines:
 
 from __future__ import annotations
 
+import json
 import logging
-from typing import TYPE_CHECKING, Generator, Any, cast
+from typing import TYPE_CHECKING, AsyncGenerator, Callable, Generator, Any, cast
 from dataclasses import dataclass
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import close_old_connections
 
 from MASTER.rag.vector_search import VectorSearchService
 from MASTER.rag.context_builder import ContextBuilder, ContextChunk
 from MASTER.rag.llm_client import LLMClient
+from MASTER.rag.answer_cache import get_answer_cache
 from MASTER.processing.embedding_service import EmbeddingService
 from MASTER.clients.models import Client
 from MASTER.EmbeddingModel.models import EmbeddingModel
@@ -29,6 +33,33 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# (client, searched specialization, searched branch, embedding model, query vector)
+CacheScope = tuple[Client, "Specialization | None", "Branch | None", EmbeddingModel, list[float]]
+
+
+def db_sync_to_async(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    sync_to_async for blocking DB/Redis work of concurrent chats.
+
+    thread_sensitive=False runs calls in a thread pool instead of the single shared sync
+    thread, so concurrent chats do not queue behind each other. Those threads live outside
+    the request cycle, so stale connections are closed around each call just like
+    request_started/request_finished do for sync views (CONN_MAX_AGE is honoured).
+    """
+    def run(*args: Any, **kwargs: Any) -> Any:
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def sse_event(payload: dict[str, Any]) -> str:
+    """Encode one Server-Sent Event carrying a JSON payload."""
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
 
 @dataclass
 class RAGResponse:
@@ -39,6 +70,7 @@ class RAGResponse:
     context_used: str
     num_chunks: int
     total_tokens: int
+    from_cache: bool = False
 
 
 class ResponseGenerator:
@@ -49,6 +81,7 @@ class ResponseGenerator:
         self.vector_search = VectorSearchService()
         self.context_builder = ContextBuilder()
         self.llm_client = LLMClient()
+        self.answer_cache = get_answer_cache()
     
     def generate(
         self,
@@ -57,9 +90,10 @@ class ResponseGenerator:
         specialization: Specialization | None = None,
         branch: Branch | None = None,
         stream: bool = False,
+        use_semantic_cache: bool = True,
     ) -> RAGResponse | Generator[str, None, None]:
         """
-        Generate response using full RAG pipeline.
+        Generate response using full RAG pipeline (see agenerate() for the async variant).
         
         Args:
             query: User's question
@@ -67,6 +101,8 @@ class ResponseGenerator:
             specialization: Specialization context
             branch: Branch context
             stream: Whether to stream response
+            use_semantic_cache: Consult/update the per-client answer cache
+                (only when SEMANTIC_CACHE_CONFIG['enabled'] and a client is given)
             
         Returns:
             RAGResponse object or generator of response chunks if streaming
@@ -75,31 +111,23 @@ class ResponseGenerator:
         
         # Step 1: Create query embedding
         embedding_model = self._get_embedding_model(client, specialization, branch)
-        query_embedding_result = EmbeddingService.create_embedding(query, embedding_model)
+        query_embedding_result = EmbeddingService.create_embedding(query, embedding_model, use_cache=True)
         query_vector = query_embedding_result['vector']
 
-        # Step 2: Vector search (передаємо embedding_model для фільтрації)
-        search_results = self.vector_search.search(
-            query_vector=query_vector,
-            branch=branch,
-            specialization=specialization,
-            client=client,
-            embedding_model=embedding_model,
-        )
-        
-        if not search_results:
-            logger.warning("No relevant context found for query")
-            return self._no_context_response(query)
-        
-        if len(search_results) < self.config['min_chunks_for_answer']:
-            logger.warning(f"Insufficient context: {len(search_results)} chunks")
-            return self._insufficient_context_response(query, search_results)
-        
-        # Step 3: Build context
-        context_string, context_chunks = self.context_builder.build_context(
-            search_results=search_results,
-            include_neighbors=True,
-        )
+        # Step 1b: Semantic answer cache — близьке питання з тим самим станом даних клієнта
+        cache_scope = None
+        if use_semantic_cache and self.answer_cache.enabled and client is not None:
+            cache_scope = (client, specialization, branch, embedding_model, query_vector)
+            cached = self.answer_cache.lookup(client, embedding_model, query_vector, specialization, branch)
+            if cached is not None:
+                response = self._cached_response(query, cached)
+                return self._stream_static(response) if stream else response
+
+        # Steps 2-3: Vector search + context
+        retrieved = self._retrieve(query, query_vector, client, specialization, branch, embedding_model)
+        if isinstance(retrieved, RAGResponse):
+            return self._stream_static(retrieved) if stream else retrieved
+        context_string, context_chunks = retrieved
         
         # Step 4: Generate response
         if stream:
@@ -110,9 +138,10 @@ class ResponseGenerator:
                 client=client,
                 specialization=specialization,
                 branch=branch,
+                cache_scope=cache_scope,
             )
         else:
-            return self._generate_complete(
+            response = self._generate_complete(
                 query=query,
                 context=context_string,
                 context_chunks=context_chunks,
@@ -120,6 +149,103 @@ class ResponseGenerator:
                 specialization=specialization,
                 branch=branch,
             )
+            if cache_scope is not None:
+                self._store_answer(cache_scope, response.answer, response.sources,
+                                   response.num_chunks, response.total_tokens)
+            return response
+    
+    async def agenerate(
+        self,
+        query: str,
+        client: Client | None = None,
+        specialization: Specialization | None = None,
+        branch: Branch | None = None,
+        stream: bool = False,
+        use_semantic_cache: bool = True,
+    ) -> RAGResponse | AsyncGenerator[str, None]:
+        """
+        Async variant of generate() for ASGI views.
+
+        The query embedding and the LLM call are awaited on the event loop, so a chat
+        waiting for OpenAI holds no thread. Database and Redis work (model lookup, vector
+        search, context assembly, answer cache, system prompt) runs in worker threads
+        via `db_sync_to_async`.
+
+        Returns:
+            RAGResponse object or async generator of SSE events if streaming
+        """
+        logger.info(f"RAG query (async): '{query[:100]}...' for client={client}, spec={specialization}, branch={branch}")
+        
+        # Step 1: Create query embedding
+        embedding_model = await db_sync_to_async(self._get_embedding_model)(client, specialization, branch)
+        query_embedding_result = await EmbeddingService.acreate_embedding(query, embedding_model, use_cache=True)
+        query_vector = query_embedding_result['vector']
+        
+        # Step 1b: Semantic answer cache
+        cache_scope = None
+        if use_semantic_cache and self.answer_cache.enabled and client is not None:
+            cache_scope = (client, specialization, branch, embedding_model, query_vector)
+            cached = await db_sync_to_async(self.answer_cache.lookup)(
+                client, embedding_model, query_vector, specialization, branch,
+            )
+            if cached is not None:
+                response = self._cached_response(query, cached)
+                return self._astream_static(response) if stream else response
+        
+        # Steps 2-3: Vector search + context (one thread hop)
+        retrieved = await db_sync_to_async(self._retrieve)(
+            query, query_vector, client, specialization, branch, embedding_model,
+        )
+        if isinstance(retrieved, RAGResponse):
+            return self._astream_static(retrieved) if stream else retrieved
+        context_string, context_chunks = retrieved
+        messages = await db_sync_to_async(self.llm_client.build_messages)(
+            query, context_string, client, specialization, branch,
+        )
+        
+        # Step 4: Generate response
+        if stream:
+            return self._agenerate_streaming(messages, context_chunks, cache_scope)
+        
+        answer = cast(str, await self.llm_client.agenerate_response(messages, stream=False))
+        # tiktoken-підрахунок і запис у кеш — одним переходом у worker-потік
+        return await db_sync_to_async(self._finish_complete)(
+            query, context_string, context_chunks, answer, cache_scope,
+        )
+    
+    def _retrieve(
+        self,
+        query: str,
+        query_vector: list[float],
+        client: Client | None,
+        specialization: Specialization | None,
+        branch: Branch | None,
+        embedding_model: EmbeddingModel,
+    ) -> RAGResponse | tuple[str, list[ContextChunk]]:
+        """Vector search and context assembly; a RAGResponse when there is nothing to answer from."""
+        # Vector search (передаємо embedding_model для фільтрації)
+        search_results = self.vector_search.search(
+            query_vector=query_vector,
+            branch=branch,
+            specialization=specialization,
+            client=client,
+            embedding_model=embedding_model,
+        )
+        
+        if not search_results:
+            logger.warning("No relevant context found for query")
+            return self._no_context_response(query)
+        
+        if len(search_results) < self.config['min_chunks_for_answer']:
+            logger.warning(f"Insufficient context: {len(search_results)} chunks")
+            return self._insufficient_context_response(query, search_results)
+        
+        # Build context
+        return self.context_builder.build_context(
+            search_results=search_results,
+            include_neighbors=True,
+            client_id=client.pk if client is not None else None,
+        )
     
     def _generate_complete(
         self,
@@ -140,6 +266,15 @@ class ResponseGenerator:
             stream=False,
         ))
         
+        return self._complete_response(query, context, context_chunks, answer)
+    
+    def _complete_response(
+        self,
+        query: str,
+        context: str,
+        context_chunks: list[ContextChunk],
+        answer: str,
+    ) -> RAGResponse:
         sources = self._format_sources(context_chunks)
         
         return RAGResponse(
@@ -148,9 +283,25 @@ class ResponseGenerator:
             query=query,
             context_used=context if settings.DEBUG else "",  # Only in debug
             num_chunks=len(context_chunks),
-            total_tokens=self.context_builder._count_tokens(context + answer),
+            total_tokens=self.context_builder.count_context_tokens(context_chunks)
+            + self.context_builder._count_tokens(answer),
         )
     
+    def _finish_complete(
+        self,
+        query: str,
+        context: str,
+        context_chunks: list[ContextChunk],
+        answer: str,
+        cache_scope: CacheScope | None,
+    ) -> RAGResponse:
+        """Build the complete response (token counts included) and cache it."""
+        response = self._complete_response(query, context, context_chunks, answer)
+        if cache_scope is not None:
+            self._store_answer(cache_scope, response.answer, response.sources,
+                               response.num_chunks, response.total_tokens)
+        return response
+    
     def _generate_streaming(
         self,
         query: str,
@@ -159,33 +310,155 @@ class ResponseGenerator:
         client: Client | None,
         specialization: Specialization | None,
         branch: Branch | None,
+        cache_scope: CacheScope | None = None,
     ) -> Generator[str, None, None]:
-        """Generate streaming response."""
+        """
+        Generate streaming response as Server-Sent Events.
+
+        Every event is a JSON object in a `data:` line: one "sources" event, a "token"
+        event per answer delta and a final "done" event with token usage (or an "error"
+        event if generation fails after the stream has started).
+        """
         # First, yield sources metadata
         sources = self._format_sources(context_chunks)
-        sources_json = {
+        yield sse_event({
             "type": "sources",
             "sources": sources,
             "num_chunks": len(context_chunks),
-        }
-        yield f"data: {sources_json}\n\n"
+        })
         
         # Then stream answer chunks
-        response_stream = self.llm_client.generate_response(
-            user_query=query,
-            context=context,
-            client=client,
-            specialization=specialization,
-            branch=branch,
-            stream=True,
-        )
+        usage: dict[str, int] = {}
+        answer_parts: list[str] = []
+        try:
+            response_stream = self.llm_client.generate_response(
+                user_query=query,
+                context=context,
+                client=client,
+                specialization=specialization,
+                branch=branch,
+                stream=True,
+                usage=usage,
+            )
+            for chunk in response_stream:
+                answer_parts.append(str(chunk))
+                yield sse_event({"type": "token", "content": str(chunk)})
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {e}", exc_info=True)
+            yield sse_event({"type": "error", "error": "Generation failed"})
+            return
+
+        # Final event
+        yield self._finish_stream("".join(answer_parts), sources, context_chunks, usage, cache_scope)
+    
+    async def _agenerate_streaming(
+        self,
+        messages: list[Any],
+        context_chunks: list[ContextChunk],
+        cache_scope: CacheScope | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """Async variant of _generate_streaming (same events)."""
+        sources = self._format_sources(context_chunks)
+        yield sse_event({
+            "type": "sources",
+            "sources": sources,
+            "num_chunks": len(context_chunks),
+        })
         
-        for chunk in response_stream:
-            yield f"data: {chunk}\n\n"
+        usage: dict[str, int] = {}
+        answer_parts: list[str] = []
+        try:
+            response_stream = cast(
+                AsyncGenerator[str, None],
+                await self.llm_client.agenerate_response(messages, stream=True, usage=usage),
+            )
+            async for chunk in response_stream:
+                answer_parts.append(str(chunk))
+                yield sse_event({"type": "token", "content": str(chunk)})
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {e}", exc_info=True)
+            yield sse_event({"type": "error", "error": "Generation failed"})
+            return
         
-        # Final event
-        yield "data: [DONE]\n\n"
+        yield await db_sync_to_async(self._finish_stream)(
+            "".join(answer_parts), sources, context_chunks, usage, cache_scope,
+        )
     
+    def _finish_stream(
+        self,
+        answer: str,
+        sources: list[dict[str, Any]],
+        context_chunks: list[ContextChunk],
+        usage: dict[str, int],
+        cache_scope: CacheScope | None,
+    ) -> str:
+        """Cache the streamed answer and build the final "done" event."""
+        total_tokens = (
+            self.context_builder.count_context_tokens(context_chunks)
+            + self.context_builder._count_tokens(answer)
+        )
+        if cache_scope is not None:
+            self._store_answer(cache_scope, answer, sources, len(context_chunks), total_tokens)
+        
+        return sse_event({
+            "type": "done",
+            "num_chunks": len(context_chunks),
+            "total_tokens": total_tokens,
+            "usage": usage or None,
+            "from_cache": False,
+        })
+
+    def _store_answer(
+        self,
+        cache_scope: CacheScope,
+        answer: str,
+        sources: list[dict[str, Any]],
+        num_chunks: int,
+        total_tokens: int,
+    ) -> None:
+        """Save a generated answer to the semantic cache."""
+        if not answer:
+            return
+        client, specialization, branch, embedding_model, query_vector = cache_scope
+        self.answer_cache.store(client, embedding_model, query_vector, {
+            "answer": answer,
+            "sources": sources,
+            "num_chunks": num_chunks,
+            "total_tokens": total_tokens,
+        }, specialization, branch)
+
+    def _cached_response(self, query: str, cached: dict[str, Any]) -> RAGResponse:
+        """Build RAGResponse from a semantic cache entry."""
+        return RAGResponse(
+            answer=cached.get("answer", ""),
+            sources=cached.get("sources", []),
+            query=query,
+            context_used="",
+            num_chunks=int(cached.get("num_chunks", 0)),
+            total_tokens=int(cached.get("total_tokens", 0)),
+            from_cache=True,
+        )
+
+    def _stream_static(self, response: RAGResponse) -> Generator[str, None, None]:
+        """Replay a ready answer (cached, no context) in the same event format as _generate_streaming."""
+        yield sse_event({
+            "type": "sources",
+            "sources": response.sources,
+            "num_chunks": response.num_chunks,
+        })
+        yield sse_event({"type": "token", "content": response.answer})
+        yield sse_event({
+            "type": "done",
+            "num_chunks": response.num_chunks,
+            "total_tokens": response.total_tokens,
+            "usage": None,
+            "from_cache": response.from_cache,
+        })
+
+    async def _astream_static(self, response: RAGResponse) -> AsyncGenerator[str, None]:
+        for event in self._stream_static(response):
+            yield event
+
     def _format_sources(self, chunks: list[ContextChunk]) -> list[dict[str, Any]]:
         """Format context chunks as source citations."""
         sources = []
@@ -0,0 +1,58 @@
+"""
+Invalidate the semantic answer cache when anything an answer depends on changes:
+documents, menu items and their embeddings, and the owners' prompts/settings.
+
+Document embeddings are deliberately not hooked: the ingestion pipeline replaces them with
+a bulk DELETE + INSERT and invalidates explicitly, and a post_delete receiver would force
+Django to load every deleted row (vectors included) instead of a single DELETE.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from MASTER.branches.models import Branch, BranchDocument
+from MASTER.clients.models import Client, ClientDocument
+from MASTER.specializations.models import Specialization, SpecializationDocument
+from MASTER.restaurant.models import MenuCategory, MenuItem, MenuItemEmbedding
+
+from .answer_cache import get_answer_cache, invalidate
+
+
+@receiver([post_save, post_delete], sender=Client)
+def invalidate_client(sender, instance, **kwargs):
+    invalidate("client", instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Branch)
+def invalidate_branch(sender, instance, **kwargs):
+    invalidate("branch", instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Specialization)
+def invalidate_specialization(sender, instance, **kwargs):
+    invalidate("specialization", instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ClientDocument)
+@receiver([post_save, post_delete], sender=MenuCategory)
+@receiver([post_save, post_delete], sender=MenuItem)
+def invalidate_client_content(sender, instance, **kwargs):
+    invalidate("client", instance.client_id)
+
+
+@receiver([post_save, post_delete], sender=MenuItemEmbedding)
+def invalidate_menu_embedding(sender, instance, **kwargs):
+    if not get_answer_cache().enabled:
+        return
+    client_id = MenuItem.objects.filter(pk=instance.menu_item_id).values_list("client_id", flat=True).first()
+    invalidate("client", client_id)
+
+
+@receiver([post_save, post_delete], sender=BranchDocument)
+def invalidate_branch_content(sender, instance, **kwargs):
+    invalidate("branch", instance.branch_id)
+
+
+@receiver([post_save, post_delete], sender=SpecializationDocument)
+def invalidate_specialization_content(sender, instance, **kwargs):
+    invalidate("specialization", instance.specialization_id)
@@ -0,0 +1,103 @@
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from MASTER.branches.models import Branch, BranchDocument
+from MASTER.clients.models import Client
+from MASTER.clients.tests import PgvectorTestMixin
+from MASTER.EmbeddingModel.models import EmbeddingModel
+from MASTER.specializations.models import Specialization
+
+from .answer_cache import SemanticAnswerCache
+
+
+class FakeRedis:
+    """Мінімальна in-memory заміна Redis для команд, які використовує SemanticAnswerCache."""
+
+    def __init__(self):
+        self.values = {}
+        self.lists = {}
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+
+    def lpush(self, key, value):
+        self.redis.lists.setdefault(key, []).insert(0, value)
+
+    def ltrim(self, key, start, end):
+        self.redis.lists[key] = self.redis.lists.get(key, [])[start:end + 1]
+
+    def expire(self, key, ttl):
+        pass
+
+    def execute(self):
+        pass
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Потрібен PostgreSQL з pgvector')
+class AnswerCacheInvalidationTests(PgvectorTestMixin, TestCase):
+    """Кеш відповідей інвалідується по тих рівнях, по яких реально йшов пошук."""
+
+    def setUp(self):
+        super().setUp()
+        self.cache = SemanticAnswerCache({'enabled': True, 'redis_url': 'redis://fake'})
+        self.redis = FakeRedis()
+        for patcher in (
+            mock.patch.object(self.cache, '_get_redis', return_value=self.redis),
+            mock.patch('MASTER.rag.answer_cache._cache', self.cache),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.embedding_model = EmbeddingModel.objects.create(
+            name='Cache test', provider='openai', model_name='text-embedding-3-small', dimensions=8,
+        )
+        self.branch = Branch.objects.create(name='Cache branch', slug='cache-branch')
+        self.specialization = Specialization.objects.create(
+            branch=self.branch, name='Cache spec', slug='cache-spec',
+        )
+        # branch FK клієнта порожній — шукаємо по specialization.branch
+        self.client_obj = Client.objects.create(
+            user='cache-test', tag='cache-test', description='',
+            specialization=self.specialization, embedding_model=self.embedding_model,
+        )
+        self.query_vector = [0.5] * 8
+
+    def _lookup(self):
+        return self.cache.lookup(
+            self.client_obj, self.embedding_model, self.query_vector, self.specialization, self.branch,
+        )
+
+    def test_branch_document_save_invalidates_answer(self):
+        self.assertIsNone(self.client_obj.branch_id)
+        self.cache.store(
+            self.client_obj, self.embedding_model, self.query_vector,
+            {'answer': 'cached', 'sources': [], 'num_chunks': 1, 'total_tokens': 1},
+            self.specialization, self.branch,
+        )
+        self.assertEqual(self._lookup()['answer'], 'cached')
+
+        # bulk_create — без обробки файлу; save() нижче шле звичайний post_save
+        document, = BranchDocument.objects.bulk_create([
+            BranchDocument(branch=self.branch, title='doc', file='branches/doc.txt', file_type='txt', file_size=0)
+        ])
+        document.title = 'doc v2'
+        document.save()
+
+        self.assertIsNone(self._lookup())
@@ -7,20 +7,32 @@ with configurable weights and ANN index parameters.
 
 from __future__ import annotations
 
+import json
 import logging
-from typing import TYPE_CHECKING, Any, Literal, cast
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Literal, cast
 
 from django.conf import settings
-from django.db import connection
+from django.core.cache import cache
+from django.db import DatabaseError, close_old_connections, connection, transaction
 from django.db.models import QuerySet, F, Value, FloatField
-from django.db.models.functions import Cast
-from pgvector.django import CosineDistance  # type: ignore[attr-defined]
+from django.db.models.expressions import RawSQL
+from pgvector.django import VectorField  # type: ignore[attr-defined]
 
-from MASTER.branches.models import BranchEmbedding
-from MASTER.specializations.models import SpecializationEmbedding
-from MASTER.clients.models import ClientEmbedding
-from MASTER.restaurant.models import MenuItemEmbedding
+from MASTER.branches.models import BranchEmbedding, BranchDocument
+from MASTER.specializations.models import SpecializationEmbedding, SpecializationDocument
+from MASTER.clients.models import ClientEmbedding, ClientDocument
+from MASTER.restaurant.models import MenuItemEmbedding, MenuItem, MenuCategory
 from MASTER.EmbeddingModel.models import EmbeddingModel
+from MASTER.processing.vectors import (
+    BIT_INDEX_MAX_DIMENSIONS,
+    HALFVEC_INDEX_MAX_DIMENSIONS,
+    distance_sql,
+    fit_vector,
+    hamming_distance_sql,
+)
 
 if TYPE_CHECKING:
     from MASTER.branches.models import Branch
@@ -29,8 +41,119 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+_level_executor: ThreadPoolExecutor | None = None
+_level_executor_lock = threading.Lock()
+
+
+def _init_level_thread() -> None:
+    """Give the pool thread's connection its own persistent CONN_MAX_AGE with health checks.
+
+    The thread-local DatabaseWrapper gets a copy of the settings, so the process-wide
+    CONN_MAX_AGE (0 by default; persistent connections do not suit ASGI) stays as is
+    for every other thread.
+    """
+    max_age = settings.VECTOR_SEARCH_CONFIG.get('parallel_conn_max_age', 300)
+    connection.settings_dict = {
+        **connection.settings_dict,
+        'CONN_MAX_AGE': max_age,
+        'CONN_HEALTH_CHECKS': True,
+    }
+
+
+def _get_level_executor() -> ThreadPoolExecutor:
+    """Process-wide pool for concurrent level searches (created lazily, i.e. after fork)."""
+    global _level_executor
+    if _level_executor is None:
+        with _level_executor_lock:
+            if _level_executor is None:
+                _level_executor = ThreadPoolExecutor(
+                    max_workers=int(settings.VECTOR_SEARCH_CONFIG.get('parallel_max_workers', 8)),
+                    thread_name_prefix='vector-search',
+                    initializer=_init_level_thread,
+                )
+    return _level_executor
+
+
 SearchLevel = Literal['branch', 'specialization', 'client', 'menu']
 
+# How a level was searched (chosen per tenant by _level_strategy):
+# - exact: the tenant's rows are filtered by B-tree and sorted by exact distance
+# - iterative: HNSW with iterative index scans (keeps scanning until k rows pass the filters)
+# - ann: plain HNSW (ef_search candidates, then filters — may return fewer than k rows)
+# - quantized: candidates from the binary-quantised HNSW index, re-ranked by exact cosine distance
+SearchStrategy = Literal['exact', 'iterative', 'ann', 'quantized']
+
+# Levels whose tables have binary-quantised indexes (vectors.BINARY_INDEX_PREFIXES)
+_QUANTIZED_LEVELS = ('branch', 'specialization')
+
+# Tenant filter of each level: (embeddings table model, owner lookup)
+_TENANT_FILTERS: dict[str, tuple[Any, str]] = {
+    'branch': (BranchEmbedding, 'branch_id'),
+    'specialization': (SpecializationEmbedding, 'specialization_id'),
+    'client': (ClientEmbedding, 'client_id'),
+    'menu': (MenuItemEmbedding, 'menu_item__client_id'),
+}
+
+# Distance to the query vector; `q` is the CTE holding the query vector, so the
+# vector is sent once per statement and the planner sees it as an InitPlan param
+# (which keeps ORDER BY ... <=> ... eligible for ANN index scans). The casts match
+# the per-model partial index expressions (see MASTER.processing.vectors).
+_QUERY_VECTOR = "(SELECT v FROM q)"
+
+_DOCUMENT_LEVEL_SQL = (
+    "(SELECT '{level}'::text AS level, e.content, e.metadata, "
+    "e.document_id::bigint AS document_id, d.title::text AS document_title, e.chunk_index, "
+    "e.embedding_model_id, (1 - {distance}) * %s::float8 AS similarity, '{strategy}'::text AS strategy "
+    "FROM {table} e LEFT JOIN {document_table} d ON d.id = e.document_id "
+    "WHERE e.{owner_column} = %s{model_filter} AND 1 - {distance} >= %s "
+    "ORDER BY {order_by} LIMIT %s)"
+)
+
+# Two-stage variant: the inner query takes `quantized_candidates` rows by Hamming distance
+# (binary index), the outer one re-ranks them by exact cosine distance.
+_DOCUMENT_LEVEL_QUANTIZED_SQL = (
+    "(SELECT '{level}'::text AS level, c.content, c.metadata, "
+    "c.document_id::bigint AS document_id, d.title::text AS document_title, c.chunk_index, "
+    "c.embedding_model_id, (1 - c.distance) * %s::float8 AS similarity, 'quantized'::text AS strategy "
+    "FROM (SELECT e.content, e.metadata, e.document_id, e.chunk_index, e.embedding_model_id, "
+    "{distance} AS distance "
+    "FROM {table} e WHERE e.{owner_column} = %s{model_filter} "
+    "ORDER BY {hamming} LIMIT %s) c "
+    "LEFT JOIN {document_table} d ON d.id = c.document_id "
+    "WHERE 1 - c.distance >= %s ORDER BY c.distance LIMIT %s)"
+)
+
+_MENU_LEVEL_SQL = (
+    "(SELECT 'menu'::text AS level, e.content, "
+    "jsonb_build_object("
+    "'menu_item_id', mi.id, 'menu_item_name', mi.name, 'category', mc.name, "
+    "'price', COALESCE(NULLIF(mi.discount_price, 0), mi.price)::float8, 'language', e.language"
+    ") AS metadata, "
+    "mi.id::bigint AS document_id, mi.name::text AS document_title, 0 AS chunk_index, "
+    "e.embedding_model_id, (1 - {distance}) * %s::float8 AS similarity, '{strategy}'::text AS strategy "
+    "FROM {table} e JOIN {menu_item_table} mi ON mi.id = e.menu_item_id "
+    "LEFT JOIN {category_table} mc ON mc.id = mi.category_id "
+    "WHERE mi.client_id = %s{model_filter} AND 1 - {distance} >= %s "
+    "ORDER BY {order_by} LIMIT %s)"
+)
+
+
+def stored_token_count(metadata: dict[str, Any]) -> int | None:
+    """
+    cl100k token count of a chunk recorded at ingestion, or None if there is no reliable one.
+
+    The chunker's count (metadata['chunker']['token_count']) is preferred. Rows embedded by
+    the local TF-IDF fallback store a whitespace word count in metadata['token_count'],
+    which undercounts the context budget, so for them nothing is trusted.
+    """
+    if metadata.get('fallback'):
+        return None
+    chunker = metadata.get('chunker')
+    if isinstance(chunker, dict) and isinstance(chunker.get('token_count'), int):
+        return chunker['token_count']
+    token_count = metadata.get('token_count')
+    return token_count if isinstance(token_count, int) else None
+
 
 class SearchResult:
     """Single search result with metadata."""
@@ -44,6 +167,9 @@ class SearchResult:
         document_title: str | None,
         metadata: dict[str, Any],
         chunk_index: int,
+        token_count: int | None = None,
+        strategy: SearchStrategy | None = None,
+        embedding_model_id: int | None = None,
     ):
         self.content = content
         self.similarity = similarity
@@ -52,6 +178,14 @@ class SearchResult:
         self.document_title = document_title
         self.metadata = metadata
         self.chunk_index = chunk_index
+        # Token count stored at ingestion; None means "not known" (the context builder recounts)
+        if token_count is None:
+            token_count = stored_token_count(metadata)
+        self.token_count = token_count
+        # Which search strategy served this result's level
+        self.strategy = strategy
+        # Model of the row the result came from (neighbour chunks are loaded for the same model)
+        self.embedding_model_id = embedding_model_id
     
     def __repr__(self) -> str:
         return f"<SearchResult level={self.level} similarity={self.similarity:.3f}>"
@@ -60,11 +194,18 @@ class SearchResult:
 class VectorSearchService:
     """Vector similarity search with multi-level support and ANN optimization."""
     
-    def __init__(self):
+    def __init__(self, strategy: SearchStrategy | None = None):
         self.config = settings.VECTOR_SEARCH_CONFIG
+        # Force one strategy for every level (recall checks); None — chosen per tenant
+        self.forced_strategy = strategy
         self.similarity_threshold = self.config['similarity_threshold']
         self.max_results_per_level = self.config['max_results_per_level']
         self.weights = self.config['weights']
+        self.combined_query = self.config.get('combined_query', True)
+        # Strategy per level of the last search() call (diagnostics / logging)
+        self.last_strategies: dict[str, SearchStrategy] = {}
+        # Tenant sizes of the current search() call (see _count_tenant_rows)
+        self._tenant_row_counts: dict[str, int] = {}
     
     def search(
         self,
@@ -73,6 +214,7 @@ class VectorSearchService:
         specialization: Specialization | None = None,
         client: Client | None = None,
         embedding_model: EmbeddingModel | None = None,
+        combined: bool | None = None,
     ) -> list[SearchResult]:
         """
         Multi-level vector similarity search.
@@ -86,11 +228,16 @@ class VectorSearchService:
             specialization: Optional Specialization to filter results
             client: Optional Client to filter results
             embedding_model: Embedding model to filter results by (ensures consistency)
+            combined: Run all levels as a single UNION ALL statement
+                (defaults to VECTOR_SEARCH_CONFIG['combined_query'])
 
         Returns:
             List of SearchResult objects sorted by weighted similarity
+            (SearchResult.strategy / self.last_strategies tell how each level was searched)
         """
         self._set_pgvector_parameters()
+        self.last_strategies = {}
+        self._tenant_row_counts = {}
 
         results: list[SearchResult] = []
 
@@ -103,26 +250,121 @@ class VectorSearchService:
         if not filter_model and branch:
             filter_model = branch.get_embedding_model()
 
+        # Розміри тенантів для вибору стратегії — одним запитом на всі рівні, до пошуку
+        self._count_tenant_rows(self._tenant_levels(branch, specialization, client, filter_model))
+
+        use_combined = self.combined_query if combined is None else combined
+        if use_combined and self._can_combine(branch, specialization, client, filter_model):
+            results = self._search_combined(query_vector, branch, specialization, client, filter_model)
+            logger.info(f"Vector search strategies: {self.last_strategies}")
+            return results
+
         # Пошук завжди з фільтрами - дані клієнта ізольовані та приватні
         # Якщо client переданий - шукаємо ТІЛЬКИ в його даних
+        level_searches: list[tuple[str, Callable[..., list[SearchResult]], tuple[Any, ...]]] = []
         if branch:
-            results.extend(self._search_branch_level(query_vector, branch, filter_model))
+            level_searches.append(('branch', self._search_branch_level, (query_vector, branch, filter_model)))
 
         if specialization:
-            results.extend(self._search_specialization_level(query_vector, specialization, filter_model))
+            level_searches.append((
+                'specialization', self._search_specialization_level, (query_vector, specialization, filter_model),
+            ))
 
         if client:
             # Пошук ТІЛЬКИ в даних цього клієнта (ізольований, приватний)
-            results.extend(self._search_client_level(query_vector, client))
+            level_searches.append(('client', self._search_client_level, (query_vector, client)))
             # Також шукаємо в меню ресторану для клієнтів ресторанного типу
             if client.client_type == 'restaurant':
-                results.extend(self._search_menu_level(query_vector, client))
+                level_searches.append(('menu', self._search_menu_level, (query_vector, client)))
+
+        results.extend(self._run_level_searches(level_searches))
 
         # Sort by weighted similarity and limit results
         results.sort(key=lambda r: r.similarity, reverse=True)
+        logger.info(f"Vector search strategies: {self.last_strategies}")
 
         return results
     
+    @staticmethod
+    def _can_combine(
+        branch: Branch | None,
+        specialization: Specialization | None,
+        client: Client | None,
+        filter_model: EmbeddingModel | None,
+    ) -> bool:
+        """
+        One UNION ALL statement only when every level filters on the same embedding model.
+
+        The client and menu levels always use the client's own model; when branch or
+        specialization levels are searched with a different model, the levels are run as
+        separate (concurrent) queries instead.
+        """
+        if client is None or not (branch or specialization):
+            return True
+        return getattr(client, 'embedding_model_id', None) == getattr(filter_model, 'pk', None)
+
+    def _run_level_searches(
+        self,
+        level_searches: list[tuple[str, Callable[..., list[SearchResult]], tuple[Any, ...]]],
+    ) -> list[SearchResult]:
+        """
+        Run per-level searches concurrently, each in a pool thread with its own DB connection.
+
+        Retrieval latency becomes the slowest level instead of the sum. Levels that do not
+        finish within VECTOR_SEARCH_CONFIG['level_timeout_seconds'] (or fail) are dropped
+        with a warning; their statements are bounded by the same statement_timeout.
+        Inside an atomic block (uncommitted rows are invisible to other connections) or with
+        'parallel_levels' disabled the levels run one after another.
+        """
+        if (
+            len(level_searches) <= 1
+            or not self.config.get('parallel_levels', True)
+            or connection.in_atomic_block
+        ):
+            results: list[SearchResult] = []
+            for _level, search_level, args in level_searches:
+                results.extend(search_level(*args))
+            return results
+
+        timeout = self.config.get('level_timeout_seconds') or None
+        futures = {
+            _get_level_executor().submit(self._search_level_in_thread, search_level, args, timeout): level
+            for level, search_level, args in level_searches
+        }
+        done, not_done = wait(futures, timeout=timeout)
+
+        for future in not_done:
+            future.cancel()
+            logger.warning(f"Level search '{futures[future]}' exceeded {timeout}s, dropped from results")
+
+        results = []
+        for future in done:
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                logger.error(f"Level search '{futures[future]}' failed, dropped from results: {e}")
+        return results
+
+    def _search_level_in_thread(
+        self,
+        search_level: Callable[..., list[SearchResult]],
+        args: tuple[Any, ...],
+        timeout: float | None,
+    ) -> list[SearchResult]:
+        """
+        Pool-thread wrapper: own connection, pgvector params and statement_timeout.
+
+        The thread's connection is reused across searches; close_old_connections() only
+        drops it when it is broken or older than 'parallel_conn_max_age'.
+        """
+        close_old_connections()
+        with transaction.atomic():
+            self._set_pgvector_parameters()
+            if timeout:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SET LOCAL statement_timeout = {int(timeout * 1000)}")
+            return search_level(*args)
+
     def _search_branch_level(
         self,
         query_vector: list[float],
@@ -130,8 +372,6 @@ class VectorSearchService:
         embedding_model: EmbeddingModel | None = None,
     ) -> list[SearchResult]:
         """Search Branch embeddings using specified embedding model."""
-        weight = self.weights['branch']
-
         queryset = BranchEmbedding.objects.filter(
             branch=branch
         )
@@ -140,30 +380,7 @@ class VectorSearchService:
         if embedding_model:
             queryset = queryset.filter(embedding_model=embedding_model)
 
-        queryset = queryset.annotate(
-            similarity=1 - Cast(
-                CosineDistance(F('vector'), query_vector),
-                output_field=FloatField()
-            )
-        ).filter(
-            similarity__gte=self.similarity_threshold
-        ).order_by('-similarity')[:self.max_results_per_level]
-        
-        if self.config['explain_queries']:
-            self._explain_query(queryset)
-        
-        results = []
-        for emb in queryset:
-            weighted_similarity = self._get_similarity(emb) * weight
-            results.append(SearchResult(
-                content=emb.content,
-                similarity=weighted_similarity,
-                level='branch',
-                document_id=cast(int | None, getattr(emb, 'document_id', None)) if emb.document else None,
-                document_title=emb.document.title if emb.document else None,
-                metadata=emb.metadata or {},
-                chunk_index=emb.metadata.get('chunk_index', 0) if emb.metadata else 0,
-            ))
+        results = self._search_document_level(queryset, 'branch', query_vector, embedding_model, branch.pk)
         
         logger.info(f"Branch search: found {len(results)} results for branch '{branch.name}'")
         return results
@@ -175,8 +392,6 @@ class VectorSearchService:
         embedding_model: EmbeddingModel | None = None,
     ) -> list[SearchResult]:
         """Search Specialization embeddings using specified embedding model."""
-        weight = self.weights['specialization']
-
         queryset = SpecializationEmbedding.objects.filter(
             specialization=specialization
         )
@@ -185,30 +400,7 @@ class VectorSearchService:
         if embedding_model:
             queryset = queryset.filter(embedding_model=embedding_model)
 
-        queryset = queryset.annotate(
-            similarity=1 - Cast(
-                CosineDistance(F('vector'), query_vector),
-                output_field=FloatField()
-            )
-        ).filter(
-            similarity__gte=self.similarity_threshold
-        ).order_by('-similarity')[:self.max_results_per_level]
-        
-        if self.config['explain_queries']:
-            self._explain_query(queryset)
-        
-        results = []
-        for emb in queryset:
-            weighted_similarity = self._get_similarity(emb) * weight
-            results.append(SearchResult(
-                content=emb.content,
-                similarity=weighted_similarity,
-                level='specialization',
-                document_id=cast(int | None, getattr(emb, 'document_id', None)) if emb.document else None,
-                document_title=emb.document.title if emb.document else None,
-                metadata=emb.metadata or {},
-                chunk_index=emb.metadata.get('chunk_index', 0) if emb.metadata else 0,
-            ))
+        results = self._search_document_level(queryset, 'specialization', query_vector, embedding_model, specialization.pk)
         
         logger.info(f"Specialization search: found {len(results)} results for '{specialization.name}'")
         return results
@@ -219,8 +411,6 @@ class VectorSearchService:
         client: Client,
     ) -> list[SearchResult]:
         """Search Client embeddings using only the client's current embedding model."""
-        weight = self.weights['client']
-        
         # Фільтруємо embeddings тільки по поточній моделі клієнта
         # щоб не змішувати embeddings різних моделей
         embedding_model = getattr(client, 'embedding_model', None)
@@ -233,30 +423,7 @@ class VectorSearchService:
         if embedding_model:
             queryset = queryset.filter(embedding_model=embedding_model)
         
-        queryset = queryset.annotate(
-            similarity=1 - Cast(
-                CosineDistance(F('vector'), query_vector),
-                output_field=FloatField()
-            )
-        ).filter(
-            similarity__gte=self.similarity_threshold
-        ).order_by('-similarity')[:self.max_results_per_level]
-        
-        if self.config['explain_queries']:
-            self._explain_query(queryset)
-        
-        results = []
-        for emb in queryset:
-            weighted_similarity = self._get_similarity(emb) * weight
-            results.append(SearchResult(
-                content=emb.content,
-                similarity=weighted_similarity,
-                level='client',
-                document_id=cast(int | None, getattr(emb, 'document_id', None)) if emb.document else None,
-                document_title=emb.document.title if emb.document else None,
-                metadata=emb.metadata or {},
-                chunk_index=emb.metadata.get('chunk_index', 0) if emb.metadata else 0,
-            ))
+        results = self._search_document_level(queryset, 'client', query_vector, embedding_model, client.pk)
         
         logger.info(f"Client search: found {len(results)} results for client '{client.user.username}'")
         return results
@@ -280,64 +447,607 @@ class VectorSearchService:
         if embedding_model:
             queryset = queryset.filter(embedding_model=embedding_model)
         
-        queryset = queryset.annotate(
-            similarity=1 - Cast(
-                CosineDistance(F('vector'), query_vector),
-                output_field=FloatField()
-            )
-        ).filter(
-            similarity__gte=self.similarity_threshold
-        ).order_by('-similarity')[:self.max_results_per_level]
+        strategy = self._level_strategy(
+            'menu', client.pk, queryset, embedding_model, self._search_dimensions(query_vector, embedding_model),
+        )
+        # Проєкція тільки потрібних колонок: один запит без N+1 по menu_item/category
+        rows = self._similarity_queryset(queryset, query_vector, embedding_model, strategy).values(
+            'content',
+            'language',
+            'similarity',
+            'menu_item_id',
+            'embedding_model_id',
+            menu_item_name=F('menu_item__name'),
+            category_name=F('menu_item__category__name'),
+            price=F('menu_item__price'),
+            discount_price=F('menu_item__discount_price'),
+        )[:self.max_results_per_level]
         
         if self.config['explain_queries']:
-            self._explain_query(queryset)
+            self._explain_query(rows)
         
         results = []
-        for emb in queryset:
-            weighted_similarity = self._get_similarity(emb) * weight
+        for row in rows:
+            # Те саме правило, що й MenuItem.get_display_price()
+            display_price = row['discount_price'] if row['discount_price'] else row['price']
             results.append(SearchResult(
-                content=emb.content,
-                similarity=weighted_similarity,
+                content=row['content'],
+                similarity=float(row['similarity'] or 0.0) * weight,
                 level='menu',
-                document_id=emb.menu_item.id,
-                document_title=emb.menu_item.name,
+                document_id=row['menu_item_id'],
+                document_title=row['menu_item_name'],
                 metadata={
-                    'menu_item_id': emb.menu_item.id,
-                    'menu_item_name': emb.menu_item.name,
-                    'category': emb.menu_item.category.name if emb.menu_item.category else None,
-                    'price': float(emb.menu_item.get_display_price()),
-                    'language': emb.language,
+                    'menu_item_id': row['menu_item_id'],
+                    'menu_item_name': row['menu_item_name'],
+                    'category': row['category_name'],
+                    'price': float(display_price),
+                    'language': row['language'],
                 },
                 chunk_index=0,  # Menu items are single chunks
+                strategy=strategy,
+                embedding_model_id=row['embedding_model_id'],
             ))
         
         logger.info(f"Menu search: found {len(results)} results for client '{client.user.username}'")
         return results
-    
-    def _set_pgvector_parameters(self) -> None:
-        """Set pgvector ANN index parameters for better search quality."""
+
+    def _search_document_level(
+        self,
+        queryset: QuerySet,
+        level: SearchLevel,
+        query_vector: list[float],
+        embedding_model: EmbeddingModel | None = None,
+        owner_id: Any = None,
+    ) -> list[SearchResult]:
+        """
+        Run a document-backed level search with a column projection.
+
+        Only content, metadata, similarity and the document id/title are fetched (the title
+        via a JOIN in the same query), so materialising k results costs one query.
+        """
+        weight = self.weights[level]
+        strategy = self._level_strategy(
+            level, owner_id, queryset, embedding_model, self._search_dimensions(query_vector, embedding_model),
+        )
+
+        rows = self._similarity_queryset(queryset, query_vector, embedding_model, strategy).values(
+            'content',
+            'metadata',
+            'document_id',
+            'chunk_index',
+            'embedding_model_id',
+            'similarity',
+            document_title=F('document__title'),
+        )[:self.max_results_per_level]
+
+        with self._local_settings(self._quantized_settings(strategy == 'quantized')):
+            if self.config['explain_queries']:
+                self._explain_query(rows)
+            rows = list(rows)
+
+        return [
+            self._row_to_result({
+                **row,
+                'level': level,
+                'similarity': float(row['similarity'] or 0.0) * weight,
+                'strategy': strategy,
+            })
+            for row in rows
+        ]
+
+    def _similarity_queryset(
+        self,
+        queryset: QuerySet,
+        query_vector: list[float],
+        embedding_model: EmbeddingModel | None = None,
+        strategy: SearchStrategy = 'ann',
+    ) -> QuerySet:
+        """
+        Annotate cosine distance/similarity, apply the threshold and order by best match.
+
+        Ordering by the distance expression itself (ascending) is what lets the planner
+        use the model's partial HNSW index; the 'exact' strategy orders by a non-indexable
+        form of it instead (see _order_sql).
+        """
+        dimensions = self._search_dimensions(query_vector, embedding_model)
+        column = f"{connection.ops.quote_name(queryset.model._meta.db_table)}.{connection.ops.quote_name('vector')}"
+        distance = RawSQL(
+            distance_sql(column, '%s::vector', dimensions),
+            [self._vector_literal(fit_vector(query_vector, dimensions, truncate=True))],
+            output_field=FloatField(),
+        )
+        if embedding_model is None:
+            # Без фільтра по моделі — лише рядки тієї ж розмірності, що й запит
+            queryset = queryset.extra(where=[f'vector_dims({column}) = %s'], params=[dimensions])
+        if strategy == 'quantized':
+            # Перший етап: кандидати за відстанню Хеммінга з бінарного індексу. Підзапит
+            # компілюється окремо (як RawSQL): вкладений queryset Django переіменовує в U0,
+            # і вираз по неаліасованій колонці посилався б на рядок зовнішнього запиту
+            candidates = queryset.annotate(
+                hamming=RawSQL(
+                    hamming_distance_sql(column, '%s::vector', dimensions),
+                    [self._vector_literal(fit_vector(query_vector, dimensions, truncate=True))],
+                    output_field=FloatField(),
+                ),
+            ).order_by('hamming').values('pk')[:self._quantized_candidates()]
+            candidates_sql, candidates_params = candidates.query.sql_with_params()
+            queryset = queryset.filter(pk__in=RawSQL(candidates_sql, candidates_params))
+        return queryset.annotate(
+            distance=distance,
+        ).annotate(
+            similarity=Value(1.0, output_field=FloatField()) - F('distance'),
+        ).filter(
+            distance__lte=1 - self.similarity_threshold
+        ).order_by(F('distance') + Value(0.0) if strategy in ('exact', 'quantized') else 'distance')
+
+    def _level_strategy(
+        self,
+        level: SearchLevel,
+        owner_id: Any,
+        queryset: QuerySet,
+        embedding_model: EmbeddingModel | None,
+        dimensions: int,
+    ) -> SearchStrategy:
+        """
+        Pick how to search one tenant's rows so the tenant filter cannot starve the top k.
+
+        A plain HNSW scan returns ef_search candidates from the whole model index and only
+        then applies the tenant filter, so a small tenant in a big table gets few or no rows.
+        Small tenants (<= 'exact_scan_max_rows') are searched exactly — cheap at that size;
+        larger ones use iterative index scans when enabled. Without a model filter or above
+        the index dimension limit there is no matching ANN index, so the search is exact.
+        With 'quantized_search' the large branch/specialization tenants use the two-stage
+        binary-quantised search instead.
+        """
+        if self.forced_strategy:
+            strategy: SearchStrategy = self.forced_strategy
+            if strategy == 'quantized' and not self._can_quantize(level, embedding_model, dimensions):
+                strategy = 'exact'
+        elif embedding_model is None:
+            strategy = 'exact'
+        elif self._tenant_rows(level, owner_id, queryset, embedding_model) <= int(
+            self.config.get('exact_scan_max_rows', 0)
+        ):
+            strategy = 'exact'
+        elif self.config.get('quantized_search') and self._can_quantize(level, embedding_model, dimensions):
+            strategy = 'quantized'
+        elif dimensions > HALFVEC_INDEX_MAX_DIMENSIONS:
+            strategy = 'exact'
+        else:
+            strategy = 'iterative' if self._iterative_scan_mode() else 'ann'
+        self.last_strategies[level] = strategy
+        return strategy
+
+    def _can_quantize(self, level: SearchLevel, embedding_model: EmbeddingModel | None, dimensions: int) -> bool:
+        """The level has a binary index for the model (see vectors.ensure_binary_indexes)."""
+        levels = self.config.get('quantized_levels', _QUANTIZED_LEVELS)
+        return (
+            embedding_model is not None
+            and level in _QUANTIZED_LEVELS
+            and level in levels
+            and dimensions <= BIT_INDEX_MAX_DIMENSIONS
+        )
+
+    def _quantized_candidates(self) -> int:
+        """First-stage candidate count (never below the final per-level limit)."""
+        return max(int(self.config.get('quantized_candidates', 200)), self.max_results_per_level)
+
+    def _quantized_settings(self, active: bool) -> dict[str, int]:
+        """
+        hnsw.ef_search raised to the first-stage candidate count (empty when not quantized).
+
+        Without iterative scans the bit-index scan returns at most ef_search rows, so a
+        quantized level asking for 'quantized_candidates' would silently get fewer.
+        """
+        if not active:
+            return {}
+        return {'hnsw.ef_search': max(int(self.config['hnsw_ef_search']), self._quantized_candidates())}
+
+    @contextmanager
+    def _local_settings(self, local_settings: dict[str, int]) -> Iterator[None]:
+        """
+        Apply SET LOCAL settings to the enclosed statements, in a savepoint.
+
+        SET LOCAL needs a transaction; a cancelled statement rolls back only the savepoint
+        (and the settings with it). Inside an outer transaction the previous values are
+        restored afterwards, since SET LOCAL otherwise lasts until the end of that transaction.
+        Single raw statements outside a transaction use _execute_local instead (no extra
+        round-trips).
+        """
+        if not local_settings:
+            yield
+            return
+        outer = connection.in_atomic_block
+        with transaction.atomic():
+            previous: list[Any] = []
+            with connection.cursor() as cursor:
+                if outer:
+                    cursor.execute(
+                        f"SELECT {', '.join(['current_setting(%s)'] * len(local_settings))}",
+                        list(local_settings),
+                    )
+                    previous = list(cursor.fetchone())
+                cursor.execute(self._set_local_sql(local_settings))
+            yield
+            if outer:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"SELECT {', '.join(['set_config(%s, %s, true)'] * len(local_settings))}",
+                        [value for pair in zip(local_settings, previous) for value in pair],
+                    )
+
+    def _execute_local(self, cursor: Any, sql: str, params: list[Any], local_settings: dict[str, int]) -> None:
+        """
+        Execute one statement with SET LOCAL settings in a single round-trip.
+
+        Outside a transaction the SETs and the statement go as one multi-statement query,
+        which PostgreSQL runs as one implicit transaction: the settings apply to the
+        statement only and no BEGIN/COMMIT round-trips are needed. Inside an outer
+        transaction this falls back to _local_settings. The cursor is left on the
+        statement's result set.
+        """
+        if not local_settings or connection.in_atomic_block:
+            with self._local_settings(local_settings):
+                cursor.execute(sql, params)
+            return
+        cursor.execute(f"{self._set_local_sql(local_settings)}; {sql}", params)
+        # psycopg 3 ставить курсор на перший результат (SET) — переходимо до результату запиту
+        while cursor.description is None and cursor.nextset():
+            pass
+
+    @staticmethod
+    def _set_local_sql(local_settings: dict[str, int]) -> str:
+        return "; ".join(f"SET LOCAL {name} = {int(value)}" for name, value in local_settings.items())
+
+    def _tenant_rows(self, level: SearchLevel, owner_id: Any, queryset: QuerySet, embedding_model: EmbeddingModel) -> int:
+        """Rows of one tenant for one model, as counted by _count_tenant_rows for this search."""
+        if level not in self._tenant_row_counts:
+            self._count_tenant_rows([(level, owner_id, queryset, embedding_model)])
+        return self._tenant_row_counts[level]
+
+    @staticmethod
+    def _tenant_queryset(level: SearchLevel, owner_id: Any, embedding_model: EmbeddingModel | None) -> QuerySet:
+        """Rows of one tenant (and model) on one level — what the level search filters on."""
+        embedding_cls, owner_lookup = _TENANT_FILTERS[level]
+        queryset = embedding_cls.objects.filter(**{owner_lookup: owner_id})
+        if embedding_model:
+            queryset = queryset.filter(embedding_model=embedding_model)
+        return queryset
+
+    def _tenant_levels(
+        self,
+        branch: Branch | None,
+        specialization: Specialization | None,
+        client: Client | None,
+        filter_model: EmbeddingModel | None,
+    ) -> list[tuple[SearchLevel, Any, QuerySet, EmbeddingModel | None]]:
+        """(level, owner id, tenant rows, model) for every level search() will run."""
+        levels: list[tuple[SearchLevel, Any, EmbeddingModel | None]] = []
+        if branch:
+            levels.append(('branch', branch.pk, filter_model))
+        if specialization:
+            levels.append(('specialization', specialization.pk, filter_model))
+        if client:
+            client_model = getattr(client, 'embedding_model', None)
+            levels.append(('client', client.pk, client_model))
+            if client.client_type == 'restaurant':
+                levels.append(('menu', client.pk, client_model))
+        return [
+            (level, owner_id, self._tenant_queryset(level, owner_id, model), model)
+            for level, owner_id, model in levels
+        ]
+
+    def _count_tenant_rows(
+        self, levels: list[tuple[SearchLevel, Any, QuerySet, EmbeddingModel | None]],
+    ) -> None:
+        """
+        Count the tenant rows of every level whose size is not cached, in one statement.
+
+        Only levels whose strategy depends on the size are counted, and each count stops at
+        'exact_scan_max_rows' + 1 (enough to tell small from large), so a big tenant costs
+        at most that many index entries. The statement runs under the per-level
+        'level_timeout_seconds'; a count that does not finish in time means a large tenant.
+        Results are cached for 'tenant_size_cache_seconds'.
+        """
+        limit = int(self.config.get('exact_scan_max_rows', 0)) + 1
+        cache_seconds = int(self.config.get('tenant_size_cache_seconds', 0))
+        pending: list[tuple[SearchLevel, str | None, QuerySet]] = []
+        for level, owner_id, queryset, embedding_model in levels:
+            if self.forced_strategy or embedding_model is None or level in self._tenant_row_counts:
+                continue
+            key = None
+            if cache_seconds and owner_id is not None:
+                key = f"vector_search:tenant_rows:{level}:{owner_id}:{embedding_model.pk}"
+                rows = cache.get(key)
+                if rows is not None:
+                    self._tenant_row_counts[level] = rows
+                    continue
+            pending.append((level, key, queryset))
+        if not pending:
+            return
+
+        selects: list[str] = []
+        params: list[Any] = []
+        for _level, _key, queryset in pending:
+            sql, query_params = queryset.order_by().values('pk')[:limit].query.sql_with_params()
+            selects.append(f"(SELECT COUNT(*) FROM ({sql}) AS tenant_rows)")
+            params.extend(query_params)
+
+        timeout = self.config.get('level_timeout_seconds') or None
+        try:
+            with connection.cursor() as cursor:
+                self._execute_local(
+                    cursor, f"SELECT {', '.join(selects)}", params,
+                    {'statement_timeout': int(timeout * 1000)} if timeout else {},
+                )
+                counts = list(cursor.fetchone())
+        except DatabaseError as e:
+            logger.warning(f"Tenant size count failed, treating {[p[0] for p in pending]} as large: {e}")
+            counts = [limit] * len(pending)
+
+        for (level, key, _queryset), rows in zip(pending, counts):
+            self._tenant_row_counts[level] = int(rows)
+            if key:
+                cache.set(key, int(rows), cache_seconds)
+
+    def _iterative_scan_mode(self) -> str:
+        """hnsw.iterative_scan value from the config, or '' when iterative scans are off."""
+        mode = (self.config.get('iterative_scan') or '').strip().lower()
+        return mode if mode in ('relaxed_order', 'strict_order') else ''
+
+    @staticmethod
+    def _order_sql(distance: str, strategy: SearchStrategy) -> str:
+        """ORDER BY for a level: `distance + 0` is not an index ordering, so 'exact' never uses HNSW."""
+        return f"{distance} + 0" if strategy == 'exact' else distance
+
+    @staticmethod
+    def _search_dimensions(query_vector: list[float], embedding_model: EmbeddingModel | None) -> int:
+        """Vector size a level is searched at: the model's native dimensions or the query's own."""
+        return int(getattr(embedding_model, 'dimensions', None) or len(query_vector))
+
+    def _search_combined(
+        self,
+        query_vector: list[float],
+        branch: Branch | None,
+        specialization: Specialization | None,
+        client: Client | None,
+        embedding_model: EmbeddingModel | None,
+    ) -> list[SearchResult]:
+        """
+        Search all requested levels with one SQL statement.
+
+        Every level becomes a top-k subquery (same filters, threshold and limit as the
+        per-level methods) and the weights are applied in SQL, so the whole multi-level
+        search costs a single database round-trip.
+        """
+        subqueries: list[str] = []
+        # Рівні об'єднуються лише з однією моделею (_can_combine), тож розмірність спільна
+        search_model = getattr(client, 'embedding_model', None) if client else embedding_model
+        dimensions = self._search_dimensions(query_vector, search_model)
+        params: list[Any] = [self._vector_literal(fit_vector(query_vector, dimensions, truncate=True))]
+
+        if branch:
+            subqueries.append(self._document_level_sql(
+                'branch', BranchEmbedding, BranchDocument, 'branch_id', branch.pk, embedding_model,
+                dimensions, params,
+            ))
+
+        if specialization:
+            subqueries.append(self._document_level_sql(
+                'specialization', SpecializationEmbedding, SpecializationDocument,
+                'specialization_id', specialization.pk, embedding_model, dimensions, params,
+            ))
+
+        if client:
+            # Клієнтський рівень і меню фільтруються тільки по поточній моделі клієнта
+            client_model = getattr(client, 'embedding_model', None)
+            subqueries.append(self._document_level_sql(
+                'client', ClientEmbedding, ClientDocument, 'client_id', client.pk, client_model,
+                dimensions, params,
+            ))
+            if client.client_type == 'restaurant':
+                subqueries.append(self._menu_level_sql(client.pk, client_model, dimensions, params))
+
+        if not subqueries:
+            return []
+
+        sql = (
+            "WITH q AS (SELECT %s::vector AS v) "
+            "SELECT level, content, metadata, document_id, document_title, chunk_index, embedding_model_id, "
+            "similarity, strategy "
+            f"FROM ({' UNION ALL '.join(subqueries)}) AS hits "
+            "ORDER BY similarity DESC"
+        )
+
         with connection.cursor() as cursor:
+            if self.config['explain_queries']:
+                self._explain_sql(sql, params)
+            # ef_search для quantized-рівнів іде в тому ж запиті (SET LOCAL), без окремої транзакції
+            self._execute_local(
+                cursor, sql, params, self._quantized_settings('quantized' in self.last_strategies.values()),
+            )
+            columns = [col[0] for col in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        results = [self._row_to_result(row) for row in rows]
+
+        logger.info(f"Combined search: found {len(results)} results across {len(subqueries)} level(s)")
+        return results
+
+    def _document_level_sql(
+        self,
+        level: SearchLevel,
+        embedding_cls: type,
+        document_cls: type,
+        owner_column: str,
+        owner_id: Any,
+        embedding_model: EmbeddingModel | None,
+        dimensions: int,
+        params: list[Any],
+    ) -> str:
+        """Build the top-k subquery for a document-backed level and extend params in place."""
+        tenant_rows = self._tenant_queryset(level, owner_id, embedding_model)
+        strategy = self._level_strategy(level, owner_id, tenant_rows, embedding_model, dimensions)
+        distance = distance_sql('e.vector', _QUERY_VECTOR, dimensions)
+
+        level_params: list[Any] = [float(self.weights[level]), owner_id]
+        model_filter = self._model_filter_sql(embedding_model, dimensions, level_params)
+        if strategy == 'quantized':
+            level_params.append(self._quantized_candidates())
+        level_params.extend([self.similarity_threshold, self.max_results_per_level])
+        params.extend(level_params)
+
+        if strategy == 'quantized':
+            return _DOCUMENT_LEVEL_QUANTIZED_SQL.format(
+                level=level,
+                distance=distance,
+                hamming=hamming_distance_sql('e.vector', _QUERY_VECTOR, dimensions),
+                table=embedding_cls._meta.db_table,
+                document_table=document_cls._meta.db_table,
+                owner_column=owner_column,
+                model_filter=model_filter,
+            )
+
+        return _DOCUMENT_LEVEL_SQL.format(
+            level=level,
+            distance=distance,
+            order_by=self._order_sql(distance, strategy),
+            strategy=strategy,
+            table=embedding_cls._meta.db_table,
+            document_table=document_cls._meta.db_table,
+            owner_column=owner_column,
+            model_filter=model_filter,
+        )
+
+    def _menu_level_sql(
+        self,
+        client_id: Any,
+        embedding_model: EmbeddingModel | None,
+        dimensions: int,
+        params: list[Any],
+    ) -> str:
+        """Build the top-k subquery for restaurant menu items and extend params in place."""
+        level_params: list[Any] = [float(self.weights.get('menu', 0.8)), client_id]
+        model_filter = self._model_filter_sql(embedding_model, dimensions, level_params)
+        level_params.extend([self.similarity_threshold, self.max_results_per_level])
+        params.extend(level_params)
+
+        tenant_rows = self._tenant_queryset('menu', client_id, embedding_model)
+        strategy = self._level_strategy('menu', client_id, tenant_rows, embedding_model, dimensions)
+        distance = distance_sql('e.vector', _QUERY_VECTOR, dimensions)
+
+        return _MENU_LEVEL_SQL.format(
+            distance=distance,
+            order_by=self._order_sql(distance, strategy),
+            strategy=strategy,
+            table=MenuItemEmbedding._meta.db_table,
+            menu_item_table=MenuItem._meta.db_table,
+            category_table=MenuCategory._meta.db_table,
+            model_filter=model_filter,
+        )
+
+    @staticmethod
+    def _model_filter_sql(embedding_model: EmbeddingModel | None, dimensions: int, params: list[Any]) -> str:
+        """Restrict a level to one embedding model (its partial index) or, without one, to rows of the query's size."""
+        if embedding_model:
+            params.append(embedding_model.pk)
+            return " AND e.embedding_model_id = %s"
+        params.append(dimensions)
+        return " AND vector_dims(e.vector) = %s"
+
+    def _row_to_result(self, row: dict[str, Any]) -> SearchResult:
+        """Materialise a search row (combined query or per-level projection) into a SearchResult."""
+        level = cast(SearchLevel, row['level'])
+        metadata = self._load_json(row['metadata'])
+
+        if level == 'menu':
+            metadata['price'] = float(metadata.get('price') or 0)
+            chunk_index = 0  # Menu items are single chunks
+        elif row.get('chunk_index') is not None:
+            chunk_index = int(row['chunk_index'])
+        else:
+            chunk_index = metadata.get('chunk_index', 0)
+
+        return SearchResult(
+            content=row['content'],
+            similarity=float(row['similarity'] or 0.0),
+            level=level,
+            document_id=row['document_id'],
+            document_title=row['document_title'],
+            metadata=metadata,
+            chunk_index=chunk_index,
+            strategy=row.get('strategy'),
+            embedding_model_id=row.get('embedding_model_id'),
+        )
+
+    @staticmethod
+    def _load_json(value: Any) -> dict[str, Any]:
+        """Raw cursors may return jsonb as text (psycopg 3 under Django) or already decoded."""
+        if not value:
+            return {}
+        if isinstance(value, (str, bytes)):
+            value = json.loads(value)
+        return value if isinstance(value, dict) else {}
+
+    @staticmethod
+    def _vector_literal(query_vector: list[float]) -> Any:
+        """Serialise the query vector exactly like the ORM does for VectorField params."""
+        return VectorField().get_prep_value(query_vector)
+
+    def _set_pgvector_parameters(self) -> None:
+        """
+        Set pgvector ANN index parameters for better search quality.
+
+        The values are session-level, so they are sent once per database connection
+        (in a single round-trip) instead of before every search. Inside an atomic block
+        a rollback would revert them, so there they are re-applied on every call.
+        """
+        connection.ensure_connection()
+        raw_connection = connection.connection
+        if (
+            not connection.in_atomic_block
+            and getattr(connection, '_pgvector_params_session', None) is raw_connection
+        ):
+            return
+
+        ivfflat_probes = int(self.config['ivfflat_probes'])
+        hnsw_ef_search = int(self.config['hnsw_ef_search'])
+        statements = [
             # IVFFlat parameters
-            ivfflat_probes = self.config['ivfflat_probes']
-            cursor.execute(f"SET ivfflat.probes = {ivfflat_probes}")
-            
+            f"SET ivfflat.probes = {ivfflat_probes}",
             # HNSW parameters
-            hnsw_ef_search = self.config['hnsw_ef_search']
-            cursor.execute(f"SET hnsw.ef_search = {hnsw_ef_search}")
-            
-            # Optionally disable seq scan for debugging
-            if self.config['force_index_usage']:
-                cursor.execute("SET enable_seqscan = off")
-                logger.warning("⚠️ Seq scan disabled - for diagnostics only!")
-            
-            logger.debug(f"pgvector parameters set: probes={ivfflat_probes}, ef_search={hnsw_ef_search}")
+            f"SET hnsw.ef_search = {hnsw_ef_search}",
+        ]
+        iterative_scan = self._iterative_scan_mode()
+        if iterative_scan:
+            # Ітеративне сканування (pgvector >= 0.8): HNSW продовжує обхід, доки LIMIT
+            # рядків не пройде фільтри тенанта/порогу (не більше max_scan_tuples)
+            statements.append(f"SET hnsw.iterative_scan = {iterative_scan}")
+            statements.append(f"SET hnsw.max_scan_tuples = {int(self.config.get('max_scan_tuples', 20000))}")
+
+        # Optionally disable seq scan for debugging
+        if self.config['force_index_usage']:
+            statements.append("SET enable_seqscan = off")
+            logger.warning("⚠️ Seq scan disabled - for diagnostics only!")
+
+        with connection.cursor() as cursor:
+            cursor.execute("; ".join(statements))
+
+        if not connection.in_atomic_block:
+            setattr(connection, '_pgvector_params_session', raw_connection)
+
+        logger.debug(f"pgvector parameters set: probes={ivfflat_probes}, ef_search={hnsw_ef_search}")
     
     def _explain_query(self, queryset: QuerySet) -> None:
         """Log EXPLAIN ANALYZE for query diagnostics."""
+        sql, params = queryset.query.sql_with_params()
+        self._explain_sql(sql, list(params))
+
+    def _explain_sql(self, sql: str, params: list[Any]) -> None:
+        """Log EXPLAIN ANALYZE for a raw SQL statement."""
         if not self.config.get('log_query_plans', False):
             return
         
-        sql, params = queryset.query.sql_with_params()
         explain_sql = f"EXPLAIN ANALYZE {sql}"
         
         with connection.cursor() as cursor:
@@ -348,12 +1058,3 @@ class VectorSearchService:
             for row in plan:
                 logger.debug(row[0])
             logger.debug("==================")
-
-    def _get_similarity(self, obj: Any) -> float:
-        """Safely read annotated similarity added via queryset.annotate for static type checkers."""
-        sim = getattr(obj, 'similarity', None)
-        try:
-            return float(sim) if sim is not None else 0.0
-        except (TypeError, ValueError):
-            return 0.0
-
@@ -0,0 +1,30 @@
+from django.db import migrations
+import pgvector.django.vector
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0005_alter_restauranttable_id'),
+        ('EmbeddingModel', '0002_vector_dimensions_fixed'),
+    ]
+
+    # Нативні розмірності замість vector(3072) — див. MASTER.processing.vectors
+    operations = [
+        migrations.AlterField(
+            model_name='menuitemembedding',
+            name='vector',
+            field=pgvector.django.vector.VectorField(blank=True, null=True),
+        ),
+        migrations.RunSQL(
+            sql=(
+                "UPDATE restaurant_menuitemembedding e SET vector = subvector(e.vector, 1, m.dimensions) "
+                "FROM \"EmbeddingModel_embeddingmodel\" m "
+                "WHERE m.id = e.embedding_model_id AND vector_dims(e.vector) > m.dimensions;"
+            ),
+            reverse_sql=(
+                "UPDATE restaurant_menuitemembedding SET vector = (vector::real[] || array_fill(0::real, ARRAY[3072 - vector_dims(vector)]))::vector "
+                "WHERE vector_dims(vector) < 3072;"
+            ),
+        ),
+    ]
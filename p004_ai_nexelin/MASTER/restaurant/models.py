@@ -15,6 +15,7 @@ from django.dispatch import receiver
 from typing import List, Dict, Any, Optional
 from datetime import timedelta
 from MASTER.processing.embedding_service import EmbeddingService
+from MASTER.processing.vectors import fit_vector
 
 
 class MenuCategory(models.Model):
@@ -178,8 +179,8 @@ class MenuItemEmbedding(models.Model):
         related_name='menu_embeddings'
     )
     
-    # Same technical debt as other embeddings - fixed 3072 dimensions
-    vector = VectorField(dimensions=3072, null=True, blank=True)
+    # Нативна розмірність embedding_model (див. MASTER.processing.vectors)
+    vector = VectorField(null=True, blank=True)
     content = models.TextField(help_text='Combined searchable content from menu item')
     language = models.CharField(max_length=10, default='uk', help_text='Language of the content')
     
@@ -195,13 +196,8 @@ class MenuItemEmbedding(models.Model):
         ]
     
     def save(self, *args, **kwargs):
-        # Pad vector to 3072 dimensions if needed
         if self.vector is not None and self.embedding_model:
-            actual_dim = len(self.vector)
-            if actual_dim > 3072:
-                raise ValidationError(f"Vector dimensions exceed maximum: {actual_dim} > 3072")
-            if actual_dim < 3072:
-                self.vector = list(self.vector) + [0.0] * (3072 - actual_dim)
+            self.vector = fit_vector(self.vector, self.embedding_model.dimensions)
         super().save(*args, **kwargs)
 
 
@@ -6,6 +6,7 @@ from typing import List
 from MASTER.restaurant.models import MenuItem, MenuItemEmbedding
 from MASTER.EmbeddingModel.models import EmbeddingModel
 from MASTER.processing.embedding_service import EmbeddingService
+from MASTER.processing.vectors import fit_vector
 
 
 @shared_task(bind=True, max_retries=3)
@@ -43,7 +44,10 @@ def process_menu_item_embedding(self, menu_item_id: int):
             return {'status': 'skipped', 'reason': 'empty_content'}
 
         result = EmbeddingService.create_embedding(content, embedding_model)
-        vector = result.get('vector') or []
+        # Локальний fallback має 1536 вимірів — приводимо до нативної розмірності моделі
+        vector = fit_vector(
+            result.get('vector') or [], embedding_model.dimensions, truncate=bool(result.get('fallback'))
+        )
 
         mie, _ = MenuItemEmbedding.objects.get_or_create(
             menu_item=item,
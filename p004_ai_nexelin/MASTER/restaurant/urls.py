@@ -13,6 +13,7 @@ router.register(r'tables', views.RestaurantTableViewSet, basename='table')
 urlpatterns = [
     path('', include(router.urls)),
     path('chat/', views.RestaurantChatViewSet.as_view({'post': 'chat'}), name='chat'),
+    path('chat/stream/', views.RestaurantChatViewSet.as_view({'post': 'chat_stream'}), name='chat-stream'),
     path('tts/', views.tts_demo, name='tts-demo'),
     path('stt/', views.stt_demo, name='stt-demo'),
     path('<str:client_slug>/table/<str:token>/', views.public_table_access, name='public-table'),
@@ -24,4 +25,5 @@ public_patterns = [
     path('<str:client_slug>/menu/<int:pk>/', views.MenuItemViewSet.as_view({'get': 'retrieve'}), name='public-menu-item'),
     path('<str:client_slug>/menu/search/', views.MenuItemViewSet.as_view({'post': 'search'}), name='public-menu-search'),
     path('<str:client_slug>/chat/', views.RestaurantChatViewSet.as_view({'post': 'chat'}), name='public-chat'),
+    path('<str:client_slug>/chat/stream/', views.RestaurantChatViewSet.as_view({'post': 'chat_stream'}), name='public-chat-stream'),
 ]
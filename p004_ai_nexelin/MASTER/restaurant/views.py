@@ -4,13 +4,15 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.exceptions import PermissionDenied
 from django.shortcuts import get_object_or_404
+from django.db import connection
 from django.db.models import Q, Count, F, FloatField
+from django.db.models.expressions import RawSQL
 from django.db.models.functions import Cast
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from typing import Any, cast
 import base64
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.conf import settings
 import logging
 import requests
@@ -29,9 +31,11 @@ from .serializers import (
     MenuSearchSerializer, WebhookConfigSerializer
 )
 from MASTER.clients.models import Client, ClientAPIKey
-from MASTER.rag.response_generator import ResponseGenerator, RAGResponse
+from MASTER.rag.response_generator import ResponseGenerator, RAGResponse, sse_event
 from MASTER.rag.vector_search import VectorSearchService
 from MASTER.rag.llm_client import LLMClient
+from MASTER.processing.provider_clients import get_openai_client
+from MASTER.processing.vectors import distance_sql, fit_vector
 from pgvector.django import CosineDistance  # type: ignore[attr-defined]
 
 logger = logging.getLogger(__name__)
@@ -442,6 +446,124 @@ class RestaurantChatViewSet(viewsets.GenericViewSet):
         Headers: X-API-Key (валідний API ключ будь-якого клієнта для валідації)
         Body JSON: { "message": "...", "session_id": "...", ... }
         """
+        turn = self._start_turn(request)
+        if isinstance(turn, Response):
+            return turn
+        client, serializer, conversation, context = turn
+        message = serializer.validated_data['message']
+        session_id = serializer.validated_data['session_id']
+        language = serializer.validated_data.get('language', 'uk')
+        table_id = serializer.validated_data.get('table_id')
+        order_id = serializer.validated_data.get('order_id')
+        
+        # Generate response using LLM with restaurant-specific system prompt and menu context
+        try:
+            response_text = cast(str, self._generate(client, conversation, message, context, language, stream=False))
+        except Exception as e:
+            logger.error(f"LLM generation failed: {str(e)}")
+            response_text = self._get_fallback_response(language)
+        
+        self._finish_turn(conversation, response_text, context)
+        
+        # Optional TTS generation
+        tts_payload: dict[str, Any] | None = None
+        try:
+            speak = bool(serializer.initial_data.get('speak'))
+        except Exception:
+            speak = False
+        if speak:
+            try:
+                tts_client = get_openai_client()
+                tts_model = getattr(settings, 'TTS_MODEL', 'gpt-4o-mini-tts')
+                voice_in = cast(str, serializer.initial_data.get('voice') or 'alloy')
+                # Constrain to known literals to satisfy type checker
+                allowed_voices = {'alloy','echo','fable','onyx','nova','shimmer'}
+                voice = cast(str, voice_in if voice_in in allowed_voices else 'alloy')
+                # Bypass strict typing by using kwargs dict
+                tts_kwargs: dict[str, Any] = {"model": tts_model, "voice": voice, "input": response_text}
+                result = tts_client.audio.speech.create(**tts_kwargs)
+                audio_bytes = result.read() if hasattr(result, 'read') else result
+                if isinstance(audio_bytes, (bytes, bytearray)):
+                    tts_payload = {
+                        'mime': 'audio/mpeg',
+                        'audio_base64': base64.b64encode(audio_bytes).decode('ascii')
+                    }
+            except Exception as e:
+                logger.error(f"TTS generation failed: {e}")
+                tts_payload = None
+
+        # Find suggested items from the response
+        suggested_items = self._extract_suggested_items(response_text, client)
+        
+        # Prepare response
+        response_data = {
+            'response': response_text,
+            'session_id': session_id,
+            'suggested_items': MenuItemCompactSerializer(suggested_items, many=True).data,
+            'context': {
+                'table_id': table_id,
+                'order_id': order_id,
+                'language': language
+            },
+            'tts': tts_payload
+        }
+        
+        return Response(response_data)
+    
+    @action(detail=False, methods=['post'])
+    def chat_stream(self, request):
+        """Streaming variant of chat (Server-Sent Events).
+
+        Auth and body are the same as chat (without TTS). Every event is a JSON object in a
+        `data:` line, as in PublicRAGChatStreamView:
+        - {"type": "token", "content": "..."}  (one per answer delta)
+        - {"type": "done", "session_id": "...", "suggested_items": [...], "context": {...}}
+        - {"type": "error", "error": "..."}  (instead of "done" if generation fails mid-stream)
+        """
+        turn = self._start_turn(request)
+        if isinstance(turn, Response):
+            return turn
+        client, serializer, conversation, context = turn
+        
+        events = self._stream_events(client, serializer.validated_data, conversation, context)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Вимикаємо буферизацію nginx, щоб токени йшли клієнту одразу
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    def _stream_events(self, client, data, conversation, context):
+        message = data['message']
+        language = data.get('language', 'uk')
+        answer_parts: list[str] = []
+        try:
+            for chunk in self._generate(client, conversation, message, context, language, stream=True):
+                answer_parts.append(str(chunk))
+                yield sse_event({"type": "token", "content": str(chunk)})
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {e}", exc_info=True)
+            yield sse_event({"type": "error", "error": "Generation failed"})
+            return
+        
+        response_text = "".join(answer_parts) or self._get_fallback_response(language)
+        self._finish_turn(conversation, response_text, context)
+        suggested_items = self._extract_suggested_items(response_text, client)
+        yield sse_event({
+            "type": "done",
+            "session_id": data['session_id'],
+            "suggested_items": MenuItemCompactSerializer(suggested_items, many=True).data,
+            "context": {
+                "table_id": data.get('table_id'),
+                "order_id": data.get('order_id'),
+                "language": language,
+            },
+        })
+    
+    def _start_turn(self, request):
+        """Auth, validation, conversation and menu context shared by chat and chat_stream.
+
+        Returns an error Response or (client, serializer, conversation, menu context).
+        """
         # Валідація API ключа (для rate limiting), але не прив'язка до конкретного клієнта
         api_key = request.headers.get('X-API-Key')
         if not api_key:
@@ -529,33 +651,32 @@ class RestaurantChatViewSet(viewsets.GenericViewSet):
         
         # Build context from menu items using vector search (fallback to text search)
         context = self._build_menu_context_vector_first(client, message, language)
-        
-        # Generate response using LLM with restaurant-specific system prompt and menu context
+        return client, serializer, conversation, context
+    
+    def _generate(self, client, conversation, message, context, language, stream):
+        """LLM call with the restaurant system prompt, menu context and recent history."""
+        system_prompt = self._get_restaurant_system_prompt(client, language)
+        # Include last few messages for conversational continuity
+        history_messages = conversation.get_last_messages(5)
+        history_text = "\n\n".join([
+            f"{msg['role'].upper()}: {msg['content']}" for msg in history_messages
+        ])
+        full_context = (context + "\n\n" + history_text).strip()
+        # Temporarily inject prompt for this call; generate_response builds the messages
+        # before returning, so the prompt can be restored before a stream is consumed
+        old_prompt = getattr(client, 'custom_system_prompt', '')
         try:
-            system_prompt = self._get_restaurant_system_prompt(client, language)
-            # Temporarily inject prompt for this call
-            old_prompt = getattr(client, 'custom_system_prompt', '')
-            try:
-                client.custom_system_prompt = system_prompt
-                llm = LLMClient()
-                # Include last few messages for conversational continuity
-                history_messages = conversation.get_last_messages(5)
-                history_text = "\n\n".join([
-                    f"{msg['role'].upper()}: {msg['content']}" for msg in history_messages
-                ])
-                full_context = (context + "\n\n" + history_text).strip()
-                response_text = cast(str, llm.generate_response(
-                    user_query=message,
-                    context=full_context,
-                    client=client,
-                    stream=False,
-                ))
-            finally:
-                client.custom_system_prompt = old_prompt
-        except Exception as e:
-            logger.error(f"LLM generation failed: {str(e)}")
-            response_text = self._get_fallback_response(language)
-        
+            client.custom_system_prompt = system_prompt
+            return LLMClient().generate_response(
+                user_query=message,
+                context=full_context,
+                client=client,
+                stream=stream,
+            )
+        finally:
+            client.custom_system_prompt = old_prompt
+    
+    def _finish_turn(self, conversation, response_text, context):
         # Save assistant response
         conversation.add_message('assistant', response_text)
         
@@ -564,52 +685,6 @@ class RestaurantChatViewSet(viewsets.GenericViewSet):
             conversation.context_metadata = {}
         conversation.context_metadata['menu_context'] = len(context)
         conversation.save(update_fields=['context_metadata'])
-        
-        # Optional TTS generation
-        tts_payload: dict[str, Any] | None = None
-        try:
-            speak = bool(serializer.initial_data.get('speak'))
-        except Exception:
-            speak = False
-        if speak:
-            try:
-                from openai import OpenAI
-                tts_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-                tts_model = getattr(settings, 'TTS_MODEL', 'gpt-4o-mini-tts')
-                voice_in = cast(str, serializer.initial_data.get('voice') or 'alloy')
-                # Constrain to known literals to satisfy type checker
-                allowed_voices = {'alloy','echo','fable','onyx','nova','shimmer'}
-                voice = cast(str, voice_in if voice_in in allowed_voices else 'alloy')
-                # Bypass strict typing by using kwargs dict
-                tts_kwargs: dict[str, Any] = {"model": tts_model, "voice": voice, "input": response_text}
-                result = tts_client.audio.speech.create(**tts_kwargs)
-                audio_bytes = result.read() if hasattr(result, 'read') else result
-                if isinstance(audio_bytes, (bytes, bytearray)):
-                    tts_payload = {
-                        'mime': 'audio/mpeg',
-                        'audio_base64': base64.b64encode(audio_bytes).decode('ascii')
-                    }
-            except Exception as e:
-                logger.error(f"TTS generation failed: {e}")
-                tts_payload = None
-
-        # Find suggested items from the response
-        suggested_items = self._extract_suggested_items(response_text, client)
-        
-        # Prepare response
-        response_data = {
-            'response': response_text,
-            'session_id': session_id,
-            'suggested_items': MenuItemCompactSerializer(suggested_items, many=True).data,
-            'context': {
-                'table_id': table_id,
-                'order_id': order_id,
-                'language': language
-            },
-            'tts': tts_payload
-        }
-        
-        return Response(response_data)
     
     def _build_menu_context_vector_first(self, client, query, language):
         """Build context from menu items for RAG. Prefer vector search if embeddings exist."""
@@ -621,8 +696,11 @@ class RestaurantChatViewSet(viewsets.GenericViewSet):
             if not embedding_model and client and client.specialization:
                 embedding_model = client.specialization.get_embedding_model()
             model_name = embedding_model.model_name if embedding_model else getattr(settings, 'EMBEDDINGS_MODEL_NAME', 'text-embedding-3-small')
-            q = EmbeddingService.embed_text(query, model_name)
+            q = EmbeddingService.embed_text(query, model_name, use_cache=True)
             qvec = q.get('vector') or []
+            if qvec and embedding_model:
+                # Нативна розмірність моделі; TF-IDF fallback (1536) обрізається, як і в пошуку RAG
+                qvec = fit_vector(qvec, embedding_model.dimensions, truncate=True)
             if qvec:
                 emb_qs = (
                     MenuItemEmbedding.objects
@@ -632,11 +710,26 @@ class RestaurantChatViewSet(viewsets.GenericViewSet):
                 if embedding_model:
                     emb_qs = emb_qs.filter(embedding_model=embedding_model)
                 
+                if embedding_model:
+                    # Той самий вираз, що й у частковому HNSW-індексі menu_emb моделі
+                    # (vector::vector(N) / halfvec(N)) — інакше лише точний перебір
+                    column = (
+                        f"{connection.ops.quote_name(MenuItemEmbedding._meta.db_table)}"
+                        f".{connection.ops.quote_name('vector')}"
+                    )
+                    distance = RawSQL(
+                        distance_sql(column, '%s::vector', embedding_model.dimensions),
+                        [VectorSearchService._vector_literal(qvec)],
+                        output_field=FloatField(),
+                    )
+                else:
+                    distance = Cast(CosineDistance(F('vector'), qvec), output_field=FloatField())
                 emb_qs = (
                     emb_qs
                     .select_related('menu_item', 'menu_item__category')
-                    .annotate(similarity=1 - Cast(CosineDistance(F('vector'), qvec), output_field=FloatField()))
-                    .order_by('-similarity')[:10]
+                    .defer('vector')
+                    .annotate(distance=distance)
+                    .order_by('distance')[:10]
                 )
                 items = [e.menu_item for e in emb_qs]
                 if items:
@@ -830,8 +923,7 @@ def tts_demo(request):
         return Response({'error': 'text is required'}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        client = get_openai_client()
         # Model names may vary; use a safe default
         tts_model = getattr(settings, 'TTS_MODEL', 'gpt-4o-mini-tts')
         result = client.audio.speech.create(
@@ -888,8 +980,7 @@ def stt_demo(request):
         return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        client = get_openai_client()
         stt_model = getattr(settings, 'STT_MODEL', 'gpt-4o-transcribe')
         result = client.audio.transcriptions.create(
             model=stt_model,
@@ -221,6 +221,31 @@ CELERY_TASK_ANNOTATIONS = {
     "MASTER.processing.tasks.process_specialization_document": {"rate_limit": "10/m"},
 }
 CELERY_WORKER_CONCURRENCY = env.int("CELERY_WORKER_CONCURRENCY", default=1)
+# Обробка документів — в окремій черзі, яку обслуговує воркер з --pool=threads
+# (docker-compose: celery_ingestion_worker). Дочірні процеси prefork-пулу — daemon і не
+# можуть запускати пул процесів для PDF (MASTER.processing.parsers.PDFParser.iter_text).
+# Opt-in: без CELERY_INGESTION_QUEUE задачі йдуть у стандартну чергу, яку читає будь-який воркер
+CELERY_INGESTION_QUEUE = env("CELERY_INGESTION_QUEUE", default="")
+CELERY_TASK_ROUTES = {
+    task: {"queue": CELERY_INGESTION_QUEUE}
+    for task in (
+        "MASTER.processing.tasks.process_document",
+        "MASTER.processing.tasks.process_client_document",
+        "MASTER.processing.tasks.process_branch_document",
+        "MASTER.processing.tasks.process_specialization_document",
+        "MASTER.EmbeddingModel.tasks.build_shadow_embeddings_task",
+    )
+} if CELERY_INGESTION_QUEUE else {}
+# Фонова (blue/green) побудова embeddings при зміні моделі клієнта.
+# Вікно off-peak у годинах TIME_ZONE; start == end — без обмеження
+SHADOW_BUILD_CONFIG = {
+    'off_peak_start_hour': env.int("SHADOW_BUILD_OFF_PEAK_START", default=0),
+    'off_peak_end_hour': env.int("SHADOW_BUILD_OFF_PEAK_END", default=0),
+    'documents_per_run': env.int("SHADOW_BUILD_DOCUMENTS_PER_RUN", default=50),
+    'pause_seconds': env.int("SHADOW_BUILD_PAUSE_SECONDS", default=60),
+    # Скільки разів перебудовувати документи, що лишилися неповними, перш ніж скасувати перемикання
+    'incomplete_retries': env.int("SHADOW_BUILD_INCOMPLETE_RETRIES", default=3),
+}
 
 # === RAG CONFIGS (SHORTENED) ===
 VECTOR_SEARCH_CONFIG = { 'ivfflat_probes': 10 }
@@ -243,7 +268,30 @@ VECTOR_SEARCH_CONFIG = {
     'explain_queries': False,
     'ivfflat_probes': 10,
     'hnsw_ef_search': 40,
-    'force_index_usage': False
+    'force_index_usage': False,
+    # Один UNION ALL запит на всі рівні замість окремого запиту на кожен рівень
+    'combined_query': env.bool("VECTOR_SEARCH_COMBINED_QUERY", default=True),
+    # Якщо один запит неможливий — рівні шукаються паралельно (окреме з'єднання на потік);
+    # рівень, що не вклався в таймаут, відкидається
+    'parallel_levels': env.bool("VECTOR_SEARCH_PARALLEL_LEVELS", default=True),
+    'level_timeout_seconds': env.float("VECTOR_SEARCH_LEVEL_TIMEOUT", default=3.0),
+    'parallel_max_workers': env.int("VECTOR_SEARCH_PARALLEL_MAX_WORKERS", default=8),
+    # З'єднання потоків пулу живуть стільки секунд (CONN_MAX_AGE лише для цих потоків,
+    # з CONN_HEALTH_CHECKS) — інакше кожен рівень кожного запиту відкриває нове з'єднання
+    'parallel_conn_max_age': env.int("VECTOR_SEARCH_PARALLEL_CONN_MAX_AGE", default=300),
+    # Стратегія за розміром тенанта: до exact_scan_max_rows рядків (власник + модель) — точний
+    # пошук без ANN-індексу, більші — HNSW з ітеративним скануванням (pgvector >= 0.8),
+    # щоб фільтр по тенанту не зменшував кількість результатів; '' / 'off' — без нього
+    'exact_scan_max_rows': env.int("VECTOR_SEARCH_EXACT_SCAN_MAX_ROWS", default=10000),
+    'iterative_scan': env("VECTOR_SEARCH_ITERATIVE_SCAN", default="relaxed_order"),
+    'max_scan_tuples': env.int("VECTOR_SEARCH_MAX_SCAN_TUPLES", default=20000),
+    'tenant_size_cache_seconds': env.int("VECTOR_SEARCH_TENANT_SIZE_CACHE_SECONDS", default=300),
+    # Двоетапний пошук для великих тенантів branch/specialization: quantized_candidates
+    # кандидатів з бінарного індексу (binary_quantize), потім точне переранжування за косинусом
+    # (повнота: manage.py vector_search_recall)
+    'quantized_search': env.bool("VECTOR_SEARCH_QUANTIZED", default=False),
+    'quantized_candidates': env.int("VECTOR_SEARCH_QUANTIZED_CANDIDATES", default=200),
+    'quantized_levels': ['branch', 'specialization'],
 }
 
 CONTEXT_BUILDER_CONFIG = {
@@ -264,7 +312,54 @@ SYSTEM_PROMPTS = { 'default': "..." }
 
 # === OTHER ===
 EMBEDDINGS_FALLBACK_LOCAL = env.bool("EMBEDDINGS_FALLBACK_LOCAL", default=True)
+# Батчинг embeddings при індексації документів (OpenAI: до 2048 входів і 300k токенів на запит)
+EMBEDDING_BATCH_CONFIG = {
+    'batch_size': env.int("EMBEDDING_BATCH_SIZE", default=128),
+    'max_tokens_per_request': env.int("EMBEDDING_BATCH_MAX_TOKENS", default=250000),
+    # Кількість рядків в одному INSERT при bulk_create embeddings
+    'insert_batch_size': env.int("EMBEDDING_INSERT_BATCH_SIZE", default=200),
+}
+# Потокова індексація великих файлів: парсинг по сторінках, embed/INSERT батчами чанків
+INGESTION_CONFIG = {
+    # Файли від цього розміру обробляються потоково (-1 — вимкнено)
+    'streaming_min_file_bytes': env.int("INGESTION_STREAMING_MIN_BYTES", default=5 * 1024 * 1024),
+    'stream_batch_chunks': env.int("INGESTION_STREAM_BATCH_CHUNKS", default=256),
+    # Паралельне вилучення тексту PDF діапазонами сторінок (0 — кількість ядер, 1 — послідовно).
+    # У prefork-пулі Celery дочірні процеси daemon, тож пул працює з --pool=threads/solo
+    'pdf_parse_workers': env.int("INGESTION_PDF_PARSE_WORKERS", default=0),
+    'pdf_parallel_min_pages': env.int("INGESTION_PDF_PARALLEL_MIN_PAGES", default=50),
+    'pdf_pages_per_task': env.int("INGESTION_PDF_PAGES_PER_TASK", default=20),
+}
+# Кеш embeddings запитів користувачів: LRU у процесі + Redis (за замовчуванням — брокер Celery)
+EMBEDDING_CACHE_CONFIG = {
+    'enabled': env.bool("EMBEDDING_CACHE_ENABLED", default=True),
+    'local_max_entries': env.int("EMBEDDING_CACHE_LOCAL_MAX_ENTRIES", default=1024),
+    'local_ttl_seconds': env.int("EMBEDDING_CACHE_LOCAL_TTL", default=600),
+    'redis_url': env("EMBEDDING_CACHE_REDIS_URL", default=CELERY_BROKER_URL),
+    'redis_ttl_seconds': env.int("EMBEDDING_CACHE_REDIS_TTL", default=7 * 24 * 3600),
+    'key_prefix': env("EMBEDDING_CACHE_KEY_PREFIX", default="embcache:v1"),
+}
+# Семантичний кеш відповідей RAG (per client + embedding model), інвалідація — MASTER.rag.signals
+SEMANTIC_CACHE_CONFIG = {
+    'enabled': env.bool("SEMANTIC_CACHE_ENABLED", default=False),
+    'max_cosine_distance': env.float("SEMANTIC_CACHE_MAX_DISTANCE", default=0.05),
+    'max_entries_per_client': env.int("SEMANTIC_CACHE_MAX_ENTRIES", default=50),
+    'ttl_seconds': env.int("SEMANTIC_CACHE_TTL", default=6 * 3600),
+    'redis_url': env("SEMANTIC_CACHE_REDIS_URL", default=CELERY_BROKER_URL),
+    'key_prefix': env("SEMANTIC_CACHE_KEY_PREFIX", default="answercache:v1"),
+}
 OPENAI_API_KEY = env("OPENAI_API_KEY", default="")
+# Пул HTTP-з'єднань спільного OpenAI клієнта (один на процес воркера)
+OPENAI_HTTP_CONFIG = {
+    'max_connections': env.int("OPENAI_HTTP_MAX_CONNECTIONS", default=20),
+    'max_keepalive_connections': env.int("OPENAI_HTTP_MAX_KEEPALIVE", default=10),
+    'keepalive_expiry_seconds': env.float("OPENAI_HTTP_KEEPALIVE_EXPIRY", default=60.0),
+    'timeout_seconds': env.float("OPENAI_HTTP_TIMEOUT", default=60.0),
+    'connect_timeout_seconds': env.float("OPENAI_HTTP_CONNECT_TIMEOUT", default=5.0),
+}
+# Публічний health check (/) показує статистику з'єднань OpenAI та кешів лише staff-сесії;
+# True — всім (наприклад, для внутрішнього моніторингу за закритим мережевим периметром)
+HEALTH_EXPOSE_STATS = env.bool("HEALTH_EXPOSE_STATS", default=False)
 HUGGINGFACE_API_KEY = env("HUGGINGFACE_API_KEY", default="")
 COHERE_API_KEY = env("COHERE_API_KEY", default="")
 WHATSAPP_QR_SECRET = env("WHATSAPP_QR_SECRET", default="")
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('specializations', '0005_specializationembedding_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='specializationembedding',
+            name='chunk_index',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # Бекфіл з metadata['chunk_index'], яке пайплайн пише в кожен рядок
+        migrations.RunSQL(
+            sql="UPDATE specializations_specializationembedding SET chunk_index = (metadata->>'chunk_index')::integer WHERE jsonb_typeof(metadata->'chunk_index') = 'number';",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='specializationembedding',
+            index=models.Index(fields=['document', 'chunk_index'], name='spec_emb_doc_chunk_idx'),
+        ),
+    ]
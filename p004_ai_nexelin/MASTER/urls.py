@@ -8,14 +8,25 @@ from django.urls import path, re_path, include
 from MASTER.clients.views_meta_whatsapp import MetaWhatsAppWebhookView
 from MASTER.clients.views_whatsapp import TwilioWhatsAppWebhookView
 from MASTER.quick_admin import urlpatterns as quick_admin_urlpatterns
+from MASTER.processing.provider_clients import get_connection_stats
+from MASTER.processing.embedding_cache import get_embedding_cache
+from MASTER.rag.answer_cache import get_answer_cache
 
 
-def health_view(_request):
-    return JsonResponse({
+def health_view(request):
+    payload = {
         "status": "ok",
         "app": "ai_nexelin",
         "version": "dev",
-    })
+    }
+    # Статистика процесу (з'єднання OpenAI: pid, лічильники; hit/miss кешів embeddings і
+    # відповідей) — лише для staff-сесії або з HEALTH_EXPOSE_STATS
+    user = getattr(request, "user", None)
+    if getattr(settings, "HEALTH_EXPOSE_STATS", False) or (user is not None and user.is_staff):
+        payload["openai_connections"] = get_connection_stats()
+        payload["embedding_cache"] = get_embedding_cache().stats()
+        payload["answer_cache"] = get_answer_cache().stats()
+    return JsonResponse(payload)
 
 
 urlpatterns = [
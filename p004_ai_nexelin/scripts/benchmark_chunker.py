@@ -0,0 +1,120 @@
+"""Speed and peak-RSS benchmark: chunk_text vs the streaming iter_chunks.
+
+Each implementation runs in a fresh child process, so ru_maxrss is its own peak:
+- legacy:    reads the whole file, chunk_text(text) (full token list + decode per chunk)
+- streaming: TextParser.iter_text(file) -> iter_chunks (token window + char-offset slicing)
+
+The input is a generated text file of --size-mb megabytes (or --file).
+
+Usage:
+    python scripts/benchmark_chunker.py [--size-mb 50] [--file path.txt] [--chunk-size 512] [--overlap 50]
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+WORDS = (
+    "menu order table reservation vegan dish price discount delivery kitchen chef "
+    "allergens gluten dairy soup salad dessert coffee wine breakfast lunch dinner "
+    "меню замовлення столик веганська страва ціна знижка доставка кухня"
+).split()
+
+
+def _generate_file(size_mb: int) -> str:
+    rnd = random.Random(42)
+    target = size_mb * 1024 * 1024
+    fd, path = tempfile.mkstemp(suffix=".txt")
+    written = 0
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        while written < target:
+            line = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(5, 25))) + ".\n"
+            f.write(line)
+            written += len(line.encode("utf-8"))
+    return path
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: KiB, macOS: bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_child(impl: str, path: str, chunk_size: int, overlap: int) -> None:
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    from MASTER.processing.chunker import chunk_text, iter_chunks
+    from MASTER.processing.parsers import TextParser
+
+    baseline = _peak_rss_mb()
+    started = time.perf_counter()
+    chunks = 0
+    tokens = 0
+    if impl == "legacy":
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        for chunk in chunk_text(text, chunk_size=chunk_size, overlap=overlap):
+            chunks += 1
+            tokens += chunk["metadata"]["token_count"]
+    else:
+        segments = TextParser.iter_text(path)
+        for chunk in iter_chunks(segments, chunk_size=chunk_size, overlap=overlap):
+            chunks += 1
+            tokens += chunk["metadata"]["token_count"]
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        "impl": impl,
+        "seconds": elapsed,
+        "chunks": chunks,
+        "tokens": tokens,
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": _peak_rss_mb(),
+    }))
+
+
+def run_benchmark(path: str, chunk_size: int, overlap: int) -> None:
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    print(f"input: {path} ({size_mb:.1f} MB), chunk_size={chunk_size}, overlap={overlap}")
+    print(f"{'impl':<12}{'seconds':>10}{'chunks':>10}{'peak RSS MB':>14}{'over baseline':>15}")
+    for impl in ("legacy", "streaming"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", impl, "--file", path,
+             "--chunk-size", str(chunk_size), "--overlap", str(overlap)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        data = json.loads(out.strip().splitlines()[-1])
+        print(
+            f"{impl:<12}{data['seconds']:>10.2f}{data['chunks']:>10}"
+            f"{data['peak_rss_mb']:>14.1f}{data['peak_rss_mb'] - data['baseline_rss_mb']:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=50)
+    parser.add_argument("--file", default=None)
+    parser.add_argument("--chunk-size", type=int, default=512)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--child", choices=("legacy", "streaming"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.file, args.chunk_size, args.overlap)
+        sys.exit(0)
+
+    generated = args.file is None
+    file_path = args.file or _generate_file(args.size_mb)
+    try:
+        run_benchmark(file_path, args.chunk_size, args.overlap)
+    finally:
+        if generated:
+            os.remove(file_path)
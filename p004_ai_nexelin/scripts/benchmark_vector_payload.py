@@ -0,0 +1,135 @@
+"""Bytes-over-the-wire benchmark for vector search queries.
+
+Compares, per embedding table, the legacy search query (full model rows, including the
+`vector` column) with the projected query used by VectorSearchService (no vector column).
+
+For every case it prints:
+- wire bytes: size of the values received by the client (text protocol, approximate)
+- row bytes: server-side sum(pg_column_size(row)) of the result set
+- median latency over --runs executions
+
+Usage:
+    python scripts/benchmark_vector_payload.py [--client-id N] [--runs 20]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import django
+
+
+def setup_django() -> None:
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "MASTER.settings")
+    django.setup()
+
+
+def _wire_bytes(rows: list[tuple]) -> int:
+    total = 0
+    for row in rows:
+        for value in row:
+            if value is None:
+                continue
+            if isinstance(value, bytes):
+                total += len(value)
+            else:
+                total += len(str(value).encode("utf-8"))
+    return total
+
+
+def _measure(sql: str, params: list, runs: int) -> dict:
+    from django.db import connection
+
+    timings = []
+    rows: list[tuple] = []
+    with connection.cursor() as cursor:
+        for _ in range(runs):
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        cursor.execute(f"SELECT COALESCE(SUM(pg_column_size(t)), 0) FROM ({sql}) AS t", params)
+        row_bytes = int(cursor.fetchone()[0])
+
+    return {
+        "rows": len(rows),
+        "wire_bytes": _wire_bytes(rows),
+        "row_bytes": row_bytes,
+        "median_ms": statistics.median(timings) if timings else 0.0,
+    }
+
+
+def _print_case(title: str, before: dict, after: dict) -> None:
+    print(f"\n=== {title} ===")
+    print(f"{'':<10}{'rows':>6}{'wire bytes':>14}{'row bytes':>14}{'median ms':>12}")
+    for label, data in (("before", before), ("after", after)):
+        print(
+            f"{label:<10}{data['rows']:>6}{data['wire_bytes']:>14}"
+            f"{data['row_bytes']:>14}{data['median_ms']:>12.2f}"
+        )
+    if before["rows"]:
+        per_row_before = before["wire_bytes"] / before["rows"]
+        per_row_after = after["wire_bytes"] / max(after["rows"], 1)
+        print(f"wire bytes per row: {per_row_before:.0f} -> {per_row_after:.0f}")
+
+
+def run_benchmark(client_id: int | None, runs: int) -> None:
+    from django.db.models import F
+    from MASTER.branches.models import BranchEmbedding
+    from MASTER.specializations.models import SpecializationEmbedding
+    from MASTER.clients.models import ClientEmbedding
+    from MASTER.rag.vector_search import VectorSearchService
+
+    service = VectorSearchService()
+
+    cases = [
+        ("clients_clientembedding", ClientEmbedding, "client_id"),
+        ("branches_branchembedding", BranchEmbedding, "branch_id"),
+        ("specializations_specializationembedding", SpecializationEmbedding, "specialization_id"),
+    ]
+
+    for title, model, owner_field in cases:
+        sample_qs = model.objects.exclude(vector__isnull=True)
+        if client_id is not None and owner_field == "client_id":
+            sample_qs = sample_qs.filter(client_id=client_id)
+        sample = sample_qs.values(owner_field, "embedding_model_id", "vector").first()
+        if not sample:
+            print(f"\n=== {title} === no embeddings, skipped")
+            continue
+
+        query_vector = list(sample["vector"])
+        queryset = model.objects.filter(
+            **{owner_field: sample[owner_field], "embedding_model_id": sample["embedding_model_id"]}
+        )
+        ranked = service._similarity_queryset(queryset, query_vector)
+
+        # Before: full model rows, as the search loops used to load them
+        legacy = ranked[:service.max_results_per_level]
+        # After: the projection used by VectorSearchService._search_document_level
+        projected = ranked.values(
+            "content", "metadata", "document_id", "similarity",
+            document_title=F("document__title"),
+        )[:service.max_results_per_level]
+
+        before_sql, before_params = legacy.query.sql_with_params()
+        after_sql, after_params = projected.query.sql_with_params()
+        _print_case(
+            title,
+            _measure(before_sql, list(before_params), runs),
+            _measure(after_sql, list(after_params), runs),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--client-id", type=int, default=None)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    run_benchmark(args.client_id, args.runs)
@@ -0,0 +1,165 @@
+"""Concurrent-chat capacity: sync chat (WSGI, gunicorn threads) vs async chat (ASGI, uvicorn).
+
+OpenAI is replaced by a local fake with a fixed latency, so the test measures how many
+conversations a server can keep in flight while waiting on the provider, not OpenAI itself.
+
+1. Fake OpenAI (embeddings + chat completions, optional SSE streaming):
+    python scripts/load_test_chat.py fake-openai --port 9100 --llm-delay 5
+
+2. Both servers pointed at it (same DB, OPENAI_BASE_URL is read by the openai SDK):
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 gunicorn MASTER.wsgi:application -b :8000 --workers 1 --threads 8
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 uvicorn MASTER.asgi:application --port 8001 --workers 1
+
+3. Load:
+    python scripts/load_test_chat.py run --url http://127.0.0.1:8000/api/rag/chat/ --api-key KEY -c 200
+    python scripts/load_test_chat.py run --url http://127.0.0.1:8001/api/rag/chat/async/ --api-key KEY -c 200
+
+With a 5 s LLM delay WSGI completes ~threads/5 chats per second (the rest queue), while
+ASGI completes ~concurrency/5 until the DB thread pool or OPENAI_HTTP_MAX_CONNECTIONS limits.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+
+# --- fake OpenAI ---------------------------------------------------------------------------
+
+async def _handle_fake_openai(reader, writer, args):
+    try:
+        request_line = await reader.readline()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+        payload = json.loads(body or b"{}")
+        path = request_line.split()[1].decode() if request_line else ""
+
+        if path.endswith("/embeddings"):
+            await asyncio.sleep(args.embedding_delay)
+            inputs = payload.get("input")
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            dims = int(payload.get("dimensions") or args.dimensions)
+            data = [{"object": "embedding", "index": i, "embedding": [0.01] * dims} for i in range(len(inputs))]
+            await _send_json(writer, {
+                "object": "list", "data": data, "model": payload.get("model"),
+                "usage": {"prompt_tokens": 8, "total_tokens": 8},
+            })
+        elif path.endswith("/chat/completions"):
+            words = ["Fake", " answer", " from", " the", " load", " test."]
+            if payload.get("stream"):
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n")
+                step = args.llm_delay / len(words)
+                for word in words:
+                    await asyncio.sleep(step)
+                    writer.write(_sse_chunk({"content": word}))
+                    await writer.drain()
+                if (payload.get("stream_options") or {}).get("include_usage"):
+                    writer.write(_sse_chunk(None, usage={"prompt_tokens": 100, "completion_tokens": 6, "total_tokens": 106}))
+                writer.write(b"data: [DONE]\n\n")
+            else:
+                await asyncio.sleep(args.llm_delay)
+                await _send_json(writer, {
+                    "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": payload.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "".join(words)}}],
+                    "usage": {"prompt_tokens": 100, "completion_tokens": 6, "total_tokens": 106},
+                })
+        else:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+def _sse_chunk(delta, usage=None):
+    chunk = {
+        "id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": "fake",
+        "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": None}],
+        "usage": usage,
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+
+async def _send_json(writer, payload):
+    body = json.dumps(payload).encode()
+    writer.write(
+        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+
+
+async def fake_openai(args):
+    server = await asyncio.start_server(lambda r, w: _handle_fake_openai(r, w, args), args.host, args.port)
+    print(f"fake OpenAI on http://{args.host}:{args.port}/v1 (llm delay {args.llm_delay}s)")
+    async with server:
+        await server.serve_forever()
+
+
+# --- load generator ------------------------------------------------------------------------
+
+async def _one_chat(client, args, index, latencies, errors):
+    started = time.perf_counter()
+    try:
+        response = await client.post(
+            args.url,
+            json={"message": f"{args.message} #{index}"},
+            headers={"X-API-Key": args.api_key},
+        )
+        # httpx читає тіло повністю: для SSE-ендпоінтів це час до події done
+        if response.status_code != 200:
+            errors.append(response.status_code)
+            return
+        latencies.append(time.perf_counter() - started)
+    except Exception as e:  # noqa: BLE001
+        errors.append(type(e).__name__)
+
+
+async def run_load(args):
+    import httpx
+
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            _one_chat(client, args, i, latencies, errors) for i in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    print(f"url: {args.url}")
+    print(f"concurrent chats: {args.concurrency}, wall time: {elapsed:.2f}s")
+    print(f"completed: {len(latencies)}, failed: {len(errors)} {sorted(set(map(str, errors)))[:5]}")
+    if latencies:
+        latencies.sort()
+        p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+        print(f"latency p50: {statistics.median(latencies):.2f}s, p95: {p95:.2f}s, max: {latencies[-1]:.2f}s")
+        print(f"throughput: {len(latencies) / elapsed:.1f} chats/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fake = commands.add_parser("fake-openai", help="run a fake OpenAI API with fixed latency")
+    fake.add_argument("--host", default="127.0.0.1")
+    fake.add_argument("--port", type=int, default=9100)
+    fake.add_argument("--llm-delay", type=float, default=5.0)
+    fake.add_argument("--embedding-delay", type=float, default=0.1)
+    fake.add_argument("--dimensions", type=int, default=1536)
+
+    run = commands.add_parser("run", help="fire N concurrent chats at one endpoint")
+    run.add_argument("--url", required=True)
+    run.add_argument("--api-key", required=True)
+    run.add_argument("-c", "--concurrency", type=int, default=100)
+    run.add_argument("--message", default="What do you recommend?")
+    run.add_argument("--timeout", type=float, default=300.0)
+
+    cli_args = parser.parse_args()
+    asyncio.run(fake_openai(cli_args) if cli_args.command == "fake-openai" else run_load(cli_args))